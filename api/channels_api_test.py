@@ -19,6 +19,8 @@ from unittest import mock
 import unittest
 
 from api import channels_api
+from framework import rediscache
+from internals import schedule_store
 
 test_app = flask.Flask(__name__)
 
@@ -28,10 +30,14 @@ class ChannelsAPITest(testing_config.CustomTestCase):
     self.handler = channels_api.ChannelsAPI()
     self.request_path = '/api/v0/channels'
 
-  @mock.patch('api.channels_api.fetch_chrome_release_info')
+  def tearDown(self):
+    rediscache.flushall()
+    schedule_store._final_schedules.clear()
+
+  @mock.patch('internals.schedule_store.get_schedules')
   @mock.patch('internals.fetchchannels.get_omaha_data')
   def test_construct_chrome_channels_details(
-      self, mock_get_omaha_data, mock_fetch_chrome_release_info):
+      self, mock_get_omaha_data, mock_get_schedules):
     win_data = {
         'os': 'win',
         'versions': [
@@ -56,13 +62,13 @@ class ChannelsAPITest(testing_config.CustomTestCase):
         'earliest_beta': '2020-02-13T00:00:00',
         'mstone': 'fake milestone number',
     }
-    def fcri(version):
-      result = mstone_data.copy()
-      return result
-    mock_fetch_chrome_release_info.side_effect = fcri
+    mock_get_schedules.side_effect = lambda milestones: {
+        m: mstone_data.copy() for m in milestones}
 
     actual = channels_api.construct_chrome_channels_details()
 
+    mock_get_schedules.assert_called_once_with([79, 80, 81])
+
     expected = {
         'canary_asan': {
             'version': 81,
@@ -93,10 +99,10 @@ class ChannelsAPITest(testing_config.CustomTestCase):
     self.maxDiff = None
     self.assertEqual(expected, actual)
 
-  @mock.patch('api.channels_api.fetch_chrome_release_info')
+  @mock.patch('internals.schedule_store.get_schedules')
   @mock.patch('internals.fetchchannels.get_omaha_data')
   def test_construct_chrome_channels_details__beta_promotion(
-      self, mock_get_omaha_data, mock_fetch_chrome_release_info):
+      self, mock_get_omaha_data, mock_get_schedules):
     win_data = {
         'os': 'win',
         'versions': [
@@ -115,13 +121,13 @@ class ChannelsAPITest(testing_config.CustomTestCase):
         'earliest_beta': '2020-02-13T00:00:00',
         'mstone': 'fake milestone number',
     }
-    def fcri(version):
-      result = mstone_data.copy()
-      return result
-    mock_fetch_chrome_release_info.side_effect = fcri
+    mock_get_schedules.side_effect = lambda milestones: {
+        m: mstone_data.copy() for m in milestones}
 
     actual = channels_api.construct_chrome_channels_details()
 
+    mock_get_schedules.assert_called_once_with([79, 80, 81])
+
     expected = {
         'beta': {
             'version': 80,
@@ -142,10 +148,10 @@ class ChannelsAPITest(testing_config.CustomTestCase):
     self.maxDiff = None
     self.assertEqual(expected, actual)
 
-  @mock.patch('api.channels_api.fetch_chrome_release_info')
+  @mock.patch('internals.schedule_store.get_schedules')
   @mock.patch('internals.fetchchannels.get_omaha_data')
   def test_construct_chrome_channels_details__dev_promotion(
-      self, mock_get_omaha_data, mock_fetch_chrome_release_info):
+      self, mock_get_omaha_data, mock_get_schedules):
     win_data = {
         'os': 'win',
         'versions': [
@@ -165,13 +171,13 @@ class ChannelsAPITest(testing_config.CustomTestCase):
         'earliest_beta': '2020-02-13T00:00:00',
         'mstone': 'fake milestone number',
     }
-    def fcri(version):
-      result = mstone_data.copy()
-      return result
-    mock_fetch_chrome_release_info.side_effect = fcri
+    mock_get_schedules.side_effect = lambda milestones: {
+        m: mstone_data.copy() for m in milestones}
 
     actual = channels_api.construct_chrome_channels_details()
 
+    mock_get_schedules.assert_called_once_with([79, 80, 81])
+
     expected = {
         'beta': {
             'version': 80,
@@ -192,7 +198,7 @@ class ChannelsAPITest(testing_config.CustomTestCase):
     self.maxDiff = None
     self.assertEqual(expected, actual)
 
-  @mock.patch('requests.get')
+  @mock.patch('requests.Session.get')
   def test_fetch_chrome_release_info__found(self, mock_requests_get):
     """We can get channel data from the chromiumdash app."""
     mock_requests_get.return_value = testing_config.Blank(
@@ -212,7 +218,7 @@ class ChannelsAPITest(testing_config.CustomTestCase):
         {'everything else': 'kept'},
         actual)
 
-  @mock.patch('requests.get')
+  @mock.patch('requests.Session.get')
   def test_fetch_chrome_release_info__not_found(self, mock_requests_get):
     """If chromiumdash app does not have the data, use a placeholder."""
     mock_requests_get.return_value = testing_config.Blank(
@@ -229,7 +235,7 @@ class ChannelsAPITest(testing_config.CustomTestCase):
          },
         actual)
 
-  @mock.patch('requests.get')
+  @mock.patch('requests.Session.get')
   def test_fetch_chrome_release_info__error(self, mock_requests_get):
     """We can get channel data from the chromiumdash app."""
     mock_requests_get.return_value = testing_config.Blank(
@@ -247,37 +253,24 @@ class ChannelsAPITest(testing_config.CustomTestCase):
          },
         actual)
 
-  @mock.patch('api.channels_api.fetch_chrome_release_info')
-  def test_construct_specified_milestones_details(
-      self, mock_fetch_chrome_release_info):
+  @mock.patch('internals.schedule_store.get_schedules')
+  def test_construct_specified_milestones_details(self, mock_get_schedules):
+    """The schedules of a range of milestones are looked up in one batch."""
     mstone_data = {
         'earliest_beta': '2020-02-13T00:00:00',
         'mstone': 'fake milestone number',
     }
-    def fcri(version):
-      result = mstone_data.copy()
-      return result
-    mock_fetch_chrome_release_info.side_effect = fcri
+    mock_get_schedules.side_effect = lambda milestones: {
+        m: mstone_data.copy() for m in milestones}
 
     actual = channels_api.construct_specified_milestones_details(1, 4)
 
+    mock_get_schedules.assert_called_once_with(range(1, 5))
     expected = {
-        1: {
-            'earliest_beta': '2020-02-13T00:00:00',
-            'mstone': 'fake milestone number',
-            },
-        2: {
-            'earliest_beta': '2020-02-13T00:00:00',
-            'mstone': 'fake milestone number',
-            },
-        3: {
-            'earliest_beta': '2020-02-13T00:00:00',
-            'mstone': 'fake milestone number',
-            },
-        4: {
-            'earliest_beta': '2020-02-13T00:00:00',
-            'mstone': 'fake milestone number',
-            }
+        1: mstone_data,
+        2: mstone_data,
+        3: mstone_data,
+        4: mstone_data,
     }
     self.maxDiff = None
     self.assertEqual(expected, actual)
@@ -21,9 +21,8 @@ from chromestatus_openapi.models.feature_latency import FeatureLatency
 
 from api import channels_api
 from framework import basehandlers
-from internals import stage_helpers
-from internals.core_enums import *
-from internals.core_models import FeatureEntry, Stage
+from internals import ship_milestones
+from internals.ship_milestones import ShippedFeature
 
 
 class FeatureLatencyAPI(basehandlers.APIHandler):
@@ -62,74 +61,34 @@ class FeatureLatencyAPI(basehandlers.APIHandler):
     start_date, end_date = self.get_date_range(self.request.args)
     logging.info('range %r %r', start_date, end_date)
     features = self.get_features_to_consider(start_date, end_date)
-    ship_milestone_by_fid = self.get_shipped_milestones(features)
-    milestone_details = self.get_milestone_details(ship_milestone_by_fid)
+    milestone_details = self.get_milestone_details(features)
     matching_features = self.filter_out_unshipped_features(
-        features, ship_milestone_by_fid, start_date, end_date,
-        milestone_details)
+        features, start_date, end_date, milestone_details)
     result = self.convert_to_result_format(
-        matching_features, ship_milestone_by_fid, milestone_details)
+        matching_features, milestone_details)
     return result
 
   def get_features_to_consider(
-      self, start_date: datetime, end_date: datetime) -> list[FeatureEntry]:
-    """Get all shipped feature entries that were created before end date."""
-    fe_query = FeatureEntry.query().order(FeatureEntry.created)
-    fe_query = fe_query.filter(
-        FeatureEntry.created > start_date - timedelta(days=2*365))
-    fe_query = fe_query.filter(FeatureEntry.created < end_date)
-    features = fe_query.fetch(None)
-    logging.info('features %r', [fe.name for fe in features])
+      self, start_date: datetime, end_date: datetime
+  ) -> list[ShippedFeature]:
+    """Get all shipped features that were created before end date."""
+    min_created = start_date - timedelta(days=2*365)
     features = [
-        fe for fe in features
-        if (not fe.deleted and
-            fe.impl_status_chrome in [ENABLED_BY_DEFAULT, DEPRECATED, REMOVED])]
+        sf for sf in ship_milestones.get_map().values()
+        if min_created < sf.created < end_date]
+    features.sort(key=lambda sf: sf.created)
+    logging.info('features %r', [sf.name for sf in features])
     return features
 
-  def get_shipped_milestones(
-      self, features: list[FeatureEntry]
-  ) -> dict[int, int]:
-    """Get all the ship Stages for those features to find shipping milestones."""
-    feature_ids = {fe.key.integer_id() for fe in features}
-    logging.info('feature_ids %r', feature_ids)
-    if not feature_ids:
-      return {}
-    stage_query = Stage.query()
-    stage_query = stage_query.filter(Stage.feature_id.IN(feature_ids))
-    stage_query = stage_query.filter(Stage.stage_type.IN([
-        STAGE_BLINK_SHIPPING, STAGE_PSA_SHIPPING,
-        STAGE_FAST_SHIPPING, STAGE_DEP_SHIPPING, STAGE_ENT_ROLLOUT]))
-    stages = stage_query.fetch(None)
-    stages = [s for s in stages if not s.archived]
-    if not stages:
-      return {}
-    stages_by_fid = stage_helpers.organize_all_stages_by_feature(stages)
-
-    ship_milestone_by_fid: dict[int, int] = {}
-    for f_id, feature_stages in stages_by_fid.items():
-      for s in feature_stages:
-        if not s or not s.milestones:
-          continue
-        if s.milestones.desktop_first:
-          if (ship_milestone_by_fid.get(f_id, 9999) >
-              s.milestones.desktop_first):
-            ship_milestone_by_fid[f_id] = s.milestones.desktop_first
-        if s.milestones.android_first:
-          if (ship_milestone_by_fid.get(f_id, 9999) >
-              s.milestones.android_first):
-            ship_milestone_by_fid[f_id] = s.milestones.android_first
-
-    return ship_milestone_by_fid
-
   def get_milestone_details(
-      self, ship_milestone_by_fid: dict[int, int]
+      self, features: list[ShippedFeature]
   )-> dict[int, dict[str, Any]] :
     """Get all the milestone details, including branch date."""
-    if not ship_milestone_by_fid:
+    if not features:
       return {}
+    milestones = [sf.milestone for sf in features]
     milestone_details = channels_api.construct_specified_milestones_details(
-        min(ship_milestone_by_fid.values()),
-        max(ship_milestone_by_fid.values()))
+        min(milestones), max(milestones))
     for m in milestone_details:
       logging.info(
           'M%d: branch_point %r', m, milestone_details[m].get('branch_point'))
@@ -137,48 +96,34 @@ class FeatureLatencyAPI(basehandlers.APIHandler):
     return milestone_details
 
   def filter_out_unshipped_features(
-      self, features: list[FeatureEntry],
-      ship_milestone_by_fid: dict[int, int],
+      self, features: list[ShippedFeature],
       start_date: datetime,
       end_date: datetime,
       milestone_details: dict[int, dict[str, Any]]
-  ) -> list[FeatureEntry]:
+  ) -> list[ShippedFeature]:
     """Return only features that shipped in milestones that branched
        between start_date and end_date."""
-    if not milestone_details:
-      return []
     start_date_iso = start_date.isoformat()
     end_date_iso = end_date.isoformat()
-    lowest_milestone_in_range = min(
-      m for m in milestone_details
-      if milestone_details[m].get('branch_point', '0') >= start_date_iso)
-    highest_milestone_in_range = max(
-      m for m in milestone_details
-      if milestone_details[m].get('branch_point', '9') <= end_date_iso)
-    logging.info('highest_milestone_in_range: %r', highest_milestone_in_range)
-    matching_features = [
-        fe for fe in features
-        if (ship_milestone_by_fid.get(fe.key.integer_id()) and
-            lowest_milestone_in_range <=
-            ship_milestone_by_fid[fe.key.integer_id()] <=
-            highest_milestone_in_range)]
+    matching_features = []
+    for sf in features:
+      branch_point = milestone_details.get(sf.milestone, {}).get('branch_point')
+      if branch_point and start_date_iso <= branch_point <= end_date_iso:
+        matching_features.append(sf)
     return matching_features
 
   def convert_to_result_format(
-      self, matching_features: list[FeatureEntry],
-      ship_milestone_by_fid: dict[int, int],
+      self, matching_features: list[ShippedFeature],
       milestone_details: dict[int, dict[str, Any]]
   ) -> list[dict[str, Any]]:
     """Stuff results into OpenAPI objects and convert to python dicts."""
     result = []
-    for fe in matching_features:
-      m = ship_milestone_by_fid.get(fe.key.integer_id())
-      if m and milestone_details[m].get('branch_point'):
-        result.append(FeatureLatency(
-            feature=FeatureLink(id=fe.key.integer_id(), name=fe.name),
-            entry_created_date=fe.created.isoformat(),
-            shipped_milestone=m,
-            shipped_date=milestone_details[m]['branch_point'],
-            owner_emails=fe.owner_emails).to_dict())
+    for sf in matching_features:
+      result.append(FeatureLatency(
+          feature=FeatureLink(id=sf.feature_id, name=sf.name),
+          entry_created_date=sf.created.isoformat(),
+          shipped_milestone=sf.milestone,
+          shipped_date=milestone_details[sf.milestone]['branch_point'],
+          owner_emails=sf.owner_emails).to_dict())
 
     return result
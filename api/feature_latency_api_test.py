@@ -22,6 +22,7 @@ import werkzeug.exceptions  # Flask HTTP stuff.
 from google.cloud import ndb  # type: ignore
 
 from api import feature_latency_api
+from framework import rediscache
 from internals.core_enums import *
 from internals.core_models import FeatureEntry, Stage, MilestoneSet
 
@@ -68,6 +69,7 @@ class FeatureLatencyAPITest(testing_config.CustomTestCase):
     for kind in kinds:
       for entity in kind.query():
         entity.key.delete()
+    rediscache.flushall()
 
   def test_get_date_range__unspecified(self):
     """If query string params were not set, it rejects."""
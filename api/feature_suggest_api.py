@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from framework import basehandlers
+from internals import search_suggest
+
+
+class FeatureSuggestAPI(basehandlers.APIHandler):
+  """Type-ahead completions for the feature search box."""
+
+  def do_get(self, **kwargs):
+    """Return suggestions whose value or name words start with q."""
+    prefix = self.request.args.get('q', '')
+    num = self.get_int_arg('num', search_suggest.DEFAULT_SUGGESTIONS)
+    suggestions = search_suggest.suggest(prefix, num)
+    return {'suggestions': [s.to_json() for s in suggestions]}
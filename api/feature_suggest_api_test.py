@@ -0,0 +1,59 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+import flask
+
+from api import feature_suggest_api
+from framework import rediscache
+from internals import search_suggest
+from internals.core_models import FeatureEntry
+
+test_app = flask.Flask(__name__)
+
+
+class FeatureSuggestAPITest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    rediscache.delete(search_suggest.ROWS_CACHE_KEY)
+    rediscache.delete(search_suggest.VERSION_CACHE_KEY)
+    self.fe = FeatureEntry(
+        name='Typeahead feature', summary='sum', category=1,
+        owner_emails=['typeahead@example.com'])
+    self.fe.put()
+    self.handler = feature_suggest_api.FeatureSuggestAPI()
+    self.request_path = '/api/v0/features/suggest'
+
+  def tearDown(self):
+    self.fe.key.delete()
+
+  def test_get(self):
+    """We can get completions for a prefix."""
+    with test_app.test_request_context(self.request_path + '?q=typeahead'):
+      actual = self.handler.do_get()
+    self.assertEqual(
+        {'suggestions': [
+            {'kind': 'name', 'value': 'Typeahead feature', 'count': 1,
+             'query': 'name="Typeahead feature"'},
+            {'kind': 'owner', 'value': 'typeahead@example.com', 'count': 1,
+             'query': 'owner=typeahead@example.com'},
+        ]},
+        actual)
+
+  def test_get__empty(self):
+    """An empty query has no suggestions."""
+    with test_app.test_request_context(self.request_path):
+      actual = self.handler.do_get()
+    self.assertEqual({'suggestions': []}, actual)
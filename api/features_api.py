@@ -19,7 +19,6 @@ from typing import Any
 from google.cloud import ndb
 
 from api import api_specs
-from api import converters
 from framework import basehandlers
 from framework import permissions
 from framework import rediscache
@@ -33,7 +32,9 @@ from internals import notifier_helpers
 from internals.review_models import Gate
 from internals.data_types import VerboseFeatureDict
 from internals import feature_helpers
+from internals import feature_json_cache
 from internals import search
+from internals import search_facets
 from internals import search_fulltext
 from internals.user_models import AppUser
 import settings
@@ -46,6 +47,8 @@ PATH_PARAMS_ANCHOR_PATTERN = r'([\w.,@?^=%&:/~+#-]*[\w@?^=%&/~+#-])?'
 URL_RE = re.compile(r'\b%s%s%s\b' % (
     SCHEME_PATTERN, DOMAIN_PATTERN, PATH_PARAMS_ANCHOR_PATTERN))
 ALLOWED_SCHEMES = [None, 'http', 'https']
+# Largest number of milestones that the roadmap can request at once.
+MAX_MILESTONE_RANGE = 20
 
 
 class FeaturesAPI(basehandlers.EntitiesAPIHandler):
@@ -58,7 +61,7 @@ class FeaturesAPI(basehandlers.EntitiesAPIHandler):
     user = users.get_current_user()
     if feature.deleted and not permissions.can_edit_feature(user, feature_id):
       self.abort(404, msg='Feature %r not found' % feature_id)
-    return converters.feature_entry_to_json_verbose(feature)
+    return feature_json_cache.get_verbose(feature)
 
   def do_search(self):
     user = users.get_current_user()
@@ -77,6 +80,29 @@ class FeaturesAPI(basehandlers.EntitiesAPIHandler):
           'total_count': total_count,
           }
 
+    # Query-string parameters 'milestone_start' and 'milestone_end' are
+    # provided, e.g., to load every milestone shown on the roadmap at once.
+    milestone_start = self.get_int_arg('milestone_start')
+    milestone_end = self.get_int_arg('milestone_end')
+    if milestone_start and milestone_end:
+      if milestone_start > milestone_end:
+        self.abort(400, msg='milestone_start must not exceed milestone_end')
+      if milestone_end - milestone_start >= MAX_MILESTONE_RANGE:
+        self.abort(400, msg='Cannot request more than %d milestones' %
+                   MAX_MILESTONE_RANGE)
+      milestones = list(range(milestone_start, milestone_end + 1))
+      by_milestone = feature_helpers.get_in_milestones(
+        milestones, show_unlisted=show_unlisted_features)
+      total_count = sum(
+          len(features)
+          for features_by_type in by_milestone.values()
+          for features in features_by_type.values())
+      return {
+          'features_by_milestone': {
+              str(m): by_milestone[m] for m in milestones},
+          'total_count': total_count,
+          }
+
     # Query-string parameter 'releaseNotesMilestone' is provided
     release_notes_milestone = self.get_int_arg('releaseNotesMilestone')
     if release_notes_milestone:
@@ -91,20 +117,32 @@ class FeaturesAPI(basehandlers.EntitiesAPIHandler):
     sort_spec = self.request.args.get('sort')
     num = self.get_int_arg('num', search.DEFAULT_RESULTS_PER_PAGE)
     start = self.get_int_arg('start', 0)
+    # An opaque cursor from the next_cursor of a previous response.
+    cursor = self.request.args.get('cursor')
+    estimate_count = self.get_bool_arg('estimate_count')
 
     show_enterprise = (
         'feature_type' in user_query or self.get_bool_arg('showEnterprise'))
     try:
-      features_on_page, total_count = search.process_query(
+      # Comma-separated fields to count all matching features by.
+      facets = search_facets.parse_facets(self.request.args.get('facets'))
+      page = search.process_query_page(
           user_query, sort_spec=sort_spec, show_unlisted=show_unlisted_features,
-          show_enterprise=show_enterprise, start=start, num=num)
+          show_enterprise=show_enterprise, start=start, num=num,
+          cursor=cursor, estimate_count=estimate_count, facets=facets)
     except ValueError as err:
       self.abort(400, msg=str(err))
 
-    return {
-        'total_count': total_count,
-        'features': features_on_page,
+    result = {
+        'total_count': page.total_count,
+        'features': page.features,
+        'next_cursor': page.next_cursor,
         }
+    if page.is_estimate:
+      result['total_count_is_estimate'] = True
+    if page.facet_counts is not None:
+      result['facets'] = page.facet_counts
+    return result
 
   def do_get(self, **kwargs):
     """Handle GET requests for a single feature or a search."""
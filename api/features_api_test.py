@@ -21,6 +21,7 @@ import werkzeug.exceptions  # Flask HTTP stuff.
 
 from api import features_api
 from internals import core_enums
+from internals import feature_json_cache
 from internals.core_models import FeatureEntry, MilestoneSet, Stage
 from internals.review_models import Gate
 from internals import user_models
@@ -236,6 +237,50 @@ class FeaturesAPITest(testing_config.CustomTestCase):
       with self.assertRaises(werkzeug.exceptions.BadRequest):
         self.handler.do_get()
 
+  def test_get__bad_query(self):
+    """Reject queries with unmatched parentheses."""
+    url = self.request_path + '?q=(category=1'
+    with test_app.test_request_context(url):
+      with self.assertRaises(werkzeug.exceptions.BadRequest):
+        self.handler.do_get()
+
+  def test_get__all_listed__cursor(self):
+    """We can page through features using next_cursor."""
+    url = self.request_path + '?num=1'
+    with test_app.test_request_context(url):
+      actual = self.handler.do_get()
+    self.assertEqual('feature two', actual['features'][0]['name'])
+    self.assertIsNotNone(actual['next_cursor'])
+
+    url = self.request_path + '?num=1&cursor=' + actual['next_cursor']
+    with test_app.test_request_context(url):
+      actual = self.handler.do_get()
+    self.assertEqual('feature one', actual['features'][0]['name'])
+    self.assertIsNone(actual['next_cursor'])
+
+    url = self.request_path + '?cursor=bad'
+    with test_app.test_request_context(url):
+      with self.assertRaises(werkzeug.exceptions.BadRequest):
+        self.handler.do_get()
+
+  def test_get__facets(self):
+    """We can count all listed features by the requested fields."""
+    url = self.request_path + '?num=1&facets=category,feature_type'
+    with test_app.test_request_context(url):
+      actual = self.handler.do_get()
+    self.assertEqual(1, len(actual['features']))
+    self.assertEqual(
+        [(1, 2)],
+        [(c['value'], c['count']) for c in actual['facets']['category']])
+    self.assertCountEqual(
+        [(0, 1), (1, 1)],
+        [(c['value'], c['count']) for c in actual['facets']['feature_type']])
+
+    url = self.request_path + '?facets=name'
+    with test_app.test_request_context(url):
+      with self.assertRaises(werkzeug.exceptions.BadRequest):
+        self.handler.do_get()
+
   def test_get__all_unlisted_no_perms(self):
     """JSON feed does not include unlisted features for users who can't edit."""
     self.feature_1.unlisted = True
@@ -370,6 +415,36 @@ class FeaturesAPITest(testing_config.CustomTestCase):
     self.assertEqual(0, actual['total_count'])
     self.assertEqual(0, len(actual['features_by_type']['Enabled by default']))
 
+  def test_get__in_milestone_range(self):
+    """Get all features in a range of milestones in one request."""
+    with test_app.test_request_context(
+        self.request_path+'?milestone_start=1&milestone_end=3'):
+      actual = self.handler.do_get()
+    self.assertEqual(['1', '2', '3'], list(actual['features_by_milestone']))
+    self.assertEqual(1, actual['total_count'])
+    by_milestone = actual['features_by_milestone']
+    self.assertEqual(6, len(by_milestone['3']))
+    self.assertEqual(
+        ['feature one'],
+        [f['name'] for f in by_milestone['1']['Enabled by default']])
+
+    # The result matches what a single milestone request would return.
+    with test_app.test_request_context(self.request_path+'?milestone=1'):
+      single = self.handler.do_get()
+    self.assertEqual(single['features_by_type'], by_milestone['1'])
+
+  def test_get__in_milestone_range_invalid(self):
+    """Ranges that are reversed or too large are rejected."""
+    with test_app.test_request_context(
+        self.request_path+'?milestone_start=3&milestone_end=1'):
+      with self.assertRaises(werkzeug.exceptions.BadRequest):
+        self.handler.do_get()
+
+    with test_app.test_request_context(
+        self.request_path+'?milestone_start=1&milestone_end=100'):
+      with self.assertRaises(werkzeug.exceptions.BadRequest):
+        self.handler.do_get()
+
   def test_get__in_milestone_invalid_query(self):
     """Invalid value of milestone should not be processed."""
     with test_app.test_request_context(
@@ -388,6 +463,18 @@ class FeaturesAPITest(testing_config.CustomTestCase):
       actual = self.handler.do_get(feature_id=self.feature_1_id)
     self.assertEqual('feature one', actual['name'])
 
+  def test_get__specific_id__cached(self):
+    """A single feature is served from the verbose JSON cache."""
+    cache_key = feature_json_cache.cache_key(self.feature_1_id)
+    entry = rediscache.get(cache_key)
+    entry['feature'] = dict(entry['feature'], name='cached name')
+    rediscache.set(cache_key, entry)
+
+    request_path = self.request_path + '/' + str(self.feature_1_id)
+    with test_app.test_request_context(request_path):
+      actual = self.handler.do_get(feature_id=self.feature_1_id)
+    self.assertEqual('cached name', actual['name'])
+
   def test_get__specific_id__not_found(self):
     """We give 404 if the requested feature was not found."""
     request_path = self.request_path + '/999'
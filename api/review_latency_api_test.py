@@ -16,14 +16,19 @@ import testing_config  # isort: split
 
 from datetime import datetime
 
+import flask
 from unittest import mock
 from google.cloud import ndb  # type: ignore
+import werkzeug.exceptions  # Flask HTTP stuff.
 
 from api import review_latency_api
 from internals.core_enums import *
 from internals.core_models import FeatureEntry
+from internals.review_latency import FeatureReviewLatency
 from internals.review_models import Gate
 
+test_app = flask.Flask(__name__)
+
 
 def make_feature_and_gates(name):
   fe = FeatureEntry(name=name, summary='sum', category=1)
@@ -53,14 +58,15 @@ class ReviewLatencyAPITest(testing_config.CustomTestCase):
     self.last_week = datetime(2024, 3, 15)
 
   def tearDown(self):
-    kinds: list[ndb.Model] = [FeatureEntry, Gate]
+    kinds: list[ndb.Model] = [FeatureEntry, Gate, FeatureReviewLatency]
     for kind in kinds:
       for entity in kind.query():
         entity.key.delete()
 
   def test_do_get__nothing_requested(self):
     """When no reviews have been started, the result is empty."""
-    actual = self.handler.do_get(today=self.today)
+    with test_app.test_request_context(self.request_path):
+      actual = self.handler.do_get(today=self.today)
     self.assertEqual([], actual)
 
   def test_do_get__normal(self):
@@ -71,7 +77,8 @@ class ReviewLatencyAPITest(testing_config.CustomTestCase):
     self.g_1_2.requested_on = self.last_week
     self.g_1_2.put()
 
-    actual = self.handler.do_get(today=self.today)
+    with test_app.test_request_context(self.request_path):
+      actual = self.handler.do_get(today=self.today)
 
     expected = [
         { 'feature': {'name': 'Feature one', 'id': self.fe_1_id},
@@ -99,7 +106,8 @@ class ReviewLatencyAPITest(testing_config.CustomTestCase):
     self.g_2_1.responded_on = self.yesterday
     self.g_2_1.put()
 
-    actual = self.handler.do_get(today=self.today)
+    with test_app.test_request_context(self.request_path):
+      actual = self.handler.do_get(today=self.today)
 
     expected = [
         { 'feature': {'name': 'Feature two', 'id': self.fe_2_id},
@@ -124,3 +132,29 @@ class ReviewLatencyAPITest(testing_config.CustomTestCase):
          },
     ]
     self.assertEqual(expected, actual)
+
+  def test_do_get__date_window(self):
+    """Only features with a review requested in the window are included."""
+    self.g_1_1.requested_on = self.last_week
+    self.g_1_1.put()
+    self.g_2_1.requested_on = self.yesterday
+    self.g_2_1.put()
+
+    path = self.request_path + '?startAt=2024-03-14&endAt=2024-03-20'
+    with test_app.test_request_context(path):
+      actual = self.handler.do_get(today=self.today)
+    self.assertEqual(
+        [self.fe_1_id], [r['feature']['id'] for r in actual])
+
+    path = self.request_path + '?startAt=2024-03-16'
+    with test_app.test_request_context(path):
+      actual = self.handler.do_get(today=self.today)
+    self.assertEqual(
+        [self.fe_2_id], [r['feature']['id'] for r in actual])
+
+  def test_do_get__bad_date(self):
+    """We reject dates that cannot be parsed."""
+    path = self.request_path + '?startAt=last-week'
+    with test_app.test_request_context(path):
+      with self.assertRaises(werkzeug.exceptions.BadRequest):
+        self.handler.do_get(today=self.today)
@@ -17,6 +17,7 @@ import werkzeug.exceptions  # Flask HTTP stuff.
 
 import testing_config  # Must be imported before the module under test.
 from api import stars_api
+from framework import rediscache
 from internals import notifier
 from internals.core_models import FeatureEntry
 
@@ -34,8 +35,10 @@ class StarsAPITest(testing_config.CustomTestCase):
 
   def tearDown(self):
     self.fe_1.key.delete()
-    for star in notifier.FeatureStar.query():
-      star.key.delete()
+    for kind in [notifier.FeatureStar, notifier.FeatureStarCounterShard]:
+      for entity in kind.query():
+        entity.key.delete()
+    rediscache.flushall()
 
   def test_get__anon(self):
     """Anon should always have an empty list of stars."""
@@ -100,22 +103,26 @@ class StarsAPITest(testing_config.CustomTestCase):
     with test_app.test_request_context(self.request_path, json=params):
       self.handler.do_post()  # Original request
 
+    notifier.flush_star_counts()
     updated_fe = FeatureEntry.get_by_id(feature_id)
     self.assertEqual(1, updated_fe.star_count)
 
     with test_app.test_request_context(self.request_path, json=params):
       self.handler.do_post()  # Duplicate request
+    notifier.flush_star_counts()
     updated_fe = FeatureEntry.get_by_id(feature_id)
     self.assertEqual(1, updated_fe.star_count)  # Still 1, not 2.
 
     params = {"featureId": feature_id, "starred": False}
     with test_app.test_request_context(self.request_path, json=params):
       self.handler.do_post()  # Original request
+    notifier.flush_star_counts()
     updated_fe = FeatureEntry.get_by_id(feature_id)
     self.assertEqual(0, updated_fe.star_count)
 
     with test_app.test_request_context(self.request_path, json=params):
       self.handler.do_post()  # Duplicate request
+    notifier.flush_star_counts()
     updated_fe = FeatureEntry.get_by_id(feature_id)
     self.assertEqual(0, updated_fe.star_count)  # Still 0, not negative.
 
@@ -129,6 +136,7 @@ class StarsAPITest(testing_config.CustomTestCase):
     params = {"featureId": feature_id, "starred": False}
     with test_app.test_request_context(self.request_path, json=params):
       self.handler.do_post()  # Out-of-step request
+    notifier.flush_star_counts()
     updated_fe = FeatureEntry.get_by_id(feature_id)
     self.assertEqual(0, updated_fe.star_count)  # Still 0, not negative.
 
@@ -140,11 +148,13 @@ class StarsAPITest(testing_config.CustomTestCase):
     params = {"featureId": feature_id}
     with test_app.test_request_context(self.request_path, json=params):
       self.handler.do_post()
+    notifier.flush_star_counts()
     updated_fe = FeatureEntry.get_by_id(feature_id)
     self.assertEqual(1, updated_fe.star_count)
 
     params = {"featureId": feature_id, "starred": False}
     with test_app.test_request_context(self.request_path, json=params):
       self.handler.do_post()
+    notifier.flush_star_counts()
     updated_fe = FeatureEntry.get_by_id(feature_id)
     self.assertEqual(0, updated_fe.star_count)
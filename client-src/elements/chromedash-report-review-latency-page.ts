@@ -59,9 +59,10 @@ export class ChromedashReportReviewLatencyPage extends LitElement {
   @property({attribute: false})
   private _reviewLatencyTask: Task<never[], void> = new Task(this, {
     task: async ([], {signal}) => {
-      this.reviewLatencyList = await this._client.listReviewsWithLatency({
-        signal,
-      });
+      this.reviewLatencyList = await this._client.listReviewsWithLatency(
+        {},
+        {signal}
+      );
     },
     args: () => [],
   });
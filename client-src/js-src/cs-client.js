@@ -572,6 +572,12 @@ export class ChromeStatusClient {
     );
   }
 
+  async getFeaturesInMilestones(milestoneStart, milestoneEnd) {
+    return this.doGet(
+      `/features?milestone_start=${milestoneStart}&milestone_end=${milestoneEnd}`
+    ).then(resp => resp['features_by_milestone']);
+  }
+
   async getFeaturesForEnterpriseReleaseNotes(milestone) {
     return this.doGet(`/features?releaseNotesMilestone=${milestone}`);
   }
@@ -716,6 +716,24 @@ def ndb_wsgi_middleware(wsgi_app):
   return middleware
 
 
+def stream_with_ndb_context(make_iterator):
+  """Return an iterator for a streamed response body that can use ndb.
+
+  Flask iterates over a streamed body after ndb_wsgi_middleware has
+  closed the request's ndb context, so open a new one while streaming.
+  """
+  client = ndb.get_context().client
+
+  def generate():
+    if ndb.get_context(raise_context_error=False):
+      yield from make_iterator()
+    else:
+      with client.context():
+        yield from make_iterator()
+
+  return generate()
+
+
 class SPAHandler(FlaskHandler):
   """Single-page app handler"""
 
@@ -18,6 +18,9 @@
 
 import logging
 import json
+import queue
+import threading
+import time
 
 import requests
 
@@ -34,14 +37,137 @@ _client = None
 
 # Default exponential backoff retry config for enqueueing, not to be confused
 # with retry config for dispatching, which exists per queue.
+_RETRY_INITIAL = .1
+_RETRY_MAXIMUM = 1.6
+_RETRY_MULTIPLIER = 2
+_RETRY_DEADLINE = 10
 _DEFAULT_RETRY = None
 if not settings.UNIT_TEST_MODE:
   _DEFAULT_RETRY = retry.Retry(
-      initial=.1, maximum=1.6, multiplier=2, deadline=10)
+      initial=_RETRY_INITIAL, maximum=_RETRY_MAXIMUM,
+      multiplier=_RETRY_MULTIPLIER, deadline=_RETRY_DEADLINE)
+
+
+def _post_to_handler(task):
+  """Make a local HTTP request to the task handler and return the response."""
+  uri = task.get('app_engine_http_request').get('relative_uri')
+  target_url = 'http://localhost:8080' + uri
+  body = task.get('app_engine_http_request').get('body')
+  logging.info('Making request to %r', target_url)
+  handler_response = requests.request('POST',
+      target_url, data=body, allow_redirects=False,
+      # This header can only be set on internal requests, not by users.
+      headers={'X-AppEngine-QueueName': 'default'})
+  logging.info('Task handler status: %d', handler_response.status_code)
+  logging.info('Task handler text: %r',
+               handler_response.content[:settings.MAX_LOG_LINE])
+  return handler_response
+
+
+class LocalTaskQueue(object):
+  """In-process task queue that dispatches tasks on a pool of worker threads.
+
+  Failed tasks are retried with the same exponential backoff parameters
+  that we use for _DEFAULT_RETRY in production.  Call drain() to block
+  until every enqueued task has finished, e.g., at the end of a test.
+  """
+
+  def __init__(self, num_workers=4, dispatch=_post_to_handler,
+               initial=_RETRY_INITIAL, maximum=_RETRY_MAXIMUM,
+               multiplier=_RETRY_MULTIPLIER, deadline=_RETRY_DEADLINE):
+    self.num_workers = num_workers
+    self.dispatch = dispatch
+    self.initial = initial
+    self.maximum = maximum
+    self.multiplier = multiplier
+    self.deadline = deadline
+    self._queue = queue.Queue()
+    self._lock = threading.Lock()
+    self._workers = []
+    self._in_flight = 0
+    self._counts = {
+        'enqueued': 0,
+        'succeeded': 0,
+        'failed': 0,
+        'retried': 0,
+        }
+
+  def _ensure_workers(self):
+    """Start the worker threads the first time that they are needed."""
+    with self._lock:
+      while len(self._workers) < self.num_workers:
+        worker = threading.Thread(
+            target=self._work, daemon=True,
+            name='local-task-worker-%d' % len(self._workers))
+        worker.start()
+        self._workers.append(worker)
+
+  def put(self, task):
+    """Add a task to the queue to be dispatched by a worker."""
+    with self._lock:
+      self._counts['enqueued'] += 1
+    self._queue.put(task)
+    self._ensure_workers()
+
+  def _work(self):
+    """Worker loop: pull tasks off the queue forever."""
+    while True:
+      task = self._queue.get()
+      with self._lock:
+        self._in_flight += 1
+      succeeded = False
+      try:
+        succeeded = self._run_with_retry(task)
+      finally:
+        with self._lock:
+          self._in_flight -= 1
+          self._counts['succeeded' if succeeded else 'failed'] += 1
+        self._queue.task_done()
+
+  def _run_with_retry(self, task):
+    """Dispatch one task, retrying with backoff until the deadline passes."""
+    give_up_at = time.monotonic() + self.deadline
+    delay = self.initial
+    while True:
+      try:
+        response = self.dispatch(task)
+        if response is None or response.status_code < 400:
+          return True
+        logging.warning('Task handler returned %d', response.status_code)
+      except Exception:
+        logging.exception('Task dispatch failed')
+
+      if time.monotonic() + delay > give_up_at:
+        logging.error('Giving up on task after %r seconds', self.deadline)
+        return False
+      with self._lock:
+        self._counts['retried'] += 1
+      time.sleep(delay)
+      delay = min(delay * self.multiplier, self.maximum)
+
+  def get_metrics(self):
+    """Return a dict of queue depth and task outcome counters."""
+    with self._lock:
+      metrics = dict(self._counts)
+      metrics['depth'] = self._queue.qsize()
+      metrics['in_flight'] = self._in_flight
+      metrics['workers'] = len(self._workers)
+    return metrics
+
+  def drain(self):
+    """Block until all enqueued tasks, including retries, have finished."""
+    self._queue.join()
 
 
 class LocalCloudTasksClient(object):
-  """We have no GCT server running locally, so hit the target synchronously."""
+  """We have no GCT server running locally, so hit the target ourselves.
+
+  If a LocalTaskQueue is given, tasks are handed off to its workers.
+  Otherwise, each task handler is hit synchronously.
+  """
+
+  def __init__(self, task_queue=None):
+    self.task_queue = task_queue
 
   def queue_path(self, project, location, queue):
     """Return a fully-qualified queue string."""
@@ -50,18 +176,16 @@ class LocalCloudTasksClient(object):
         project=project, location=location, queue=queue)
 
   def create_task(self, parent=None, task=None, **kwargs):
-    """Immediately hit the target URL."""
-    uri = task.get('app_engine_http_request').get('relative_uri')
-    target_url = 'http://localhost:8080' + uri
-    body = task.get('app_engine_http_request').get('body')
-    logging.info('Making request to %r', target_url)
-    handler_response = requests.request('POST',
-        target_url, data=body, allow_redirects=False,
-        # This header can only be set on internal requests, not by users.
-        headers={'X-AppEngine-QueueName': 'default'})
-    logging.info('Task handler status: %d', handler_response.status_code)
-    logging.info('Task handler text: %r',
-                 handler_response.content[:settings.MAX_LOG_LINE])
+    """Enqueue the task locally, or immediately hit the target URL."""
+    if self.task_queue:
+      self.task_queue.put(task)
+      return
+    _post_to_handler(task)
+
+  def drain(self):
+    """Wait for any locally queued tasks to finish."""
+    if self.task_queue:
+      self.task_queue.drain()
 
 
 def _get_client():
@@ -69,7 +193,10 @@ def _get_client():
   global _client
   if not _client:
     if settings.DEV_MODE:
-      _client = LocalCloudTasksClient()
+      task_queue = None
+      if settings.LOCAL_TASK_WORKERS:
+        task_queue = LocalTaskQueue(num_workers=settings.LOCAL_TASK_WORKERS)
+      _client = LocalCloudTasksClient(task_queue=task_queue)
     else:
       _client = tasks.CloudTasksClient()
   return _client
@@ -107,3 +234,10 @@ def enqueue_task(handler_path, task_params, queue='default', **kwargs):
 
   kwargs.setdefault('retry', _DEFAULT_RETRY)
   return client.create_task(parent=parent, task=task, **kwargs)
+
+
+def drain():
+  """Block until any tasks queued in-process have finished running."""
+  client = _get_client()
+  if hasattr(client, 'drain'):
+    client.drain()
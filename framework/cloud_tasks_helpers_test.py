@@ -52,6 +52,82 @@ class LocalCloudTasksClientTest(unittest.TestCase):
         allow_redirects=False,
         headers={'X-AppEngine-QueueName': 'default'})
 
+  @mock.patch('requests.request')
+  def test_create_task__queued(self, mock_fetch):
+    """When given a task queue, the task is dispatched by a worker."""
+    mock_fetch.return_value = testing_config.Blank(
+        status_code=200, content='content')
+    task_queue = cloud_tasks_helpers.LocalTaskQueue(num_workers=2)
+    client = cloud_tasks_helpers.LocalCloudTasksClient(task_queue=task_queue)
+    task = cloud_tasks_helpers._make_task('/handler', {'a': 1})
+
+    actual = client.create_task('parent', task)
+    client.drain()
+
+    self.assertIsNone(actual)
+    mock_fetch.assert_called_once_with(
+        'POST',
+        'http://localhost:8080/handler',
+        data=b'{"a": 1}',
+        allow_redirects=False,
+        headers={'X-AppEngine-QueueName': 'default'})
+
+
+class LocalTaskQueueTest(unittest.TestCase):
+
+  def make_queue(self, dispatch, deadline=1):
+    return cloud_tasks_helpers.LocalTaskQueue(
+        num_workers=3, dispatch=dispatch, initial=0.001, maximum=0.004,
+        multiplier=2, deadline=deadline)
+
+  def test_drain__runs_all_tasks(self):
+    """All tasks are dispatched by the worker pool before drain() returns."""
+    dispatched = []
+    task_queue = self.make_queue(dispatched.append)
+
+    for i in range(10):
+      task_queue.put(i)
+    task_queue.drain()
+
+    self.assertCountEqual(list(range(10)), dispatched)
+    metrics = task_queue.get_metrics()
+    self.assertEqual(10, metrics['enqueued'])
+    self.assertEqual(10, metrics['succeeded'])
+    self.assertEqual(0, metrics['failed'])
+    self.assertEqual(0, metrics['depth'])
+    self.assertEqual(0, metrics['in_flight'])
+    self.assertEqual(3, metrics['workers'])
+
+  def test_run_with_retry__eventually_succeeds(self):
+    """A task that fails with a server error is retried."""
+    responses = [
+        testing_config.Blank(status_code=500),
+        testing_config.Blank(status_code=503),
+        testing_config.Blank(status_code=200),
+    ]
+    task_queue = self.make_queue(lambda task: responses.pop(0))
+
+    task_queue.put('task')
+    task_queue.drain()
+
+    metrics = task_queue.get_metrics()
+    self.assertEqual(1, metrics['succeeded'])
+    self.assertEqual(2, metrics['retried'])
+
+  def test_run_with_retry__gives_up_after_deadline(self):
+    """A task that keeps raising is abandoned once the deadline passes."""
+    def dispatch(task):
+      raise ValueError('boom')
+    task_queue = self.make_queue(dispatch, deadline=0.01)
+
+    task_queue.put('task')
+    task_queue.drain()
+
+    metrics = task_queue.get_metrics()
+    self.assertEqual(0, metrics['succeeded'])
+    self.assertEqual(1, metrics['failed'])
+    self.assertTrue(metrics['retried'] >= 1)
+
 
 class CloudTasksHelpersTest(unittest.TestCase):
 
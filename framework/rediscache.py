@@ -18,6 +18,7 @@
 import os
 import pickle
 import logging
+import uuid
 import settings
 
 import redis
@@ -138,6 +139,222 @@ def delete_keys_with_prefix(pattern):
     redis_client.delete(key)
 
 
+def get_set(key):
+  """Return the members of the set stored at key as strs, or None."""
+  if redis_client is None:
+    return None
+
+  cache_key = add_gae_prefix(key)
+  if not redis_client.exists(cache_key):
+    return None
+  return {m.decode() for m in redis_client.smembers(cache_key)}
+
+
+def replace_set(key, members, time=86400, guard_key=None, guard_value=None):
+  """
+  Replace the set stored at key with the given members.
+
+  If guard_key is given, the set is only replaced if the value of
+  guard_key is still guard_value.  Returns True if the set was replaced.
+
+  ``time`` sets the expire time for this key, in seconds.
+  """
+  if redis_client is None:
+    return False
+
+  cache_key = add_gae_prefix(key)
+  with redis_client.pipeline() as pipe:
+    try:
+      if not _guard_matches(pipe, guard_key, guard_value):
+        return False
+      pipe.multi()
+      pipe.delete(cache_key)
+      if members:
+        pipe.sadd(cache_key, *[str(m) for m in members])
+        if time:
+          pipe.expire(cache_key, time)
+      pipe.execute()
+      return True
+    except redis.WatchError:
+      return False
+
+
+def add_to_set(key, member):
+  """Redis SADD adds member to the set stored at key, if it exists.
+
+  Returns True if the set was cached.
+  """
+  return _update_if_exists(key, lambda pipe, cache_key: pipe.sadd(
+      cache_key, str(member)))
+
+
+def remove_from_set(key, member):
+  """Redis SREM removes member from the set stored at key, if it exists.
+
+  Returns True if the set was cached.
+  """
+  return _update_if_exists(key, lambda pipe, cache_key: pipe.srem(
+      cache_key, str(member)))
+
+
+def get_hash(key):
+  """Return the fields of the hash stored at key as {str: value}, or None."""
+  if redis_client is None:
+    return None
+
+  cache_key = add_gae_prefix(key)
+  raw_fields = redis_client.hgetall(cache_key)
+  if not raw_fields:
+    return None
+  return {f.decode(): pickle.loads(v) for f, v in raw_fields.items()}
+
+
+def get_hash_field(key, field):
+  """Redis HGET gets one field of the hash stored at key, or None."""
+  if redis_client is None:
+    return None
+
+  cache_key = add_gae_prefix(key)
+  raw_value = redis_client.hget(cache_key, str(field))
+  if raw_value is None:
+    return None
+  return pickle.loads(raw_value)
+
+
+def set_hash_field(key, field, value):
+  """Redis HSET sets one field of the hash stored at key, if it exists.
+
+  A hash that is not cached is left alone so that it is not mistaken for
+  a complete hash later.  Returns True if the field was set.
+  """
+  return _update_if_exists(key, lambda pipe, cache_key: pipe.hset(
+      cache_key, str(field), pickle.dumps(value)))
+
+
+def delete_hash_field(key, field):
+  """Redis HDEL removes one field of the hash stored at key."""
+  if redis_client is None:
+    return
+
+  cache_key = add_gae_prefix(key)
+  redis_client.hdel(cache_key, str(field))
+
+
+def replace_hash(key, fields, time=86400, guard_key=None, guard_value=None):
+  """
+  Replace the hash stored at key with the given {field: value} dict.
+
+  If guard_key is given, the hash is only replaced if the value of
+  guard_key is still guard_value.  Returns True if the hash was replaced.
+
+  ``time`` sets the expire time for this key, in seconds.
+  """
+  if redis_client is None:
+    return False
+
+  cache_key = add_gae_prefix(key)
+  with redis_client.pipeline() as pipe:
+    try:
+      if not _guard_matches(pipe, guard_key, guard_value):
+        return False
+      pipe.multi()
+      pipe.delete(cache_key)
+      if fields:
+        pipe.hset(
+            cache_key,
+            mapping={str(f): pickle.dumps(v) for f, v in fields.items()})
+        if time:
+          pipe.expire(cache_key, time)
+      pipe.execute()
+      return True
+    except redis.WatchError:
+      return False
+
+
+def _update_if_exists(key, update):
+  """Apply update(pipe, cache_key) atomically if key exists.
+
+  A value that is not cached is left alone so that a partial value is
+  not mistaken for a complete one later.  Returns True if it was updated.
+  """
+  if redis_client is None:
+    return False
+
+  cache_key = add_gae_prefix(key)
+  with redis_client.pipeline() as pipe:
+    while True:
+      try:
+        pipe.watch(cache_key)
+        if not pipe.exists(cache_key):
+          return False
+        pipe.multi()
+        update(pipe, cache_key)
+        pipe.execute()
+        return True
+      except redis.WatchError:
+        continue  # The value changed before we updated it, so try again.
+
+
+def _guard_matches(pipe, guard_key, guard_value):
+  """WATCH guard_key and return True if it is unguarded or has guard_value."""
+  if guard_key is None:
+    return True
+  guard_cache_key = add_gae_prefix(guard_key)
+  pipe.watch(guard_cache_key)
+  raw_guard = pipe.get(guard_cache_key)
+  current = pickle.loads(raw_guard) if raw_guard is not None else None
+  return current == guard_value
+
+
+# A complete hash caches one field per entity, e.g., per feature, along
+# with this field, so that a hash that only has fields set since it
+# expired is not mistaken for the values of all entities.  Entity IDs
+# are never 0.  Its version key changes with every update, so that a
+# hash that was being built from the datastore at the same time is not
+# cached without that update.
+COMPLETE_FIELD = '0'
+
+
+def get_complete_hash(key):
+  """Return the fields of a complete hash, without COMPLETE_FIELD, or None."""
+  fields = get_hash(key)
+  if not fields or COMPLETE_FIELD not in fields:
+    return None
+  del fields[COMPLETE_FIELD]
+  return fields
+
+
+def replace_complete_hash(key, fields, version_key, version, time=86400):
+  """
+  Cache fields as a complete hash, unless version_key is no longer version.
+
+  version should be read from version_key before fields are loaded from
+  the datastore.  Returns True if the hash was replaced.
+  """
+  complete_fields = {str(f): v for f, v in fields.items()}
+  complete_fields[COMPLETE_FIELD] = True
+  return replace_hash(
+      key, complete_fields, time=time,
+      guard_key=version_key, guard_value=version)
+
+
+def update_complete_hash_field(key, field, value, version_key, time=86400):
+  """
+  Replace one field of a complete hash and change its version.
+
+  A falsy value deletes the field.  Nothing is done if the field already
+  has value.  Returns True if the field changed.
+  """
+  if value and get_hash_field(key, field) == value:
+    return False
+  if value:
+    set_hash_field(key, field, value)
+  else:
+    delete_hash_field(key, field)
+  set(version_key, uuid.uuid4().hex, time=time)
+  return True
+
+
 def flushall():
   """Delete all the keys in Redis, https://redis.io/commands/flushall/."""
   if redis_client is None:
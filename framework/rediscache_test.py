@@ -25,6 +25,8 @@ KEY_4 = 'cache_key|4'
 KEY_5 = 'cache_key|5'
 KEY_6 = 'cache_key|6'
 KEY_7 = 'cache_key|7'
+KEY_8 = 'cache_key|8'
+KEY_9 = 'cache_key|9'
 
 
 class RedisCacheFunctionTests(testing_config.CustomTestCase):
@@ -85,3 +87,88 @@ class RedisCacheFunctionTests(testing_config.CustomTestCase):
     self.assertEqual(None, rediscache.get(KEY_2))
     self.assertEqual('303', rediscache.get('random_key'))
     self.assertEqual('404', rediscache.get('random_key1'))
+
+  def test_sets(self):
+    """We can cache a set and replace it."""
+    self.assertIsNone(rediscache.get_set(KEY_7))
+    rediscache.replace_set(KEY_7, ['0', 1, 2])
+    self.assertEqual({'0', '1', '2'}, rediscache.get_set(KEY_7))
+
+    rediscache.replace_set(KEY_7, ['4'], 3600)
+    self.assertEqual({'4'}, rediscache.get_set(KEY_7))
+    rediscache.replace_set(KEY_7, [])
+    self.assertIsNone(rediscache.get_set(KEY_7))
+
+  def test_sets__members(self):
+    """We can add and remove members of a set only while it is cached."""
+    self.assertFalse(rediscache.add_to_set(KEY_7, 1))
+    self.assertIsNone(rediscache.get_set(KEY_7))
+
+    rediscache.replace_set(KEY_7, ['0', 1])
+    self.assertTrue(rediscache.add_to_set(KEY_7, 2))
+    self.assertTrue(rediscache.remove_from_set(KEY_7, 1))
+    self.assertEqual({'0', '2'}, rediscache.get_set(KEY_7))
+
+  def test_replace_set__guard(self):
+    """A guarded set is only replaced if the guard key is unchanged."""
+    rediscache.set(KEY_9, 'v1')
+    self.assertFalse(rediscache.replace_set(
+        KEY_7, ['0'], guard_key=KEY_9, guard_value='v0'))
+    self.assertIsNone(rediscache.get_set(KEY_7))
+    self.assertTrue(rediscache.replace_set(
+        KEY_7, ['0'], guard_key=KEY_9, guard_value='v1'))
+    self.assertEqual({'0'}, rediscache.get_set(KEY_7))
+
+  def test_hashes(self):
+    """We can cache a hash and change one field at a time."""
+    self.assertIsNone(rediscache.get_hash(KEY_8))
+    # Setting a field of a hash that is not cached does not create one.
+    self.assertFalse(rediscache.set_hash_field(KEY_8, 1, 'a'))
+    self.assertIsNone(rediscache.get_hash(KEY_8))
+
+    self.assertTrue(rediscache.replace_hash(KEY_8, {1: 'a', 2: ['b']}))
+    self.assertEqual({'1': 'a', '2': ['b']}, rediscache.get_hash(KEY_8))
+    self.assertTrue(rediscache.set_hash_field(KEY_8, 3, 'c'))
+    rediscache.delete_hash_field(KEY_8, 1)
+    self.assertEqual({'2': ['b'], '3': 'c'}, rediscache.get_hash(KEY_8))
+    self.assertEqual('c', rediscache.get_hash_field(KEY_8, 3))
+    self.assertIsNone(rediscache.get_hash_field(KEY_8, 1))
+
+  def test_replace_hash__guard(self):
+    """A guarded hash is only replaced if the guard key is unchanged."""
+    rediscache.set(KEY_9, 'v1')
+    self.assertFalse(rediscache.replace_hash(
+        KEY_8, {1: 'a'}, guard_key=KEY_9, guard_value='v0'))
+    self.assertIsNone(rediscache.get_hash(KEY_8))
+    self.assertTrue(rediscache.replace_hash(
+        KEY_8, {1: 'a'}, guard_key=KEY_9, guard_value='v1'))
+    self.assertEqual({'1': 'a'}, rediscache.get_hash(KEY_8))
+
+  def test_complete_hash(self):
+    """A complete hash is only read back once it was fully cached."""
+    # A field set while the hash is not cached does not make it complete.
+    self.assertTrue(
+        rediscache.update_complete_hash_field(KEY_8, 1, 'a', KEY_9))
+    self.assertIsNone(rediscache.get_complete_hash(KEY_8))
+
+    version = rediscache.get(KEY_9)
+    self.assertTrue(rediscache.replace_complete_hash(
+        KEY_8, {1: 'a', 2: 'b'}, KEY_9, version))
+    self.assertEqual({'1': 'a', '2': 'b'}, rediscache.get_complete_hash(KEY_8))
+
+    # An unchanged field leaves the version alone.
+    self.assertFalse(
+        rediscache.update_complete_hash_field(KEY_8, 1, 'a', KEY_9))
+    self.assertEqual(version, rediscache.get(KEY_9))
+    self.assertTrue(
+        rediscache.update_complete_hash_field(KEY_8, 1, None, KEY_9))
+    self.assertEqual({'2': 'b'}, rediscache.get_complete_hash(KEY_8))
+    self.assertNotEqual(version, rediscache.get(KEY_9))
+
+  def test_replace_complete_hash__updated(self):
+    """A hash loaded before an update is not cached."""
+    version = rediscache.get(KEY_9)
+    rediscache.update_complete_hash_field(KEY_8, 1, 'a', KEY_9)
+    self.assertFalse(rediscache.replace_complete_hash(
+        KEY_8, {2: 'b'}, KEY_9, version))
+    self.assertIsNone(rediscache.get_complete_hash(KEY_8))
@@ -239,6 +239,11 @@ export interface ListFeatureLatencyRequest {
     endAt: Date;
 }
 
+export interface ListReviewsWithLatencyRequest {
+    startAt?: Date;
+    endAt?: Date;
+}
+
 export interface ListSpecMentorsRequest {
     after?: Date;
 }
@@ -751,16 +756,18 @@ export interface DefaultApiInterface {
     /**
      * 
      * @summary List recently reviewed features and their review latency
+     * @param {Date} [startAt] Start date (RFC 3339, section 5.6, for example, 2017-07-21). The date is inclusive. Defaults to 90 days ago.
+     * @param {Date} [endAt] End date (RFC 3339, section 5.6, for example, 2017-07-21). The date is exclusive. Defaults to no end date.
      * @param {*} [options] Override http request option.
      * @throws {RequiredError}
      * @memberof DefaultApiInterface
      */
-    listReviewsWithLatencyRaw(initOverrides?: RequestInit | runtime.InitOverrideFunction): Promise<runtime.ApiResponse<Array<ReviewLatency>>>;
+    listReviewsWithLatencyRaw(requestParameters: ListReviewsWithLatencyRequest, initOverrides?: RequestInit | runtime.InitOverrideFunction): Promise<runtime.ApiResponse<Array<ReviewLatency>>>;
 
     /**
      * List recently reviewed features and their review latency
      */
-    listReviewsWithLatency(initOverrides?: RequestInit | runtime.InitOverrideFunction): Promise<Array<ReviewLatency>>;
+    listReviewsWithLatency(requestParameters: ListReviewsWithLatencyRequest, initOverrides?: RequestInit | runtime.InitOverrideFunction): Promise<Array<ReviewLatency>>;
 
     /**
      * 
@@ -2001,9 +2008,17 @@ export class DefaultApi extends runtime.BaseAPI implements DefaultApiInterface {
     /**
      * List recently reviewed features and their review latency
      */
-    async listReviewsWithLatencyRaw(initOverrides?: RequestInit | runtime.InitOverrideFunction): Promise<runtime.ApiResponse<Array<ReviewLatency>>> {
+    async listReviewsWithLatencyRaw(requestParameters: ListReviewsWithLatencyRequest, initOverrides?: RequestInit | runtime.InitOverrideFunction): Promise<runtime.ApiResponse<Array<ReviewLatency>>> {
         const queryParameters: any = {};
 
+        if (requestParameters['startAt'] != null) {
+            queryParameters['startAt'] = (requestParameters['startAt'] as any).toISOString().substring(0,10);
+        }
+
+        if (requestParameters['endAt'] != null) {
+            queryParameters['endAt'] = (requestParameters['endAt'] as any).toISOString().substring(0,10);
+        }
+
         const headerParameters: runtime.HTTPHeaders = {};
 
         const response = await this.request({
@@ -2019,8 +2034,8 @@ export class DefaultApi extends runtime.BaseAPI implements DefaultApiInterface {
     /**
      * List recently reviewed features and their review latency
      */
-    async listReviewsWithLatency(initOverrides?: RequestInit | runtime.InitOverrideFunction): Promise<Array<ReviewLatency>> {
-        const response = await this.listReviewsWithLatencyRaw(initOverrides);
+    async listReviewsWithLatency(requestParameters: ListReviewsWithLatencyRequest = {}, initOverrides?: RequestInit | runtime.InitOverrideFunction): Promise<Array<ReviewLatency>> {
+        const response = await this.listReviewsWithLatencyRaw(requestParameters, initOverrides);
         return await response.value();
     }
 
@@ -469,14 +469,20 @@ def list_feature_latency(start_at, end_at):  # noqa: E501
     return 'do some magic!'
 
 
-def list_reviews_with_latency():  # noqa: E501
+def list_reviews_with_latency(start_at=None, end_at=None):  # noqa: E501
     """List recently reviewed features and their review latency
 
      # noqa: E501
 
+    :param start_at: Start date (RFC 3339, section 5.6, for example, 2017-07-21). The date is inclusive. Defaults to 90 days ago.
+    :type start_at: str
+    :param end_at: End date (RFC 3339, section 5.6, for example, 2017-07-21). The date is exclusive. Defaults to no end date.
+    :type end_at: str
 
     :rtype: Union[List[ReviewLatency], Tuple[List[ReviewLatency], int], Tuple[List[ReviewLatency], int, Dict[str, str]]
     """
+    start_at = util.deserialize_date(start_at)
+    end_at = util.deserialize_date(end_at)
     return 'do some magic!'
 
 
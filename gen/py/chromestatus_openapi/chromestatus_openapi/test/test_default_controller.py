@@ -541,13 +541,16 @@ class TestDefaultController(BaseTestCase):
 
         List recently reviewed features and their review latency
         """
+        query_string = [('startAt', '2013-10-20'),
+                        ('endAt', '2013-10-20')]
         headers = { 
             'Accept': 'application/json',
         }
         response = self.client.open(
             '/api/v0/review-latency',
             method='GET',
-            headers=headers)
+            headers=headers,
+            query_string=query_string)
         self.assert200(response,
                        'Response body is : ' + response.data.decode('utf-8'))
 
@@ -23,9 +23,30 @@ from google.cloud import ndb  # type: ignore
 
 from framework import rediscache
 from internals.core_enums import *
+from internals import search_cache
 import settings
 
 
+def _update_derived_entities(feature_id: int | None, future) -> None:
+  """Schedule updates of per-feature indexes after a FeatureEntry or Stage write.
+
+  The work is done once the transaction, if any, commits.  See
+  derived_entities for which entities are updated and when.
+  """
+  if not feature_id or future.exception() is not None:
+    return
+  ndb.get_context().call_on_commit(
+      lambda: _schedule_derived_update(feature_id))
+
+
+def _schedule_derived_update(feature_id: int) -> None:
+  # Any feature or stage edit can change the results of a search.
+  search_cache.bump_generation()
+  # Imported here because that module depends on this module.
+  from internals import derived_entities
+  derived_entities.schedule_update(feature_id)
+
+
 class ReviewResultProperty(ndb.StringProperty):
   """A StringProperty representing the result of an external review.
 
@@ -223,6 +244,13 @@ class FeatureEntry(ndb.Model):  # Copy from Feature
 
     return key
 
+  def _post_put_hook(self, future) -> None:
+    _update_derived_entities(self.key.integer_id(), future)
+
+  @classmethod
+  def _post_delete_hook(cls, key, future) -> None:
+    _update_derived_entities(key.integer_id(), future)
+
   # Note: get_in_milestone will be in a new file legacy_queries.py.
 
 
@@ -352,3 +380,21 @@ class Stage(ndb.Model):
 
   archived = ndb.BooleanProperty(default=False)
   created = ndb.DateTimeProperty(auto_now_add=True)
+  updated = ndb.DateTimeProperty(auto_now=True)
+
+  def _post_put_hook(self, future) -> None:
+    _update_derived_entities(self.feature_id, future)
+
+  # The feature of a deleted stage is only known before it is deleted.
+  _feature_ids_of_deleted_stages: dict[ndb.Key, int] = {}
+
+  @classmethod
+  def _pre_delete_hook(cls, key) -> None:
+    stage = key.get()
+    if stage:
+      cls._feature_ids_of_deleted_stages[key] = stage.feature_id
+
+  @classmethod
+  def _post_delete_hook(cls, key, future) -> None:
+    feature_id = cls._feature_ids_of_deleted_stages.pop(key, None)
+    _update_derived_entities(feature_id, future)
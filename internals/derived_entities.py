@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Keep per-feature derived entities current after feature writes.
+
+The milestone index, the feature list snapshot, the verbose JSON
+cache, the search facet indexes, the search suggestions, the review
+latency rollups, and the ship milestone map are all derived from a
+feature entry and its stages.  Recomputing them on every put made each
+write slow, and batch writes much slower.  Instead, the IDs of features
+written during a request are collected and a single task updates all
+of them after the request.  Gate writes are collected in the same way
+and update the review latency rollups in that task.  Writes outside of
+any request, such as in unit tests, still update the derived entities
+right away.
+"""
+
+import logging
+from typing import Iterable
+
+import flask
+from google.cloud import ndb  # type: ignore
+
+from framework import basehandlers
+from framework import cloud_tasks_helpers
+from internals import feature_json_cache
+from internals import feature_snapshot
+from internals import milestone_index
+from internals import review_latency
+from internals import search_cache
+from internals import search_facets
+from internals import search_suggest
+from internals import ship_milestones
+from internals.core_models import FeatureEntry, Stage
+from internals.review_models import Gate
+
+
+TASK_PATH = '/tasks/update-derived-entities'
+DERIVED_MODULES = (
+    milestone_index, feature_snapshot, feature_json_cache, search_facets,
+    search_suggest, review_latency, ship_milestones)
+
+
+def update_features(feature_ids: Iterable[int]) -> None:
+  """Recompute the derived entities of the given features."""
+  feature_ids = list(dict.fromkeys(feature_ids))
+  if not feature_ids:
+    return
+  try:
+    fe_futures = ndb.get_multi_async(
+        [ndb.Key(FeatureEntry, fid) for fid in feature_ids])
+    stage_futures = [
+        Stage.query(Stage.feature_id == fid).fetch_async()
+        for fid in feature_ids]
+    loaded = [
+        (fid, fe_future.result(), stage_future.result())
+        for fid, fe_future, stage_future
+        in zip(feature_ids, fe_futures, stage_futures)]
+  except Exception:
+    logging.exception('Could not load features %r', feature_ids)
+    return
+
+  for feature_id, fe, stages in loaded:
+    for module in DERIVED_MODULES:
+      try:
+        module.update_feature(feature_id, fe, stages)
+      except Exception:
+        # A stale derived entity should never cause the write itself to fail.
+        logging.exception(
+            'Could not update %s for %r', module.__name__, feature_id)
+  # Searches run since the write may have used the old derived entities.
+  search_cache.bump_generation()
+
+
+def update_gates(gate_ids: Iterable[int]) -> None:
+  """Update the review latency rollups of the given gates."""
+  gate_ids = list(dict.fromkeys(gate_ids))
+  if not gate_ids:
+    return
+  try:
+    gates = ndb.get_multi([ndb.Key(Gate, gid) for gid in gate_ids])
+  except Exception:
+    logging.exception('Could not load gates %r', gate_ids)
+    return
+
+  for gate in gates:
+    if not gate:
+      continue
+    try:
+      review_latency.update_gate(gate)
+    except Exception:
+      # The daily rebuild will repair the rollup.
+      logging.exception('Could not update review latency of %r', gate.key)
+
+
+def _pending_ids(name: str) -> set[int]:
+  """Return the IDs of the entities of one kind written in this request."""
+  pending = flask.g.get('derived_pending')
+  if pending is None:
+    pending = flask.g.derived_pending = {
+        'feature_ids': set(), 'gate_ids': set()}
+    flask.after_this_request(_enqueue_pending)
+  return pending[name]
+
+
+def _enqueue_pending(response):
+  """Enqueue one task for all the entities written during this request."""
+  pending = flask.g.pop('derived_pending', {})
+  params = {name: sorted(ids) for name, ids in pending.items()}
+  if any(params.values()):
+    try:
+      cloud_tasks_helpers.enqueue_task(TASK_PATH, params)
+    except Exception:
+      logging.exception('Could not enqueue update of %r', params)
+  return response
+
+
+def schedule_update(feature_id: int) -> None:
+  """Arrange for the derived entities of a feature to be recomputed."""
+  # The cached JSON is read right after edits, so never serve an old one.
+  feature_json_cache.invalidate(feature_id)
+  if not flask.has_request_context():
+    update_features([feature_id])
+    return
+  _pending_ids('feature_ids').add(feature_id)
+
+
+def schedule_gate_update(gate_id: int) -> None:
+  """Arrange for the review latency rollup of a gate to be updated."""
+  if not flask.has_request_context():
+    update_gates([gate_id])
+    return
+  _pending_ids('gate_ids').add(gate_id)
+
+
+class UpdateDerivedEntitiesHandler(basehandlers.FlaskHandler):
+  """Recompute the derived entities of the entities written by a request."""
+
+  IS_INTERNAL_HANDLER = True
+
+  def process_post_data(self, **kwargs):
+    self.require_task_header()
+    feature_ids = self.get_param('feature_ids')
+    gate_ids = self.get_param('gate_ids', default=[], required=False)
+    logging.info(
+        'Updating derived entities of features %r and gates %r',
+        feature_ids, gate_ids)
+    update_features(feature_ids)
+    update_gates(gate_ids)
+    return {'message': 'Done'}
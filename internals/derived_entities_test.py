@@ -0,0 +1,127 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+import flask
+import testing_config  # Must be imported before the module under test.
+
+from internals.core_enums import *
+from internals.core_models import FeatureEntry, MilestoneSet, Stage
+from internals.review_models import Gate
+from internals import derived_entities
+from internals import milestone_index
+from internals import ship_milestones
+
+test_app = flask.Flask(__name__)
+
+
+class DerivedEntitiesTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.fe = FeatureEntry(name='feature a', summary='sum', category=1)
+    self.fe.put()
+    self.fe_id = self.fe.key.integer_id()
+    self.stage = Stage(
+        feature_id=self.fe_id, stage_type=STAGE_BLINK_SHIPPING,
+        milestones=MilestoneSet(desktop_first=120))
+    self.stage.put()
+
+  def tearDown(self):
+    for kind in [
+        Gate, Stage, FeatureEntry, milestone_index.FeatureMilestoneIndex]:
+      for entity in kind.query():
+        entity.key.delete()
+
+  def test_update_features(self):
+    """Each module gets the feature and its stages once per feature."""
+    with mock.patch.object(ship_milestones, 'update_feature') as mock_update:
+      derived_entities.update_features([self.fe_id, self.fe_id])
+    mock_update.assert_called_once_with(self.fe_id, mock.ANY, mock.ANY)
+    _, fe, stages = mock_update.call_args.args
+    self.assertEqual('feature a', fe.name)
+    self.assertEqual([self.stage.key], [s.key for s in stages])
+
+  def test_update_features__module_fails(self):
+    """An error in one module does not stop the others."""
+    with mock.patch.object(
+        milestone_index, 'update_feature', side_effect=ValueError), \
+        mock.patch.object(ship_milestones, 'update_feature') as mock_update:
+      derived_entities.update_features([self.fe_id])
+    mock_update.assert_called_once()
+
+  @mock.patch('internals.derived_entities.update_features')
+  def test_schedule_update__no_request(self, mock_update):
+    """Writes outside of a request update the derived entities now."""
+    self.fe.name = 'feature b'
+    self.fe.put()
+    mock_update.assert_called_once_with([self.fe_id])
+
+  @mock.patch('framework.cloud_tasks_helpers.enqueue_task')
+  @mock.patch('internals.derived_entities.update_features')
+  def test_schedule_update__request(self, mock_update, mock_enqueue):
+    """Writes during a request are coalesced into one task."""
+    with test_app.test_request_context('/'):
+      self.fe.name = 'feature b'
+      self.fe.put()
+      self.stage.milestones.desktop_first = 121
+      self.stage.put()
+      mock_update.assert_not_called()
+      derived_entities._enqueue_pending(None)
+
+    mock_enqueue.assert_called_once_with(
+        derived_entities.TASK_PATH,
+        {'feature_ids': [self.fe_id], 'gate_ids': []})
+
+  @mock.patch('internals.review_latency.update_gate')
+  def test_schedule_gate_update__no_request(self, mock_update_gate):
+    """Gate writes outside of a request update the review latency now."""
+    gate = Gate(feature_id=self.fe_id, stage_id=1, gate_type=1, state=1)
+    gate.put()
+    mock_update_gate.assert_called_once()
+    self.assertEqual(gate.key, mock_update_gate.call_args.args[0].key)
+
+  @mock.patch('framework.cloud_tasks_helpers.enqueue_task')
+  @mock.patch('internals.review_latency.update_gate')
+  def test_schedule_gate_update__request(self, mock_update_gate, mock_enqueue):
+    """Gate writes during a request are done in the same task as features."""
+    with test_app.test_request_context('/'):
+      gate = Gate(feature_id=self.fe_id, stage_id=1, gate_type=1, state=1)
+      gate.put()
+      self.fe.put()
+      mock_update_gate.assert_not_called()
+      derived_entities._enqueue_pending(None)
+
+    mock_enqueue.assert_called_once_with(
+        derived_entities.TASK_PATH,
+        {'feature_ids': [self.fe_id], 'gate_ids': [gate.key.integer_id()]})
+
+  @mock.patch('internals.derived_entities.update_features')
+  def test_stage_delete(self, mock_update):
+    """Deleting a stage updates the derived entities of its feature."""
+    self.stage.key.delete()
+    mock_update.assert_called_once_with([self.fe_id])
+
+  @mock.patch('internals.derived_entities.update_gates')
+  @mock.patch('internals.derived_entities.update_features')
+  def test_handler(self, mock_update, mock_update_gates):
+    """The task updates the features and gates that it is given."""
+    handler = derived_entities.UpdateDerivedEntitiesHandler()
+    with test_app.test_request_context(
+        derived_entities.TASK_PATH,
+        json={'feature_ids': [self.fe_id], 'gate_ids': [5]}):
+      actual = handler.process_post_data()
+    self.assertEqual({'message': 'Done'}, actual)
+    mock_update.assert_called_once_with([self.fe_id])
+    mock_update_gates.assert_called_once_with([5])
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Export the feature catalog as newline-delimited JSON.
+
+Features are loaded one page at a time using query cursors, along with
+the stages, gates, and votes of the features on that page, so memory use
+does not depend on the size of the catalog.
+"""
+
+from datetime import datetime
+import json
+from typing import Any, Iterator, Optional
+
+from google.cloud import ndb  # type: ignore
+
+from api import converters
+from internals.core_models import FeatureEntry, Stage
+from internals.review_models import Gate, Vote
+from internals import stage_helpers
+
+
+# Features per datastore page.  Stages, gates, and votes are fetched with
+# IN queries on the feature IDs of each page, so keep this modest.
+EXPORT_PAGE_SIZE = 50
+
+
+def _group_by_feature(entities: list[Any]) -> dict[int, list[Any]]:
+  grouped: dict[int, list[Any]] = {}
+  for entity in entities:
+    grouped.setdefault(entity.feature_id, []).append(entity)
+  return grouped
+
+
+def _make_record(
+    fe: FeatureEntry, stages: list[Stage], gates: list[Gate],
+    votes: list[Vote]) -> dict[str, Any]:
+  """Return the export record for one feature."""
+  record: dict[str, Any] = dict(
+      converters.feature_entry_to_json_verbose(fe, prefetched_stages=stages))
+  record['gates'] = [converters.gate_value_to_json_dict(g) for g in gates]
+  record['votes'] = [converters.vote_value_to_json_dict(v) for v in votes]
+  return record
+
+
+def _ids_with_changed_parts(updated_since: datetime) -> set[int]:
+  """Return IDs of features whose stages, gates, or votes have changed."""
+  futures = [
+      Stage.query(Stage.updated >= updated_since).fetch_async(),
+      Gate.query(Gate.updated >= updated_since).fetch_async(),
+      Vote.query(Vote.set_on >= updated_since).fetch_async(),
+  ]
+  return {entity.feature_id for f in futures for entity in f.result()}
+
+
+def iter_feature_pages(
+    updated_since: Optional[datetime]=None,
+    page_size: int=EXPORT_PAGE_SIZE) -> Iterator[list[FeatureEntry]]:
+  """Yield lists of features, walking the datastore with cursors.
+
+  When updated_since is given, a feature is included if it or any of
+  its stages, gates, or votes changed since then.  Features whose own
+  entry changed come first, ordered by when it changed.
+  """
+  query = FeatureEntry.query()
+  changed_ids: set[int] = set()
+  if updated_since:
+    query = query.filter(FeatureEntry.updated >= updated_since)
+    query = query.order(FeatureEntry.updated)
+    changed_ids = _ids_with_changed_parts(updated_since)
+  cursor = None
+  more = True
+  while more:
+    features, cursor, more = query.fetch_page(page_size, start_cursor=cursor)
+    changed_ids.difference_update(fe.key.integer_id() for fe in features)
+    if features:
+      yield features
+
+  remaining_ids = sorted(changed_ids)
+  for start in range(0, len(remaining_ids), page_size):
+    page_ids = remaining_ids[start:start + page_size]
+    features = [
+        fe for fe in ndb.get_multi(
+            [ndb.Key(FeatureEntry, fid) for fid in page_ids])
+        if fe]
+    if features:
+      yield features
+
+
+def iter_records(
+    updated_since: Optional[datetime]=None, show_unlisted: bool=False,
+    page_size: int=EXPORT_PAGE_SIZE) -> Iterator[dict[str, Any]]:
+  """Yield one export record per feature.
+
+  Deleted features are left out of a full export.  When updated_since is
+  given, they are reported as {'id': ..., 'deleted': True} so that
+  incremental consumers can remove them.
+  """
+  for features in iter_feature_pages(updated_since, page_size):
+    listed = [
+        fe for fe in features
+        if not fe.deleted and (show_unlisted or not fe.unlisted)]
+    feature_ids = [fe.key.integer_id() for fe in listed]
+    stages_by_fid: dict[int, list[Any]] = {}
+    gates_by_fid: dict[int, list[Any]] = {}
+    votes_by_fid: dict[int, list[Any]] = {}
+    if feature_ids:
+      stages_future = Stage.query(
+          Stage.feature_id.IN(feature_ids),
+          Stage.archived == False).fetch_async()
+      gates_future = Gate.query(Gate.feature_id.IN(feature_ids)).fetch_async()
+      votes_future = Vote.query(Vote.feature_id.IN(feature_ids)).fetch_async()
+      stages_by_fid = stage_helpers.organize_all_stages_by_feature(
+          stages_future.result())
+      gates_by_fid = _group_by_feature(gates_future.result())
+      votes_by_fid = _group_by_feature(votes_future.result())
+
+    for fe in features:
+      feature_id = fe.key.integer_id()
+      if fe.deleted:
+        if updated_since:
+          yield {'id': feature_id, 'deleted': True}
+        continue
+      if fe.unlisted and not show_unlisted:
+        continue
+      yield _make_record(
+          fe, stages_by_fid.get(feature_id, []),
+          gates_by_fid.get(feature_id, []), votes_by_fid.get(feature_id, []))
+
+
+def iter_ndjson(
+    updated_since: Optional[datetime]=None, show_unlisted: bool=False,
+    page_size: int=EXPORT_PAGE_SIZE) -> Iterator[str]:
+  """Yield each export record as one line of JSON."""
+  for record in iter_records(updated_since, show_unlisted, page_size):
+    yield json.dumps(record, default=str) + '\n'
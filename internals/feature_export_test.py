@@ -0,0 +1,139 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime
+import json
+
+import testing_config  # Must be imported before the module under test.
+
+from internals.core_enums import *
+from internals.core_models import FeatureEntry, MilestoneSet, Stage
+from internals import feature_export
+from internals.review_models import Gate, Vote
+
+
+class FeatureExportTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.features = []
+    for i in range(5):
+      fe = FeatureEntry(
+          name='feature %d' % i, summary='sum', category=1,
+          updated=datetime(2024, 1, i + 1))
+      fe.put()
+      self.features.append(fe)
+    self.fe_0_id = self.features[0].key.integer_id()
+    self.stage = Stage(
+        feature_id=self.fe_0_id, stage_type=STAGE_BLINK_SHIPPING,
+        milestones=MilestoneSet(desktop_first=120))
+    self.stage.put()
+    self.gate = Gate(
+        feature_id=self.fe_0_id, stage_id=self.stage.key.integer_id(),
+        gate_type=GATE_API_SHIP, state=Vote.APPROVED)
+    self.gate.put()
+    self.vote = Vote(
+        feature_id=self.fe_0_id, gate_id=self.gate.key.integer_id(),
+        gate_type=GATE_API_SHIP, state=Vote.APPROVED,
+        set_on=datetime(2024, 1, 2), set_by='reviewer@example.com')
+    self.vote.put()
+
+  def tearDown(self):
+    for kind in [FeatureEntry, Stage, Gate, Vote]:
+      for entity in kind.query():
+        entity.key.delete()
+
+  def test_iter_records__all(self):
+    """Every feature is exported with its stages, gates, and votes."""
+    records = list(feature_export.iter_records(page_size=2))
+
+    self.assertEqual(
+        ['feature %d' % i for i in range(5)],
+        sorted(r['name'] for r in records))
+    record_0 = [r for r in records if r['id'] == self.fe_0_id][0]
+    self.assertEqual(1, len(record_0['stages']))
+    self.assertEqual(
+        [self.gate.key.integer_id()], [g['id'] for g in record_0['gates']])
+    self.assertEqual(
+        ['reviewer@example.com'], [v['set_by'] for v in record_0['votes']])
+
+  def test_iter_records__unlisted_and_deleted(self):
+    """Unlisted features need permission, and deleted ones are skipped."""
+    self.features[1].unlisted = True
+    self.features[1].put()
+    self.features[2].deleted = True
+    self.features[2].put()
+
+    names = [r['name'] for r in feature_export.iter_records()]
+    self.assertEqual(3, len(names))
+    self.assertNotIn('feature 1', names)
+    self.assertNotIn('feature 2', names)
+
+    names = [r['name'] for r in feature_export.iter_records(
+        show_unlisted=True)]
+    self.assertIn('feature 1', names)
+
+  def test_iter_records__updated_since(self):
+    """Incremental exports include recent changes and deletions."""
+    self.features[4].deleted = True
+    self.features[4].put()
+
+    records = list(feature_export.iter_records(
+        updated_since=datetime(2024, 1, 4), page_size=1))
+
+    self.assertEqual(3, len(records))
+    self.assertEqual('feature 3', records[0]['name'])
+    self.assertEqual(
+        {'id': self.features[4].key.integer_id(), 'deleted': True},
+        records[1])
+    # Feature 0 itself is older, but its stage, gate, and vote were just put.
+    self.assertEqual('feature 0', records[2]['name'])
+
+  def test_iter_feature_pages__changed_parts(self):
+    """A change to a stage, gate, or vote includes its feature."""
+    cutoff = datetime.now()
+    self.assertEqual(
+        [], list(feature_export.iter_feature_pages(updated_since=cutoff)))
+
+    for part in [self.stage, self.gate]:
+      part.put()
+      pages = list(feature_export.iter_feature_pages(updated_since=cutoff))
+      self.assertEqual(
+          [[self.fe_0_id]], [[fe.key.integer_id() for fe in page]
+                             for page in pages])
+      cutoff = datetime.now()
+
+    self.vote.set_on = datetime.now()
+    self.vote.put()
+    pages = list(feature_export.iter_feature_pages(updated_since=cutoff))
+    self.assertEqual(
+        [[self.fe_0_id]],
+        [[fe.key.integer_id() for fe in page] for page in pages])
+
+  def test_iter_records__archived_stages(self):
+    """Archived stages are not exported."""
+    Stage(
+        feature_id=self.fe_0_id, stage_type=STAGE_BLINK_DEV_TRIAL,
+        archived=True).put()
+    records = list(feature_export.iter_records())
+    record_0 = [r for r in records if r['id'] == self.fe_0_id][0]
+    self.assertEqual(1, len(record_0['stages']))
+
+  def test_iter_ndjson(self):
+    """Each record is one line of JSON."""
+    lines = list(feature_export.iter_ndjson())
+
+    self.assertEqual(5, len(lines))
+    for line in lines:
+      self.assertTrue(line.endswith('\n'))
+      self.assertIn('name', json.loads(line))
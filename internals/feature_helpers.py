@@ -21,6 +21,8 @@ from google.cloud import ndb  # type: ignore
 from api import converters
 from framework import rediscache
 from framework import users
+from internals import feature_json_cache
+from internals import milestone_index
 from internals import stage_helpers
 from internals.core_enums import *
 from internals.core_models import FeatureEntry, Stage
@@ -45,15 +47,35 @@ def filter_unlisted(feature_list: list[dict]) -> list[dict]:
   return listed_features
 
 
+# Feature IDs per Stage query.  NDB turns an IN filter into one
+# sub-query per value, so large lists are split into chunks that run
+# concurrently rather than as one long query.
+STAGE_QUERY_CHUNK_SIZE = 10
+
+
+@ndb.tasklet
+def _get_entries_sorted_by_name(ids):
+  entries = yield ndb.get_multi_async(
+      [ndb.Key('FeatureEntry', id) for id in ids])
+  return sorted((fe for fe in entries if fe), key=lambda fe: fe.name)
+
+
 def get_entries_by_id_async(ids) -> Future | None:
   if ids:
-    q = FeatureEntry.query(FeatureEntry.key.IN(
-        [ndb.Key('FeatureEntry', id) for id in ids]))
-    q = q.order(FeatureEntry.name)
-    return q.fetch_async()
+    return _get_entries_sorted_by_name(ids)
   return None
 
 
+def get_stages_by_feature_async(feature_ids: list[int]) -> list[Future]:
+  """Start concurrent queries for the unarchived stages of the features."""
+  return [
+      Stage.query(
+          Stage.feature_id.IN(
+              feature_ids[i:i + STAGE_QUERY_CHUNK_SIZE]),
+          Stage.archived == False).fetch_async(None)
+      for i in range(0, len(feature_ids), STAGE_QUERY_CHUNK_SIZE)]
+
+
 def get_future_results(async_features: Future | None) -> list[FeatureEntry]:
   if async_features is None:
     return []
@@ -67,23 +89,8 @@ def get_features_in_release_notes(milestone: int):
   if cached_features:
     return cached_features
 
-  stages = Stage.query(
-          Stage.archived == False,
-      ndb.OR(Stage.milestones.desktop_first >= milestone,
-          Stage.milestones.android_first >= milestone,
-          Stage.milestones.ios_first >= milestone,
-          Stage.milestones.webview_first >= milestone,
-          Stage.milestones.desktop_last >= milestone,
-          Stage.milestones.ios_last >= milestone,
-          Stage.milestones.webview_last >= milestone,
-          Stage.rollout_milestone >= milestone),
-      Stage.stage_type.IN([STAGE_BLINK_SHIPPING, STAGE_PSA_SHIPPING,
-          STAGE_FAST_SHIPPING, STAGE_DEP_SHIPPING, STAGE_ENT_ROLLOUT])).filter().fetch()
-
-  feature_ids = list(set({
-      *[s.feature_id for s in stages]}))
-  features = [dict(converters.feature_entry_to_json_verbose(f))
-            for f in get_future_results(get_entries_by_id_async(feature_ids))]
+  feature_ids = milestone_index.get_release_notes_feature_ids(milestone)
+  features = sorted(get_by_ids(feature_ids), key=lambda f: f['name'])
   features = [f for f in filter_unlisted(features)
     if not f['deleted'] and
       (f['enterprise_impact'] > ENTERPRISE_IMPACT_NONE or
@@ -105,182 +112,69 @@ def get_in_milestone(milestone: int,
   procesing a POST to edit data.  For editing use case, load the
   data from NDB directly.
   """
-  features_by_type = {}
-  cache_key = '%s|%s|%s' % (
-      FeatureEntry.DEFAULT_CACHE_KEY, 'milestone', milestone)
-  cached_features_by_type = rediscache.get(cache_key)
-  if cached_features_by_type:
-    features_by_type = cached_features_by_type
-  else:
-    all_features: dict[str, list[FeatureEntry]] = {}
-    all_features[IMPLEMENTATION_STATUS[ENABLED_BY_DEFAULT]] = []
-    all_features[IMPLEMENTATION_STATUS[DEPRECATED]] = []
-    all_features[IMPLEMENTATION_STATUS[REMOVED]] = []
-    all_features[IMPLEMENTATION_STATUS[INTERVENTION]] = []
-    all_features[IMPLEMENTATION_STATUS[ORIGIN_TRIAL]] = []
-    all_features[IMPLEMENTATION_STATUS[BEHIND_A_FLAG]] = []
-
-    logging.info('Getting chronological feature list in milestone %d',
-                milestone)
-    # Start each query asynchronously in parallel.
-
-    # Shipping stages with a matching desktop milestone.
-    # Note: Enterprise features use STAGE_ENT_ROLLOUT and are NOT included.
-    q = Stage.query(Stage.milestones.desktop_first == milestone,
-        ndb.OR(Stage.stage_type == STAGE_BLINK_SHIPPING,
-            Stage.stage_type == STAGE_PSA_SHIPPING,
-            Stage.stage_type == STAGE_FAST_SHIPPING,
-            Stage.stage_type == STAGE_DEP_SHIPPING))
-    q = q.filter()
-    desktop_shipping_future = q.fetch_async()
-
-    # Shipping stages with a matching android shipping milestone
-    # but no desktop milestone.
-    q = Stage.query(Stage.milestones.android_first == milestone,
-        Stage.milestones.desktop_first == None,
-        Stage.stage_type.IN((STAGE_BLINK_SHIPPING, STAGE_PSA_SHIPPING,
-            STAGE_FAST_SHIPPING, STAGE_DEP_SHIPPING)))
-    android_only_shipping_future = q.fetch_async()
-
-    # Origin trial stages (Desktop) in this milestone.
-    q = Stage.query(Stage.milestones.desktop_first == milestone,
-        Stage.stage_type.IN((STAGE_BLINK_ORIGIN_TRIAL, STAGE_FAST_ORIGIN_TRIAL,
-            STAGE_DEP_DEPRECATION_TRIAL)))
-    desktop_origin_trial_future = q.fetch_async()
-
-    # Origin trial stages (Android) in this milestone.
-    q = Stage.query(Stage.milestones.android_first == milestone,
-        Stage.milestones.desktop_first == None,
-        Stage.stage_type.IN((STAGE_BLINK_ORIGIN_TRIAL, STAGE_FAST_ORIGIN_TRIAL,
-            STAGE_DEP_DEPRECATION_TRIAL)))
-    android_origin_trial_future = q.fetch_async()
-
-    # Origin trial stages (Webview) in this milestone.
-    q = Stage.query(Stage.milestones.webview_first == milestone,
-        Stage.milestones.desktop_first == None,
-        Stage.stage_type.IN((STAGE_BLINK_ORIGIN_TRIAL, STAGE_FAST_ORIGIN_TRIAL,
-            STAGE_DEP_DEPRECATION_TRIAL)))
-    webview_origin_trial_future = q.fetch_async()
-
-    # Dev trial stages (Desktop) in this milestone.
-    q = Stage.query(Stage.milestones.desktop_first == milestone,
-        Stage.stage_type.IN((STAGE_BLINK_DEV_TRIAL, STAGE_PSA_DEV_TRIAL,
-            STAGE_FAST_DEV_TRIAL, STAGE_DEP_DEV_TRIAL)))
-    desktop_dev_trial_future = q.fetch_async()
-
-    # Dev trial stages (Android) in this milestone.
-    q = Stage.query(Stage.milestones.android_first == milestone,
-        Stage.milestones.desktop_first == None,
-        Stage.stage_type.IN((STAGE_BLINK_DEV_TRIAL, STAGE_PSA_DEV_TRIAL,
-            STAGE_FAST_DEV_TRIAL, STAGE_DEP_DEV_TRIAL)))
-    android_dev_trial_future = q.fetch_async()
-
-    # Wait for all futures to complete and collect unique feature IDs.
-    desktop_shipping_ids = list({
-        *[s.feature_id for s in desktop_shipping_future.result()]})
-    android_only_shipping_ids = list({
-        *[s.feature_id for s in android_only_shipping_future.result()]})
-    desktop_origin_trials_ids = list({
-        *[s.feature_id for s in desktop_origin_trial_future.result()]})
-    android_origin_trials_ids = list({
-        *[s.feature_id for s in android_origin_trial_future.result()]})
-    webview_origin_trials_ids = list({
-        *[s.feature_id for s in webview_origin_trial_future.result()]})
-    desktop_dev_trials_ids = list({
-        *[s.feature_id for s in desktop_dev_trial_future.result()]})
-    android_dev_trials_ids = list({
-        *[s.feature_id for s in android_dev_trial_future.result()]})
-
-    # Query for FeatureEntry entities that match the stage feature IDs.
-    # Querying with an empty list will raise an error, so check if each
-    # list is not empty first.
-    desktop_shipping_future = get_entries_by_id_async(desktop_shipping_ids)
-    android_only_shipping_future = get_entries_by_id_async(
-        android_only_shipping_ids)
-    desktop_origin_trial_future = get_entries_by_id_async(
-        desktop_origin_trials_ids)
-    android_origin_trial_future = get_entries_by_id_async(
-        android_origin_trials_ids)
-    webview_origin_trial_future = get_entries_by_id_async(
-        webview_origin_trials_ids)
-    desktop_dev_trial_future = get_entries_by_id_async(
-        desktop_dev_trials_ids)
-    android_dev_trial_future = get_entries_by_id_async(
-        android_dev_trials_ids)
-
-    desktop_shipping_features = get_future_results(desktop_shipping_future)
-    android_only_shipping_features = get_future_results(
-        android_only_shipping_future)
-    desktop_origin_trial_features = get_future_results(
-        desktop_origin_trial_future)
-    android_origin_trial_features = get_future_results(
-        android_origin_trial_future)
-    webview_origin_trial_features = get_future_results(
-        webview_origin_trial_future)
-    desktop_dev_trial_features = get_future_results(desktop_dev_trial_future)
-    android_dev_trial_features = get_future_results(android_dev_trial_future)
-
-    # Push feature to list corresponding to the implementation status of
-    # feature in queried milestone
-    for feature in desktop_shipping_features:
-      if feature.impl_status_chrome == ENABLED_BY_DEFAULT:
-        all_features[IMPLEMENTATION_STATUS[ENABLED_BY_DEFAULT]].append(feature)
-      elif feature.impl_status_chrome == DEPRECATED:
-        all_features[IMPLEMENTATION_STATUS[DEPRECATED]].append(feature)
-      elif feature.impl_status_chrome == REMOVED:
-        all_features[IMPLEMENTATION_STATUS[REMOVED]].append(feature)
-      elif feature.impl_status_chrome == INTERVENTION:
-        all_features[IMPLEMENTATION_STATUS[INTERVENTION]].append(feature)
-      elif (feature.feature_type == FEATURE_TYPE_DEPRECATION_ID):
-        all_features[IMPLEMENTATION_STATUS[DEPRECATED]].append(feature)
-      elif feature.feature_type == FEATURE_TYPE_INCUBATE_ID:
-        all_features[IMPLEMENTATION_STATUS[ENABLED_BY_DEFAULT]].append(feature)
-
-    # Push feature to list corresponding to the implementation status
-    # of feature in queried milestone
-    for feature in android_only_shipping_features:
-      if feature.impl_status_chrome == ENABLED_BY_DEFAULT:
-        all_features[IMPLEMENTATION_STATUS[ENABLED_BY_DEFAULT]].append(feature)
-      elif feature.impl_status_chrome == DEPRECATED:
-        all_features[IMPLEMENTATION_STATUS[DEPRECATED]].append(feature)
-      elif feature.impl_status_chrome == REMOVED:
-        all_features[IMPLEMENTATION_STATUS[REMOVED]].append(feature)
-      elif (feature.feature_type == FEATURE_TYPE_DEPRECATION_ID):
-        all_features[IMPLEMENTATION_STATUS[DEPRECATED]].append(feature)
-      elif feature.feature_type == FEATURE_TYPE_INCUBATE_ID:
-        all_features[IMPLEMENTATION_STATUS[ENABLED_BY_DEFAULT]].append(feature)
-
-    for feature in desktop_origin_trial_features:
-      all_features[IMPLEMENTATION_STATUS[ORIGIN_TRIAL]].append(feature)
-
-    for feature in android_origin_trial_features:
-      all_features[IMPLEMENTATION_STATUS[ORIGIN_TRIAL]].append(feature)
-
-    for feature in webview_origin_trial_features:
-      all_features[IMPLEMENTATION_STATUS[ORIGIN_TRIAL]].append(feature)
-
-    for feature in desktop_dev_trial_features:
-      all_features[IMPLEMENTATION_STATUS[BEHIND_A_FLAG]].append(feature)
-
-    for feature in android_dev_trial_features:
-      all_features[IMPLEMENTATION_STATUS[BEHIND_A_FLAG]].append(feature)
+  return get_in_milestones([milestone], show_unlisted=show_unlisted)[milestone]
 
-    # Construct results as: {type: [json_feature, ...], ...}.
-    for shipping_type in all_features:
-      all_features[shipping_type].sort(key=lambda f: f.name)
-      all_features[shipping_type] = [
-          f for f in all_features[shipping_type] if not f.deleted]
-      features_by_type[shipping_type] = [converters.feature_entry_to_json_basic(f)
-          for f in all_features[shipping_type]]
 
-    rediscache.set(cache_key, features_by_type)
+def get_in_milestones(milestones: list[int],
+    show_unlisted: bool=False) -> dict[int, dict[str, list[dict[str, Any]]]]:
+  """Return {milestone: {reason: [feature_dict]}} for each milestone.
+
+  Milestones that are already cached are not recomputed.  The rest are
+  computed together from one milestone index query and one batch get.
+  """
+  cache_keys = {
+      milestone: '%s|%s|%s' % (
+          FeatureEntry.DEFAULT_CACHE_KEY, 'milestone', milestone)
+      for milestone in milestones}
+  cached = rediscache.get_multi(list(cache_keys.values())) or {}
+  result: dict[int, dict[str, list[dict[str, Any]]]] = {}
+  for milestone, cache_key in cache_keys.items():
+    if cached.get(cache_key):
+      result[milestone] = cached[cache_key]
+
+  cold_milestones = [m for m in milestones if m not in result]
+  if cold_milestones:
+    logging.info('Getting chronological feature list in milestones %r',
+                 cold_milestones)
+    ids_by_milestone = milestone_index.get_feature_ids_in_milestones(
+        cold_milestones)
+    needed_ids = sorted({
+        feature_id
+        for ids_by_reason in ids_by_milestone.values()
+        for feature_ids in ids_by_reason.values()
+        for feature_id in feature_ids})
+    entries = ndb.get_multi(
+        [ndb.Key('FeatureEntry', feature_id) for feature_id in needed_ids])
+    json_by_id = {
+        fe.key.integer_id(): converters.feature_entry_to_json_basic(fe)
+        for fe in sorted(
+            (fe for fe in entries if fe and not fe.deleted),
+            key=lambda f: f.name)}
+    # Dict order of json_by_id sorts each reason's features by name.
+    order = {feature_id: i for i, feature_id in enumerate(json_by_id)}
+
+    # Construct results as: {type: [json_feature, ...], ...}.
+    to_cache = {}
+    for milestone in cold_milestones:
+      features_by_type = {}
+      for reason, feature_ids in ids_by_milestone[milestone].items():
+        listed_ids = sorted(
+            (fid for fid in feature_ids if fid in json_by_id),
+            key=lambda fid: order[fid])
+        features_by_type[IMPLEMENTATION_STATUS[reason]] = [
+            json_by_id[fid] for fid in listed_ids]
+      result[milestone] = features_by_type
+      to_cache[cache_keys[milestone]] = features_by_type
+    rediscache.set_multi(to_cache)
 
-  for shipping_type in features_by_type:
-    if not show_unlisted:
-      features_by_type[shipping_type] = filter_unlisted(
-          features_by_type[shipping_type])
+  if not show_unlisted:
+    result = {
+        milestone: {
+            shipping_type: filter_unlisted(features)
+            for shipping_type, features in features_by_type.items()}
+        for milestone, features_by_type in result.items()}
 
-  return features_by_type
+  return result
 
 
 def get_all(limit: Optional[int]=None,
@@ -333,6 +227,13 @@ def get_all(limit: Optional[int]=None,
   return feature_list
 
 
+def _add_updated_display(feature: dict[str, Any]) -> dict[str, Any]:
+  """Add the date shown in feature lists to a verbose feature dict."""
+  updated = feature.get('updated', {}).get('when')
+  feature['updated_display'] = updated.split(' ')[0] if updated else ''
+  return feature
+
+
 def get_by_ids(feature_ids: list[int],
                update_cache: bool=True) -> list[dict[str, Any]]:
   """Return a list of JSON dicts for the specified features.
@@ -343,7 +244,6 @@ def get_by_ids(feature_ids: list[int],
   data from NDB directly.
   """
   result_dict = {}
-  futures_by_id = {}
 
   if update_cache:
     lookup_keys = [
@@ -356,32 +256,43 @@ def get_by_ids(feature_ids: list[int],
                      for f in cached_features.values()
                      if f is not None and f.get('id')}
 
-  for feature_id in feature_ids:
-    if result_dict.get(feature_id) is None:
-      futures_by_id[feature_id] = FeatureEntry.get_by_id_async(feature_id)
-
-  stages_dict = {}
-  if futures_by_id:
-    needed_ids = list(futures_by_id.keys())
-    stages_list = Stage.query(Stage.feature_id.IN(needed_ids), Stage.archived == False).fetch(None)
-    stages_dict = stage_helpers.organize_all_stages_by_feature(stages_list)
-
-  for future in futures_by_id.values():
-    unformatted_feature: Optional[FeatureEntry] = future.get_result()
-    if unformatted_feature and not unformatted_feature.deleted:
-      feature_id = unformatted_feature.key.integer_id()
-      feature = converters.feature_entry_to_json_verbose(
-          unformatted_feature, prefetched_stages=stages_dict.get(feature_id))
-      if unformatted_feature.updated is not None:
-        feature['updated_display'] = (
-            unformatted_feature.updated.strftime("%Y-%m-%d"))
-      else:
-        feature['updated_display'] = ''
-      result_dict[feature_id] = feature
+  needed_ids = [
+      feature_id for feature_id in feature_ids
+      if result_dict.get(feature_id) is None]
+
+  # The verbose JSON cache is refreshed on every feature and stage write,
+  # so it can fill in most features without touching the datastore.
+  if update_cache and needed_ids:
+    cached_verbose = feature_json_cache.get_multi(needed_ids)
+    for feature_id, verbose in cached_verbose.items():
+      result_dict[feature_id] = _add_updated_display(dict(verbose))
+
+  unconverted_ids = [
+      feature_id for feature_id in needed_ids
+      if feature_id not in result_dict]
+  if unconverted_ids:
+    entries_future = ndb.get_multi_async(
+        [ndb.Key('FeatureEntry', feature_id)
+         for feature_id in unconverted_ids])
+    stage_futures = get_stages_by_feature_async(unconverted_ids)
+    stages_dict = stage_helpers.organize_all_stages_by_feature(
+        [stage for future in stage_futures for stage in future.result()])
+
+    for future in entries_future:
+      unformatted_feature: Optional[FeatureEntry] = future.result()
+      if unformatted_feature and not unformatted_feature.deleted:
+        feature_id = unformatted_feature.key.integer_id()
+        stages = stages_dict.get(feature_id, [])
+        if update_cache:
+          feature = feature_json_cache.store(unformatted_feature, stages)
+        else:
+          feature = converters.feature_entry_to_json_verbose(
+              unformatted_feature, prefetched_stages=stages)
+        result_dict[feature_id] = _add_updated_display(dict(feature))
 
   if update_cache:
     to_cache = {}
-    for feature_id in futures_by_id:
+    for feature_id in needed_ids:
       if feature_id in result_dict:
         store_key = FeatureEntry.feature_cache_key(
             FeatureEntry.DEFAULT_CACHE_KEY, feature_id)
@@ -392,53 +303,3 @@ def get_by_ids(feature_ids: list[int],
       result_dict[feature_id] for feature_id in feature_ids
       if feature_id in result_dict]
   return result_list
-
-
-def get_features_by_impl_status(limit: int | None=None, update_cache: bool=False,
-    show_unlisted: bool=False) -> list[dict]:
-  """Return a list of JSON dicts for features, ordered by chrome_impl_status.
-
-  Because the cache may rarely have stale data, this should only be
-  used for displaying data read-only, not for populating forms or
-  procesing a POST to edit data.  For editing use case, load the
-  data from NDB directly.
-  """
-  cache_key = '%s|%s|%s|%s' % (FeatureEntry.DEFAULT_CACHE_KEY,
-                                'impl_order', limit, show_unlisted)
-
-  feature_list = rediscache.get(cache_key)
-  logging.info('getting feature list, sorted by chrome_impl_status')
-
-  # On cache miss, do a db query.
-  if not feature_list or update_cache:
-    logging.info('recomputing feature list')
-    # Get features by implementation status.
-    futures: list[Future] = []
-    stages_future = Stage.query(Stage.archived == False).fetch_async()
-    for impl_status in IMPLEMENTATION_STATUS.keys():
-      q = FeatureEntry.query(FeatureEntry.impl_status_chrome == impl_status)
-      q = q.order(FeatureEntry.impl_status_chrome)
-      q = q.order(FeatureEntry.name)
-      futures.append(q.fetch_async(None))
-    # Put "No active development" at end of list.
-    futures = futures[1:] + futures[0:1]
-    logging.info('Waiting on futures')
-    query_results = [future.result() for future in futures]
-    all_stages = stage_helpers.organize_all_stages_by_feature(
-        stages_future.result())
-
-    # Construct the proper ordering.
-    feature_list = []
-    for section in query_results:
-      if len(section) > 0:
-        section = [f for f in section if f.feature_type != FEATURE_TYPE_ENTERPRISE_ID]
-        section = [converters.feature_entry_to_json_basic(
-            f, all_stages[f.key.integer_id()]) for f in section]
-        section[0]['first_of_section'] = True
-        if not show_unlisted:
-          section = filter_unlisted(section)
-        feature_list.extend(section)
-
-    rediscache.set(cache_key, feature_list)
-
-  return feature_list
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 from datetime import datetime
+from unittest import mock
 import testing_config  # Must be imported before the module under test.
 
 from api import converters
@@ -21,6 +22,7 @@ from internals.core_enums import *
 from internals import feature_helpers
 from internals import stage_helpers
 from internals.core_models import FeatureEntry, MilestoneSet, Stage
+from internals.milestone_index import FeatureMilestoneIndex
 
 
 class FeatureHelpersTest(testing_config.CustomTestCase):
@@ -81,7 +83,7 @@ class FeatureHelpersTest(testing_config.CustomTestCase):
         self.feature_4.key.integer_id())
 
   def tearDown(self):
-    for kind in [FeatureEntry, Stage]:
+    for kind in [FeatureEntry, Stage, FeatureMilestoneIndex]:
       for entity in kind.query():
         entity.key.delete()
 
@@ -201,6 +203,20 @@ class FeatureHelpersTest(testing_config.CustomTestCase):
     self.assertEqual(1, len(actual))
     self.assertEqual(cached_feature, actual[0])
 
+  def test_get_by_ids__verbose_cache(self):
+    """After a prefix wipe, features come from the verbose JSON cache."""
+    rediscache.delete_keys_with_prefix(FeatureEntry.feature_cache_prefix())
+    feature_id = self.feature_1.key.integer_id()
+
+    with mock.patch('api.converters.feature_entry_to_json_verbose') as conv:
+      actual = feature_helpers.get_by_ids([feature_id])
+
+    conv.assert_not_called()
+    self.assertEqual('feature a', actual[0]['name'])
+    self.assertEqual(
+        self.feature_1.updated.strftime('%Y-%m-%d'),
+        actual[0]['updated_display'])
+
   def test_get_by_ids__batch_order(self):
     """Features are returned in the order of the given IDs."""
     actual = feature_helpers.get_by_ids([
@@ -216,6 +232,40 @@ class FeatureHelpersTest(testing_config.CustomTestCase):
     self.assertEqual('feature c', actual[2]['name'])
     self.assertEqual('feature b', actual[3]['name'])
 
+  @mock.patch('internals.feature_helpers.STAGE_QUERY_CHUNK_SIZE', 3)
+  def test_get_by_ids__chunked_stages(self):
+    """Stages are loaded in chunks and matched to the right features."""
+    actual = feature_helpers.get_by_ids([
+        self.feature_4.key.integer_id(),
+        self.feature_1.key.integer_id(),
+        self.feature_3.key.integer_id(),
+        self.feature_2.key.integer_id(),
+    ], update_cache=False)
+
+    self.assertEqual(
+        ['feature d', 'feature a', 'feature c', 'feature b'],
+        [f['name'] for f in actual])
+    for feature in actual:
+      self.assertTrue(feature['stages'])
+      self.assertEqual(
+          {feature['id']}, {s['feature_id'] for s in feature['stages']})
+
+  def test_get_entries_by_id_async(self):
+    """We can batch load feature entries sorted by name."""
+    future = feature_helpers.get_entries_by_id_async([
+        self.feature_4.key.integer_id(),
+        self.feature_2.key.integer_id(),
+        self.feature_1.key.integer_id(),
+        99999,
+    ])
+
+    actual = feature_helpers.get_future_results(future)
+    self.assertEqual(
+        ['feature a', 'feature b', 'feature d'], [fe.name for fe in actual])
+    self.assertEqual(
+        [], feature_helpers.get_future_results(
+            feature_helpers.get_entries_by_id_async([])))
+
   def test_get_by_ids__cached_correctly(self):
     """We should no longer be able to trigger bug #1647."""
     # Cache one to try to trigger the bug.
@@ -383,6 +433,33 @@ class FeatureHelpersTest(testing_config.CustomTestCase):
         cached_test_feature,
         actual)
 
+  def test_get_in_milestones__warm_and_cold(self):
+    """Cached milestones are reused and the others are computed together."""
+    self.feature_1.impl_status_chrome = ENABLED_BY_DEFAULT
+    self.fe_1_stages_dict[160][0].milestones = MilestoneSet(desktop_first=1)
+    self.feature_1.put()
+    self.fe_1_stages_dict[160][0].put()
+    self.feature_2.impl_status_chrome = REMOVED
+    self.fe_2_stages_dict[260][0].milestones = MilestoneSet(desktop_first=2)
+    self.feature_2.put()
+    self.fe_2_stages_dict[260][0].put()
+
+    cache_key = '%s|%s|%s' % (
+        FeatureEntry.DEFAULT_CACHE_KEY, 'milestone', 1)
+    cached_test_feature = {'test': [{'name': 'test_feature', 'unlisted': False}]}
+    rediscache.set(cache_key, cached_test_feature)
+
+    actual = feature_helpers.get_in_milestones([1, 2, 3])
+
+    self.assertEqual(cached_test_feature, actual[1])
+    self.assertEqual(
+        ['feature b'], [f['name'] for f in actual[2]['Removed']])
+    self.assertEqual(0, sum(len(fs) for fs in actual[3].values()))
+    self.assertEqual(actual[2], feature_helpers.get_in_milestone(2))
+    cache_key_2 = '%s|%s|%s' % (
+        FeatureEntry.DEFAULT_CACHE_KEY, 'milestone', 2)
+    self.assertEqual(actual[2], rediscache.get(cache_key_2))
+
   def test_get_in_milestone__non_enterprise_features(self):
     """We can retrieve a list of features."""
     self.fe_1_stages_dict[160][0].milestones = MilestoneSet(desktop_first=1)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache of the verbose JSON representation of each feature.
+
+Each entry holds the output of converters.feature_entry_to_json_verbose
+along with the version that it was computed from: the feature's updated
+time and the latest updated time of its unarchived stages.  Entries are
+recomputed whenever a FeatureEntry or Stage of that feature is put (see
+derived_entities).  They use their own key prefix, so they are not dropped when
+the FeatureEntries|* prefix is wiped after an edit.
+"""
+
+from typing import Iterable, Optional
+
+from api import converters
+from framework import rediscache
+from internals.core_models import FeatureEntry, Stage
+from internals.data_types import VerboseFeatureDict
+
+
+CACHE_KEY = 'FeatureVerbose'
+Version = tuple[str, str]
+
+
+def cache_key(feature_id: int) -> str:
+  return '%s|%s' % (CACHE_KEY, feature_id)
+
+
+def _iso(value) -> str:
+  return value.isoformat() if value else ''
+
+
+def compute_version(fe: FeatureEntry, stages: Iterable[Stage]) -> Version:
+  """Return (feature updated, latest stage updated) as ISO strings."""
+  stage_times = [s.updated for s in stages if s.updated]
+  return (_iso(fe.updated), _iso(max(stage_times, default=None)))
+
+
+def store(fe: FeatureEntry, stages: list[Stage]) -> VerboseFeatureDict:
+  """Convert fe using the given unarchived stages and cache the result."""
+  feature = converters.feature_entry_to_json_verbose(
+      fe, prefetched_stages=stages)
+  rediscache.set(
+      cache_key(fe.key.integer_id()),
+      {'version': compute_version(fe, stages), 'feature': feature})
+  return feature
+
+
+def invalidate(feature_id: int) -> None:
+  """Drop the cached JSON of a feature until it is recomputed."""
+  rediscache.delete(cache_key(feature_id))
+
+
+def update_feature(
+    feature_id: int, fe: Optional[FeatureEntry],
+    stages: Iterable[Stage]) -> None:
+  """Recompute the cached verbose JSON of one feature."""
+  if fe is None or fe.deleted:
+    invalidate(feature_id)
+    return
+  store(fe, [s for s in stages if not s.archived])
+
+
+def get_multi(feature_ids: list[int]) -> dict[int, VerboseFeatureDict]:
+  """Return {feature_id: verbose_dict} for the features that are cached."""
+  if not feature_ids:
+    return {}
+  entries = rediscache.get_multi([cache_key(fid) for fid in feature_ids])
+  if not entries:
+    return {}
+  return {
+      fid: entries[cache_key(fid)]['feature']
+      for fid in feature_ids
+      if entries.get(cache_key(fid))}
+
+
+def get_verbose(fe: FeatureEntry) -> VerboseFeatureDict:
+  """Return the verbose JSON of fe, using the cache if it is current.
+
+  Stage writes refresh the entry, so it is enough to check that it was
+  computed from the same version of the feature entry itself.
+  """
+  entry = rediscache.get(cache_key(fe.key.integer_id()))
+  if entry and entry['version'][0] == _iso(fe.updated):
+    return entry['feature']
+
+  if fe.deleted:
+    return converters.feature_entry_to_json_verbose(fe)
+  stages = Stage.query(
+      Stage.feature_id == fe.key.integer_id(), Stage.archived == False).fetch()
+  return store(fe, stages)
@@ -0,0 +1,110 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+from unittest import mock
+
+import testing_config  # Must be imported before the module under test.
+
+from framework import rediscache
+from internals.core_enums import *
+from internals.core_models import FeatureEntry, MilestoneSet, Stage
+from internals import feature_json_cache
+
+
+class FeatureJsonCacheTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.fe = FeatureEntry(
+        name='feature a', summary='sum', category=1,
+        updated=datetime.datetime(2024, 1, 2, 3, 4, 5))
+    self.fe.put()
+    self.fe_id = self.fe.key.integer_id()
+    self.stage = Stage(
+        feature_id=self.fe_id, stage_type=STAGE_BLINK_SHIPPING,
+        milestones=MilestoneSet(desktop_first=120))
+    self.stage.put()
+    self.cache_key = feature_json_cache.cache_key(self.fe_id)
+
+  def tearDown(self):
+    for stage in Stage.query().fetch():
+      stage.key.delete()
+    for fe in FeatureEntry.query().fetch():
+      fe.key.delete()
+    rediscache.delete(self.cache_key)
+
+  def test_compute_version(self):
+    """The version combines the feature and latest stage updated times."""
+    self.assertEqual(
+        ('2024-01-02T03:04:05', self.stage.updated.isoformat()),
+        feature_json_cache.compute_version(self.fe, [self.stage]))
+    self.assertEqual(
+        ('2024-01-02T03:04:05', ''),
+        feature_json_cache.compute_version(self.fe, []))
+
+  def test_update_feature__on_put(self):
+    """Writing a feature or stage refreshes its cache entry."""
+    entry = rediscache.get(self.cache_key)
+    self.assertEqual('feature a', entry['feature']['name'])
+    self.assertEqual(
+        [120],
+        [s['desktop_first'] for s in entry['feature']['stages']])
+
+    self.stage.milestones.desktop_first = 121
+    self.stage.put()
+    entry = rediscache.get(self.cache_key)
+    self.assertEqual(
+        [121],
+        [s['desktop_first'] for s in entry['feature']['stages']])
+
+  def test_update_feature__survives_prefix_wipe(self):
+    """Wiping the FeatureEntries|* prefix leaves the entry in place."""
+    rediscache.delete_keys_with_prefix(FeatureEntry.feature_cache_prefix())
+    self.assertEqual(
+        {self.fe_id: rediscache.get(self.cache_key)['feature']},
+        feature_json_cache.get_multi([self.fe_id, self.fe_id + 1]))
+
+  def test_update_feature__deleted(self):
+    """Soft-deleted and removed features are dropped from the cache."""
+    self.fe.deleted = True
+    self.fe.put()
+    self.assertIsNone(rediscache.get(self.cache_key))
+
+    self.fe.deleted = False
+    self.fe.put()
+    self.assertIsNotNone(rediscache.get(self.cache_key))
+    self.fe.key.delete()
+    self.assertIsNone(rediscache.get(self.cache_key))
+
+  def test_get_multi__empty(self):
+    self.assertEqual({}, feature_json_cache.get_multi([]))
+
+  def test_get_verbose__hit(self):
+    """A current cache entry is used without converting the feature."""
+    with mock.patch('api.converters.feature_entry_to_json_verbose') as conv:
+      actual = feature_json_cache.get_verbose(self.fe)
+    conv.assert_not_called()
+    self.assertEqual('feature a', actual['name'])
+
+  def test_get_verbose__stale(self):
+    """An entry computed from an older feature entry is recomputed."""
+    rediscache.set(self.cache_key, {
+        'version': ('2023-01-01T00:00:00', ''),
+        'feature': {'name': 'old name'}})
+
+    actual = feature_json_cache.get_verbose(self.fe)
+
+    self.assertEqual('feature a', actual['name'])
+    self.assertEqual(
+        'feature a', rediscache.get(self.cache_key)['feature']['name'])
@@ -14,9 +14,10 @@
 # limitations under the License.
 
 import datetime
+import functools
 import logging
 from collections import Counter
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 from urllib.parse import urlparse
 
 from google.cloud import ndb  # type: ignore
@@ -30,6 +31,7 @@ from internals.link_helpers import (
   TAG_REVIEW_URL_PATTERN,
   WEBKIT_REVIEW_URL_PATTERN,
   Link,
+  LinkFetcher,
 )
 
 LINK_STALE_MINUTES = 30
@@ -48,10 +50,17 @@ class FeatureLinks(ndb.Model):
   information = ndb.JsonProperty()
   is_error = ndb.BooleanProperty(default=False)
   http_error_code = ndb.IntegerProperty()
+  # HTTP validators from the last successful fetch, used to send
+  # conditional requests when refreshing the link.
+  etag = ndb.StringProperty(indexed=False)
+  last_modified = ndb.StringProperty(indexed=False)
 
 
 def update_feature_links(fe: FeatureEntry, changed_fields: list[tuple[str, Any, Any]]) -> None:
   """Update the links in the given feature entry."""
+  urls_to_remove: set[str] = set()
+  urls_to_add: set[str] = set()
+  fe_changed = False
   for field, old_val, new_val in changed_fields:
     if new_val != old_val:
       if old_val is None and not bool(new_val):
@@ -65,43 +74,78 @@ def update_feature_links(fe: FeatureEntry, changed_fields: list[tuple[str, Any,
         fe.ff_views_link_result = None
       if field == 'tag_review':
         fe.tag_review_resolution = None
-      fe.put()
+      fe_changed = True
 
       old_val_urls = Link.extract_urls_from_value(old_val)
       new_val_urls = Link.extract_urls_from_value(new_val)
-      urls_to_remove = set(old_val_urls) - set(new_val_urls)
-      urls_to_add = set(new_val_urls) - set(old_val_urls)
-      if urls_to_remove or urls_to_add:
-        fe_values = fe.to_dict(exclude=[field]).values()
-        all_urls = [
-          url for value in fe_values for url in Link.extract_urls_from_value(value)
-        ]
-        for url in urls_to_remove:
-          if url not in all_urls:
-            # if the url is not in any other field in this feature, then remove it from the index
-            link = Link(url)
-            _remove_link(link, fe)
-        for url in urls_to_add:
-          link = Link(url)
-          if link.type:
-            feature_link = _get_index_link(link, fe, should_parse_new_link=True)
-            if feature_link:
-              feature_link.put()
-              logging.info(
-                f'Indexed feature_link {feature_link.url} to {feature_link.key.integer_id()} for feature {fe.key.integer_id()}'
-              )
-
-
-def _get_index_link(link: Link, fe: FeatureEntry, should_parse_new_link: bool = False) -> FeatureLinks | None:
+      removed_urls = set(old_val_urls) - set(new_val_urls)
+      added_urls = set(new_val_urls) - set(old_val_urls)
+      if removed_urls:
+        all_urls = _extract_feature_urls(fe, exclude=[field])
+        # if the url is not in any other field in this feature, then remove it from the index
+        urls_to_remove.update(url for url in removed_urls if url not in all_urls)
+      urls_to_add.update(added_urls)
+
+  if not fe_changed:
+    return
+  urls_to_remove -= urls_to_add
+  existing_links = _get_links_by_url(urls_to_remove | urls_to_add)
+  links_to_put: list[FeatureLinks] = []
+  links_to_delete: list[FeatureLinks] = []
+
+  for url in urls_to_remove:
+    feature_link = existing_links.get(url)
+    if feature_link and _remove_link(feature_link, fe):
+      if feature_link.feature_ids:
+        links_to_put.append(feature_link)
+        logging.info(f'Updated indexed link {url}')
+      else:
+        # delete the link if it is not used by any feature
+        links_to_delete.append(feature_link)
+        logging.info(f'Delete indexed link {url}')
+
+  for url in urls_to_add:
+    link = Link(url)
+    if link.type:
+      feature_link = _get_index_link(
+          link, fe, should_parse_new_link=True,
+          existing_link=existing_links.get(url))
+      if feature_link:
+        _denormalize_feature_link_into_entries(feature_link, [fe])
+        links_to_put.append(feature_link)
+
+  ndb.put_multi(links_to_put + [fe])
+  ndb.delete_multi([fl.key for fl in links_to_delete])
+  for feature_link in links_to_put:
+    logging.info(
+      f'Indexed feature_link {feature_link.url} to {feature_link.key.integer_id()} for feature {fe.key.integer_id()}'
+    )
+
+
+def _get_links_by_url(urls: Iterable[str]) -> dict[str, FeatureLinks]:
+  """Return the existing FeatureLinks for the given urls, keyed by url."""
+  urls = list(urls)
+  if not urls:
+    return {}
+  feature_links = FeatureLinks.query(FeatureLinks.url.IN(urls)).fetch(None)
+  links_by_url: dict[str, FeatureLinks] = {}
+  for feature_link in feature_links:
+    links_by_url.setdefault(feature_link.url, feature_link)
+  return links_by_url
+
+
+def _get_index_link(
+    link: Link, fe: FeatureEntry, should_parse_new_link: bool = False,
+    existing_link: FeatureLinks | None = None) -> FeatureLinks | None:
   """
   indexes a given link for a specific feature by creating or updating a `FeatureLinks` object.
-  Returns the `FeatureLinks` object or None.
+  existing_link is the `FeatureLinks` already stored for link.url, if any.
+  Returns the `FeatureLinks` object or None. The caller is responsible for saving it.
   """
 
   feature_id = fe.key.integer_id()
-  feature_links = FeatureLinks.query(FeatureLinks.url == link.url).fetch(None)
-  feature_link: FeatureLinks = feature_links[0] if feature_links else None
-  if hasattr(feature_link, 'feature_ids'):
+  feature_link = existing_link
+  if feature_link:
     if feature_id not in feature_link.feature_ids:
       feature_link.feature_ids.append(feature_id)
       feature_link.type = link.type
@@ -116,28 +160,24 @@ def _get_index_link(link: Link, fe: FeatureEntry, should_parse_new_link: bool =
         url=link.url,
         information=link.information,
         is_error=link.is_error,
-        http_error_code=link.http_error_code
+        http_error_code=link.http_error_code,
+        etag=link.etag,
+        last_modified=link.last_modified,
     )
 
-  _denormalize_feature_link_into_entries(feature_link, [fe])
   return feature_link
 
 
-def _remove_link(link: Link, fe: FeatureEntry) -> None:
-  """Un-index the given link."""
+def _remove_link(feature_link: FeatureLinks | None, fe: FeatureEntry) -> bool:
+  """Un-index fe from the given link, return True if feature_link changed.
+
+  The caller is responsible for saving or deleting feature_link.
+  """
   feature_id = fe.key.integer_id()
-  feature_links = FeatureLinks.query(FeatureLinks.url == link.url).fetch(None)
-  feature_link: FeatureLinks = feature_links[0] if feature_links else None
-  if hasattr(feature_link, 'feature_ids'):
-    if feature_id in feature_link.feature_ids:
-      feature_link.feature_ids.remove(feature_id)
-      if feature_link.feature_ids:
-        feature_link.put()
-        logging.info(f'Updated indexed link {link.url}')
-      else:
-        # delete the link if it is not used by any feature
-        feature_link.key.delete()
-        logging.info(f'Delete indexed link {link.url}')
+  if feature_link and feature_id in feature_link.feature_ids:
+    feature_link.feature_ids.remove(feature_id)
+    return True
+  return False
 
 
 def _get_review_result_from_feature_link(
@@ -158,24 +198,29 @@ def _get_review_result_from_feature_link(
   return None
 
 
-def _put_if_changed(model: ndb.Model, field: str, new_val) -> None:
+def _set_if_changed(model: ndb.Model, field: str, new_val) -> bool:
+  """Set the field on model and return True if its value changed."""
   old_val = getattr(model, field)
   if old_val != new_val:
     setattr(model, field, new_val)
     logging.info(
       'Denormalized %s=%s into %s %s', field, new_val, model.key.kind(), model.key.id()
     )
-    model.put()
+    return True
+  return False
 
 
 def _denormalize_feature_link_into_entries(
   feature_link: FeatureLinks, possible_entries: list[FeatureEntry] | None = None
-) -> None:
+) -> list[FeatureEntry]:
   """Fills information from feature_link into relevant fields in the FeatureEntries it appears in.
 
   Params:
     possible_entries: If the caller knows which FeatureEntries might need updating, pass that list here.
+
+  Returns the FeatureEntries that were changed. The caller is responsible for saving them.
   """
+  changed_entries: list[FeatureEntry] = []
   if feature_link.type == LINK_TYPE_GITHUB_ISSUE:
     if possible_entries is None:
       possible_entries = ndb.get_multi(
@@ -184,11 +229,12 @@ def _denormalize_feature_link_into_entries(
     for fe in possible_entries:
       if fe is None:
         continue
+      changed = False
       if (
         TAG_REVIEW_URL_PATTERN.search(feature_link.url)
         and fe.tag_review == feature_link.url
       ):
-        _put_if_changed(
+        changed |= _set_if_changed(
           fe,
           'tag_review_resolution',
           _get_review_result_from_feature_link(feature_link, 'resolution: '),
@@ -197,7 +243,7 @@ def _denormalize_feature_link_into_entries(
         GECKO_REVIEW_URL_PATTERN.search(feature_link.url)
         and fe.ff_views_link == feature_link.url
       ):
-        _put_if_changed(
+        changed |= _set_if_changed(
           fe,
           'ff_views_link_result',
           _get_review_result_from_feature_link(feature_link, 'position: '),
@@ -206,11 +252,14 @@ def _denormalize_feature_link_into_entries(
         WEBKIT_REVIEW_URL_PATTERN.search(feature_link.url)
         and fe.safari_views_link == feature_link.url
       ):
-        _put_if_changed(
+        changed |= _set_if_changed(
           fe,
           'safari_views_link_result',
           _get_review_result_from_feature_link(feature_link, 'position: '),
         )
+      if changed:
+        changed_entries.append(fe)
+  return changed_entries
 
 
 def _get_feature_links(feature_ids: list[int]) -> list[FeatureLinks]:
@@ -276,39 +325,111 @@ class FeatureLinksUpdateHandler(FlaskHandler):
     return {'message': 'Done'}
 
 
+def _make_refresh_link(feature_link: FeatureLinks) -> Link:
+  """Make a Link that will only be re-fetched if the page has changed."""
+  if (feature_link.is_error or
+      feature_link.type != Link.get_type(feature_link.url)):
+    # Our stored copy is not usable, so do a full fetch.
+    return Link(feature_link.url)
+  return Link(
+      feature_link.url, etag=feature_link.etag,
+      last_modified=feature_link.last_modified)
+
+
 def _index_feature_links_by_ids(
         feature_link_ids: list[Any], should_notify_on_error: bool) -> None:
   """index the links in the given feature links ids"""
-  for feature_link_id in feature_link_ids:
-    feature_link: FeatureLinks = FeatureLinks.get_by_id(feature_link_id)
-    if feature_link:
-      logging.info(f'processing {feature_link.url}')
-      link = Link(feature_link.url)
-      link.parse()
-      if link.is_error:
-        if not feature_link.is_error and should_notify_on_error:
-          # TODO: if feature_link turns from no-error to error, notify users
-          pass
-        if link.http_error_code:
-          feature_link.http_error_code = link.http_error_code
-        feature_link.is_error = link.is_error
-        logging.info(f'Update indexed link {feature_link_id} {feature_link.url} encountered error')
-      else:
-        # update the information if it is not an error
-        feature_link.information = link.information
-        feature_link.is_error = False
-        feature_link.http_error_code = None
-        logging.info(f'Update indexed link {feature_link_id} {feature_link.url} successfully')
-        _denormalize_feature_link_into_entries(feature_link)
+  feature_links: list[FeatureLinks] = [
+      fl for fl in ndb.get_multi(
+          [ndb.Key(FeatureLinks, id) for id in feature_link_ids])
+      if fl]
+
+  links_by_url = {fl.url: _make_refresh_link(fl) for fl in feature_links}
+  # Fetch all the links concurrently, any that miss the deadline will be
+  # picked up by a later task.
+  parsed_links = LinkFetcher().parse_all(list(links_by_url.values()))
+  parsed_urls = {link.url for link in parsed_links}
+
+  links_to_put: list[FeatureLinks] = []
+  links_to_denormalize: list[FeatureLinks] = []
+  for feature_link in feature_links:
+    if feature_link.url not in parsed_urls:
+      logging.info(f'Skipped indexed link {feature_link.url}, not parsed')
+      continue
+    feature_link_id = feature_link.key.id()
+    logging.info(f'processing {feature_link.url}')
+    link = links_by_url[feature_link.url]
+    links_to_put.append(feature_link)
+    if link.not_modified:
+      # Nothing changed, so just mark the link as fresh.
+      logging.info(f'Indexed link {feature_link_id} {feature_link.url} not modified')
+      continue
+    if link.is_error:
+      if not feature_link.is_error and should_notify_on_error:
+        # TODO: if feature_link turns from no-error to error, notify users
+        pass
+      if link.http_error_code:
+        feature_link.http_error_code = link.http_error_code
+      feature_link.is_error = link.is_error
+      logging.info(f'Update indexed link {feature_link_id} {feature_link.url} encountered error')
+    else:
+      # update the information if it is not an error
+      feature_link.information = link.information
+      feature_link.is_error = False
+      feature_link.http_error_code = None
+      feature_link.etag = link.etag
+      feature_link.last_modified = link.last_modified
+      logging.info(f'Update indexed link {feature_link_id} {feature_link.url} successfully')
+      links_to_denormalize.append(feature_link)
 
-      feature_link.type = link.type
-      feature_link.put()
+    feature_link.type = link.type
+
+  changed_entries = _denormalize_feature_links(links_to_denormalize)
+  ndb.put_multi(links_to_put + changed_entries)
+
+
+def _denormalize_feature_links(
+    feature_links: list[FeatureLinks]) -> list[FeatureEntry]:
+  """Denormalize many links, loading their FeatureEntries in one batch.
+
+  Returns the changed FeatureEntries, each one only once.
+  """
+  feature_ids = {
+      id for fl in feature_links if fl.type == LINK_TYPE_GITHUB_ISSUE
+      for id in fl.feature_ids}
+  if not feature_ids:
+    return []
+  entries = ndb.get_multi(
+      [ndb.Key('FeatureEntry', id) for id in sorted(feature_ids)])
+  entries_by_id = {fe.key.integer_id(): fe for fe in entries if fe}
+
+  changed_by_id: dict[int, FeatureEntry] = {}
+  for feature_link in feature_links:
+    possible_entries = [
+        entries_by_id[id] for id in feature_link.feature_ids
+        if id in entries_by_id]
+    for fe in _denormalize_feature_link_into_entries(
+        feature_link, possible_entries):
+      changed_by_id[fe.key.integer_id()] = fe
+  return list(changed_by_id.values())
+
+
+@functools.cache
+def _get_url_bearing_fields() -> list[str]:
+  """Return the names of the FeatureEntry fields that can hold urls."""
+  return [
+      prop._code_name for prop in FeatureEntry._properties.values()
+      if isinstance(prop, ndb.TextProperty)]
 
 
-def _extract_feature_urls(fe: FeatureEntry) -> list[str]:
-  fe_values = fe.to_dict().values()
-  all_urls = [url for value in fe_values for url in Link.extract_urls_from_value(value)]
-  return list(set(all_urls))
+def _extract_feature_urls(
+    fe: FeatureEntry, exclude: Iterable[str] = ()) -> list[str]:
+  """Return the unique urls in the text fields of fe."""
+  all_urls: set[str] = set()
+  for field in _get_url_bearing_fields():
+    if field not in exclude:
+      all_urls.update(Link.extract_urls_from_value(getattr(fe, field)))
+  return list(all_urls)
 
 
 def batch_index_feature_entries(fes: list[FeatureEntry], skip_existing: bool) -> int:
@@ -324,25 +445,39 @@ def batch_index_feature_entries(fes: list[FeatureEntry], skip_existing: bool) ->
 
   link_count = 0
 
-  for fe in fes:
-    if skip_existing:
-      feature_links = _get_feature_links([fe.key.integer_id()])
-      if len(feature_links) > 0:
-        continue
+  if skip_existing:
+    indexed_ids = {
+        id for fl in _get_feature_links([fe.key.integer_id() for fe in fes])
+        for id in fl.feature_ids}
+    fes = [fe for fe in fes if fe.key.integer_id() not in indexed_ids]
+
+  urls_by_feature = [(fe, _extract_feature_urls(fe)) for fe in fes]
+  links_by_url = _get_links_by_url(
+      {url for _, urls in urls_by_feature for url in urls})
+  indexed_links: dict[str, FeatureLinks] = {}
+  changed_entries: list[FeatureEntry] = []
 
-    urls = _extract_feature_urls(fe)
-    feature_links = []
+  for fe, urls in urls_by_feature:
+    indexed_count = 0
     for url in urls:
       link = Link(url)
       if link.type:
-        fl = _get_index_link(link, fe, should_parse_new_link=True)
+        fl = _get_index_link(
+            link, fe, should_parse_new_link=True,
+            existing_link=links_by_url.get(url))
         if fl:
-          feature_links.append(fl)
-
-    ndb.put_multi(feature_links)
-    link_count += len(feature_links)
-    logging.info(f'Feature {fe.key.integer_id()} indexed {len(feature_links)} urls')
-
+          # Later features in this batch should update the same entity.
+          links_by_url[url] = fl
+          indexed_links[url] = fl
+          if _denormalize_feature_link_into_entries(fl, [fe]):
+            changed_entries.append(fe)
+          indexed_count += 1
+
+    link_count += indexed_count
+    logging.info(f'Feature {fe.key.integer_id()} indexed {indexed_count} urls')
+
+  changed_by_key = {fe.key: fe for fe in changed_entries}
+  ndb.put_multi(list(indexed_links.values()) + list(changed_by_key.values()))
   return link_count
 
 
@@ -24,6 +24,7 @@ from internals.feature_links import (
   FeatureLinks,
   FeatureLinksUpdateHandler,
   UpdateAllFeatureLinksHandlers,
+  batch_index_feature_entries,
   get_domain_with_scheme,
   get_feature_links_summary,
   update_feature_links,
@@ -31,8 +32,10 @@ from internals.feature_links import (
 from internals.link_helpers import (
   LINK_TYPE_CHROMIUM_BUG,
   LINK_TYPE_GITHUB_ISSUE,
+  LINK_TYPE_SPECS,
   LINK_TYPE_WEB,
   Link,
+  LinkFetcher,
 )
 
 test_app = flask.Flask(__name__)
@@ -258,6 +261,34 @@ class LinkTest(testing_config.CustomTestCase):
       FeatureEntry.get_by_id(self.feature_id).ff_views_link_result, 'positive'
     )
 
+  @mock.patch.object(LinkFetcher, 'get')
+  def test_update_feature_links__not_modified(self, mock_get):
+    """A 304 response only bumps the updated timestamp."""
+    mock_get.return_value = testing_config.Blank(status_code=304, text='')
+    url = 'https://www.w3.org/TR/css-pseudo-4/'
+    fl = FeatureLinks(
+      feature_ids=[self.feature_id],
+      type=LINK_TYPE_SPECS,
+      url=url,
+      information={'title': 'old title'},
+      etag='"v1"',
+    )
+    fl.put()
+    old_updated = fl.updated
+
+    handler = FeatureLinksUpdateHandler()
+    with test_app.test_request_context(
+      '/tasks/update-feature-links', json={'feature_link_ids': [fl.key.id()]}
+    ):
+      handler.process_post_data()
+
+    mock_get.assert_called_once_with(
+      url, allow_redirects=True, headers={'If-None-Match': '"v1"'})
+    actual = FeatureLinks.get_by_id(fl.key.id())
+    self.assertEqual({'title': 'old title'}, actual.information)
+    self.assertEqual('"v1"', actual.etag)
+    self.assertGreater(actual.updated, old_updated)
+
   @mock.patch.object(Link, '_parse_github_issue')
   def test_adding_link_to_second_feature_saves_position_in_second_feature(
     self, mockParse: mock.MagicMock
@@ -326,6 +357,23 @@ class LinkTest(testing_config.CustomTestCase):
     self.assertNotIn(self.feature_id, link.feature_ids)
     self.assertIn(self.feature2_id, link.feature_ids)
 
+  @mock.patch.object(Link, '_validate_url')
+  def test_batch_index_feature_entries__shared_url(self, mock_validate):
+    """Features in one batch that share a url share one FeatureLinks."""
+    mock_validate.return_value = True
+    url = 'https://example.com/explainer'
+    self.feature.explainer_links = [url]
+    self.feature2.explainer_links = [url]
+
+    actual = batch_index_feature_entries([self.feature, self.feature2], False)
+
+    self.assertEqual(2, actual)
+    links = FeatureLinks.query(FeatureLinks.url == url).fetch(None)
+    self.assertEqual(1, len(links))
+    self.assertCountEqual(
+        [self.feature_id, self.feature2_id], links[0].feature_ids)
+    self.assertEqual(1, mock_validate.call_count)
+
   def test_update_all_feature_links(self):
     feature_links = [
         # not stale feature link
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Versioned snapshot of the feature list served as /features.json.
+
+Each feature has a FeatureListRow that holds its pre-serialized JSON.
+When a FeatureEntry or Stage is put, only that feature's row is patched
+and the snapshot version is bumped if the row changed.  The full list
+is assembled from the rows, gzipped, and cached in redis under its
+version, so requests are answered with bytes and an ETag and never need
+to convert every feature.
+"""
+
+import gzip
+import json
+import logging
+from typing import Iterable, Optional
+
+from google.cloud import ndb  # type: ignore
+
+from api import converters
+from framework import rediscache
+from internals.core_enums import *
+from internals.core_models import FeatureEntry, Stage
+
+
+SNAPSHOT_ID = 'features'
+SNAPSHOT_CACHE_KEY = 'FeatureListSnapshot'
+VARIANT_ALL = 'all'
+VARIANT_LISTED = 'listed'
+
+# Sections are listed in IMPLEMENTATION_STATUS order, except that
+# "No active development" is put at the end of the list.
+SECTION_ORDER = list(IMPLEMENTATION_STATUS.keys())[1:] + [NO_ACTIVE_DEV]
+FIRST_OF_SECTION_SUFFIX = ',"first_of_section":true}'
+
+
+class FeatureListSnapshot(ndb.Model):
+  """Singleton holding the current version of the feature list."""
+  version = ndb.IntegerProperty(default=0)
+  updated = ndb.DateTimeProperty(auto_now=True)
+
+
+class FeatureListRow(ndb.Model):
+  """One feature's entry in the feature list, keyed by feature ID."""
+  section = ndb.IntegerProperty(indexed=False)
+  name = ndb.StringProperty(indexed=False)
+  unlisted = ndb.BooleanProperty(indexed=False)
+  feature_json = ndb.TextProperty()
+
+
+class Snapshot(object):
+  """The serialized feature list for one version and variant."""
+
+  def __init__(self, version: int, variant: str, gzipped_body: bytes):
+    self.version = version
+    self.variant = variant
+    self.gzipped_body = gzipped_body
+
+  @property
+  def etag(self) -> str:
+    """Return the unquoted entity tag of this snapshot."""
+    return '%s-%s' % (self.version, self.variant)
+
+  @property
+  def body(self) -> bytes:
+    return gzip.decompress(self.gzipped_body)
+
+
+def make_row(
+    fe: FeatureEntry, stages: Iterable[Stage]) -> Optional[FeatureListRow]:
+  """Return an unsaved row for fe, or None if it is not listed at all."""
+  if (fe.feature_type == FEATURE_TYPE_ENTERPRISE_ID or
+      fe.impl_status_chrome not in IMPLEMENTATION_STATUS):
+    return None
+  stages = [s for s in stages if not s.archived]
+  feature_dict = converters.feature_entry_to_json_basic(fe, stages)
+  return FeatureListRow(
+      id=fe.key.integer_id(),
+      section=SECTION_ORDER.index(fe.impl_status_chrome),
+      name=fe.name,
+      unlisted=bool(fe.unlisted),
+      feature_json=json.dumps(feature_dict, separators=(',', ':')))
+
+
+def is_same_row(row: FeatureListRow, existing: FeatureListRow) -> bool:
+  return (
+      row.section == existing.section and
+      row.name == existing.name and
+      row.unlisted == existing.unlisted and
+      row.feature_json == existing.feature_json)
+
+
+@ndb.transactional(retries=4)
+def _bump_version() -> int:
+  snapshot = FeatureListSnapshot.get_by_id(SNAPSHOT_ID)
+  if not snapshot:
+    snapshot = FeatureListSnapshot(id=SNAPSHOT_ID)
+  snapshot.version += 1
+  snapshot.put()
+  return snapshot.version
+
+
+def update_feature(
+    feature_id: int, fe: Optional[FeatureEntry],
+    stages: Iterable[Stage]) -> None:
+  """Patch the row of one feature and bump the version if it changed."""
+  existing = FeatureListRow.get_by_id(feature_id)
+  row = make_row(fe, stages) if fe else None
+  if row is None:
+    if not existing:
+      return
+    existing.key.delete()
+  elif existing and is_same_row(row, existing):
+    return
+  else:
+    row.put()
+  _bump_version()
+
+
+def rebuild_all() -> int:
+  """Rewrite every row from scratch and return the number of rows."""
+  stages_by_fid: dict[int, list[Stage]] = {}
+  for stage in Stage.query().fetch():
+    stages_by_fid.setdefault(stage.feature_id, []).append(stage)
+  rows = []
+  for fe in FeatureEntry.query().fetch():
+    row = make_row(fe, stages_by_fid.get(fe.key.integer_id(), []))
+    if row:
+      rows.append(row)
+  row_keys = {row.key for row in rows}
+  stale_keys = [
+      key for key in FeatureListRow.query().fetch(keys_only=True)
+      if key not in row_keys]
+  ndb.put_multi(rows)
+  ndb.delete_multi(stale_keys)
+  _bump_version()
+  return len(rows)
+
+
+def _serialize(rows: list[FeatureListRow], variant: str) -> bytes:
+  """Join the rows' JSON into one list ordered by section and name."""
+  rows = sorted(rows, key=lambda r: (r.section, r.name or '', r.key.id()))
+  parts = []
+  prev_section = None
+  for row in rows:
+    first_of_section = row.section != prev_section
+    prev_section = row.section
+    if variant == VARIANT_LISTED and row.unlisted:
+      continue
+    if first_of_section:
+      parts.append(row.feature_json[:-1] + FIRST_OF_SECTION_SUFFIX)
+    else:
+      parts.append(row.feature_json)
+  return ('[' + ','.join(parts) + ']').encode()
+
+
+def get_snapshot(show_unlisted: bool=False) -> Snapshot:
+  """Return the current feature list, building it if it is not cached."""
+  variant = VARIANT_ALL if show_unlisted else VARIANT_LISTED
+  current = FeatureListSnapshot.get_by_id(SNAPSHOT_ID)
+  if not current:
+    logging.info('Building feature list rows for the first time')
+    rebuild_all()
+    current = FeatureListSnapshot.get_by_id(SNAPSHOT_ID)
+
+  cache_key = '%s|%s|%s' % (SNAPSHOT_CACHE_KEY, current.version, variant)
+  gzipped_body = rediscache.get(cache_key)
+  if gzipped_body is None:
+    logging.info('Serializing feature list version %r', current.version)
+    body = _serialize(FeatureListRow.query().fetch(), variant)
+    gzipped_body = gzip.compress(body, mtime=0)
+    rediscache.set(cache_key, gzipped_body)
+
+  return Snapshot(current.version, variant, gzipped_body)
@@ -0,0 +1,96 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import testing_config  # Must be imported before the module under test.
+
+from framework import rediscache
+from internals.core_enums import *
+from internals.core_models import FeatureEntry, MilestoneSet, Stage
+from internals import feature_snapshot
+from internals.feature_snapshot import FeatureListRow, FeatureListSnapshot
+
+
+class FeatureSnapshotTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.feature_1 = FeatureEntry(
+        name='feature b', summary='sum', category=1,
+        impl_status_chrome=ENABLED_BY_DEFAULT)
+    self.feature_1.put()
+    self.feature_2 = FeatureEntry(
+        name='feature a', summary='sum', category=1, unlisted=True,
+        impl_status_chrome=ENABLED_BY_DEFAULT)
+    self.feature_2.put()
+    self.feature_3 = FeatureEntry(
+        name='feature c', summary='sum', category=1,
+        impl_status_chrome=NO_ACTIVE_DEV)
+    self.feature_3.put()
+    self.feature_4 = FeatureEntry(
+        name='feature d', summary='sum', category=1,
+        impl_status_chrome=ENABLED_BY_DEFAULT,
+        feature_type=FEATURE_TYPE_ENTERPRISE_ID)
+    self.feature_4.put()
+
+  def tearDown(self):
+    for kind in [FeatureEntry, Stage, FeatureListRow, FeatureListSnapshot]:
+      for entity in kind.query():
+        entity.key.delete()
+    rediscache.flushall()
+
+  def get_names(self, show_unlisted):
+    snapshot = feature_snapshot.get_snapshot(show_unlisted=show_unlisted)
+    features = json.loads(snapshot.body)
+    return [(f['name'], f.get('first_of_section', False)) for f in features]
+
+  def test_get_snapshot__all(self):
+    """Features are grouped by status, with no active development last."""
+    self.assertEqual(
+        [('feature a', True), ('feature b', False), ('feature c', True)],
+        self.get_names(True))
+
+  def test_get_snapshot__listed(self):
+    """Unlisted features are left out, along with their section marker."""
+    self.assertEqual(
+        [('feature b', False), ('feature c', True)],
+        self.get_names(False))
+
+  def test_update_feature__stage_put(self):
+    """Putting a stage patches that feature's row and bumps the version."""
+    before = feature_snapshot.get_snapshot()
+    Stage(feature_id=self.feature_1.key.integer_id(),
+          stage_type=STAGE_BLINK_SHIPPING,
+          milestones=MilestoneSet(desktop_first=120)).put()
+
+    after = feature_snapshot.get_snapshot()
+    self.assertNotEqual(before.etag, after.etag)
+    features = json.loads(after.body)
+    self.assertEqual(120, features[0]['milestone'])
+
+  def test_update_feature__unchanged(self):
+    """Writing a feature without changes keeps the same version."""
+    before = feature_snapshot.get_snapshot()
+    feature_snapshot.update_feature(
+        self.feature_1.key.integer_id(), self.feature_1, [])
+
+    self.assertEqual(before.etag, feature_snapshot.get_snapshot().etag)
+
+  def test_update_feature__deleted(self):
+    """Deleting a feature entry removes its row."""
+    self.feature_3.key.delete()
+
+    self.assertEqual(
+        [('feature a', True), ('feature b', False)],
+        self.get_names(True))
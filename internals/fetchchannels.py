@@ -13,13 +13,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from concurrent import futures
 import json
 import logging
+import threading
+import time
+from typing import Any, Optional
+
 import requests
 
 from framework import rediscache
 # Note: this file cannot import core_models because it would be circular.
 
+OMAHA_CACHE_KEY = 'omaha_data'
+CHANNELS = ['stable', 'beta', 'dev']
+FETCH_TIMEOUT = 10  # seconds
+# Cached versions are refreshed in the background once they are this old.
+REFRESH_AFTER = 60 * 60  # 1 hour
+# If refreshes keep failing, the last versions are served for this long.
+CACHE_TIME = 7 * 24 * 60 * 60  # 1 week
+UNKNOWN_VERSION = '0.0'
+
 OMAHA_URL_TEMPLATE = (
     'https://versionhistory.googleapis.com'
     '/v1/chrome/platforms/win/channels/%s/versions/?pageSize=1')
@@ -37,31 +51,110 @@ OMAHA_URL_TEMPLATE = (
 # We really only need the version string.
 
 
-def get_channel_version(channel):
-  """Return the version string that is live on the given channel."""
+def get_channel_version(channel: str) -> Optional[str]:
+  """Return the version string that is live on the given channel, or None."""
   url = OMAHA_URL_TEMPLATE % channel
   logging.info('fetching %s' % url)
-  result = requests.get(url)
+  try:
+    result = requests.get(url, timeout=FETCH_TIMEOUT)
+  except requests.exceptions.RequestException:
+    logging.exception('Could not fetch channel info for %s', channel)
+    return None
   if result.status_code != 200:
     logging.info('Could not fetch channel info for %s', channel)
-    return '0.0'
-  channel_info = json.loads(result.content)
-  logging.info('channel_info is %r', channel_info)
-  version = channel_info['versions'][0]['version']
-  return version
-
-
-def get_omaha_data():
-  omaha_data = rediscache.get('omaha_data')
-
-  if omaha_data is None:
-    win_versions = [
-        {'channel': 'stable', 'version': get_channel_version('stable')},
-        {'channel': 'beta', 'version': get_channel_version('beta')},
-        {'channel': 'dev', 'version': get_channel_version('dev')},
-        ]
-    omaha_info = [{'versions': win_versions}]
-    omaha_data = json.dumps(omaha_info)
-    rediscache.set('omaha_data', omaha_data, time=86400) # cache for 24hrs.
-
-  return json.loads(omaha_data)
+    return None
+  try:
+    channel_info = json.loads(result.content)
+    logging.info('channel_info is %r', channel_info)
+    return channel_info['versions'][0]['version']
+  except (ValueError, KeyError, IndexError):
+    logging.exception('Could not parse channel info for %s', channel)
+    return None
+
+
+# The entry most recently read from or written to redis by this instance,
+# which is served if redis does not have it.
+_last_entry: Optional[dict[str, Any]] = None
+_refresh_lock = threading.Lock()
+_refreshing = False
+
+
+def _get_cached_entry() -> Optional[dict[str, Any]]:
+  """Return {'fetched': timestamp, 'versions': {channel: version}}."""
+  global _last_entry
+  entry = rediscache.get(OMAHA_CACHE_KEY)
+  if entry is None:
+    return _last_entry
+  _last_entry = entry
+  return entry
+
+
+def refresh() -> Optional[dict[str, Any]]:
+  """Fetch all channel versions concurrently and cache them.
+
+  A channel that cannot be fetched keeps its previous version.  Returns
+  the new entry, or None if nothing could be fetched.
+  """
+  global _last_entry
+  with futures.ThreadPoolExecutor(max_workers=len(CHANNELS)) as executor:
+    fetched = dict(zip(CHANNELS, executor.map(get_channel_version, CHANNELS)))
+  if not any(fetched.values()):
+    logging.warning('Could not fetch any channel versions')
+    return None
+
+  previous = _get_cached_entry()
+  previous_versions = previous['versions'] if previous else {}
+  versions = {
+      channel: (fetched[channel] or previous_versions.get(channel) or
+                UNKNOWN_VERSION)
+      for channel in CHANNELS}
+  entry = {'fetched': time.time(), 'versions': versions}
+  rediscache.set(OMAHA_CACHE_KEY, entry, time=CACHE_TIME)
+  _last_entry = entry
+  return entry
+
+
+def _refresh_in_background() -> None:
+  """Start a refresh unless this instance is already doing one."""
+  global _refreshing
+  with _refresh_lock:
+    if _refreshing:
+      return
+    _refreshing = True
+
+  def run():
+    global _refreshing
+    try:
+      refresh()
+    except Exception:
+      logging.exception('Could not refresh channel versions')
+    finally:
+      with _refresh_lock:
+        _refreshing = False
+
+  threading.Thread(target=run, daemon=True).start()
+
+
+def get_omaha_data() -> list[dict[str, Any]]:
+  """Return the version on each channel, in the format of omahaproxy.
+
+  Only the first request after a cold start waits for the versions to be
+  fetched.  After that, cached versions are returned right away, and
+  versions that are getting old are refreshed in the background.  If a
+  refresh fails, the previous versions continue to be served.
+  """
+  entry = _get_cached_entry()
+  if entry is None:
+    entry = refresh()
+    if entry is None:
+      # Nothing has ever been fetched, so there is nothing stale to serve.
+      entry = {
+          'fetched': 0,
+          'versions': {channel: UNKNOWN_VERSION for channel in CHANNELS}}
+  elif time.time() - entry['fetched'] > REFRESH_AFTER:
+    _refresh_in_background()
+
+  win_versions = [
+      {'channel': channel, 'version': entry['versions'][channel]}
+      for channel in CHANNELS]
+  return [{'versions': win_versions}]
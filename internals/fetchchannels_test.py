@@ -0,0 +1,120 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+import json
+import time
+from unittest import mock
+
+import requests
+
+from framework import rediscache
+from internals import fetchchannels
+
+VERSIONS = {'stable': '120.0.1', 'beta': '121.0.2', 'dev': '122.0.3'}
+
+
+def omaha_data(versions):
+  return [{'versions': [
+      {'channel': channel, 'version': versions[channel]}
+      for channel in fetchchannels.CHANNELS]}]
+
+
+class FetchChannelsTest(testing_config.CustomTestCase):
+
+  def tearDown(self):
+    rediscache.flushall()
+    fetchchannels._last_entry = None
+
+  @mock.patch('requests.get')
+  def test_get_channel_version(self, mock_get):
+    """We parse the version, and return None on any failure."""
+    mock_get.return_value = testing_config.Blank(
+        status_code=200,
+        content=json.dumps({'versions': [{'version': '120.0.1'}]}))
+    self.assertEqual('120.0.1', fetchchannels.get_channel_version('stable'))
+    self.assertEqual(
+        fetchchannels.FETCH_TIMEOUT, mock_get.call_args.kwargs['timeout'])
+
+    mock_get.return_value = testing_config.Blank(status_code=500, content='')
+    self.assertIsNone(fetchchannels.get_channel_version('stable'))
+
+    mock_get.return_value = testing_config.Blank(
+        status_code=200, content='{"versions": []}')
+    self.assertIsNone(fetchchannels.get_channel_version('stable'))
+
+    mock_get.side_effect = requests.exceptions.Timeout()
+    self.assertIsNone(fetchchannels.get_channel_version('stable'))
+
+  @mock.patch('internals.fetchchannels.get_channel_version')
+  def test_get_omaha_data__cold(self, mock_gcv):
+    """The first request fetches all channels and caches them."""
+    mock_gcv.side_effect = VERSIONS.get
+    self.assertEqual(omaha_data(VERSIONS), fetchchannels.get_omaha_data())
+    self.assertEqual(3, mock_gcv.call_count)
+
+    self.assertEqual(omaha_data(VERSIONS), fetchchannels.get_omaha_data())
+    self.assertEqual(3, mock_gcv.call_count)
+
+  @mock.patch('internals.fetchchannels.get_channel_version')
+  def test_get_omaha_data__cold_failure(self, mock_gcv):
+    """If nothing was ever fetched, we return unknown versions."""
+    mock_gcv.return_value = None
+    unknown = {channel: '0.0' for channel in fetchchannels.CHANNELS}
+    self.assertEqual(omaha_data(unknown), fetchchannels.get_omaha_data())
+    self.assertIsNone(rediscache.get(fetchchannels.OMAHA_CACHE_KEY))
+
+  @mock.patch('internals.fetchchannels._refresh_in_background')
+  @mock.patch('internals.fetchchannels.get_channel_version')
+  def test_get_omaha_data__stale(self, mock_gcv, mock_refresh):
+    """Old versions are served while they are refreshed in the background."""
+    old_versions = {'stable': '119.0.1', 'beta': '120.0.2', 'dev': '121.0.3'}
+    rediscache.set(
+        fetchchannels.OMAHA_CACHE_KEY,
+        {'fetched': time.time() - fetchchannels.REFRESH_AFTER - 1,
+         'versions': old_versions})
+    self.assertEqual(omaha_data(old_versions), fetchchannels.get_omaha_data())
+    mock_refresh.assert_called_once_with()
+    mock_gcv.assert_not_called()
+
+  @mock.patch('internals.fetchchannels.get_channel_version')
+  def test_refresh__partial_failure(self, mock_gcv):
+    """A channel that cannot be fetched keeps its previous version."""
+    old_versions = {'stable': '119.0.1', 'beta': '120.0.2', 'dev': '121.0.3'}
+    rediscache.set(
+        fetchchannels.OMAHA_CACHE_KEY,
+        {'fetched': 0, 'versions': old_versions})
+    mock_gcv.side_effect = lambda channel: (
+        None if channel == 'dev' else VERSIONS[channel])
+    entry = fetchchannels.refresh()
+    self.assertEqual(
+        {'stable': '120.0.1', 'beta': '121.0.2', 'dev': '121.0.3'},
+        entry['versions'])
+
+    mock_gcv.side_effect = None
+    mock_gcv.return_value = None
+    self.assertIsNone(fetchchannels.refresh())
+    self.assertEqual(
+        entry, rediscache.get(fetchchannels.OMAHA_CACHE_KEY))
+
+  @mock.patch('internals.fetchchannels.get_channel_version')
+  def test_get_omaha_data__redis_unavailable(self, mock_gcv):
+    """The last versions seen by this instance are served if redis lost them."""
+    mock_gcv.side_effect = VERSIONS.get
+    fetchchannels.get_omaha_data()
+    rediscache.flushall()
+    mock_gcv.side_effect = None
+    mock_gcv.return_value = None
+    self.assertEqual(omaha_data(VERSIONS), fetchchannels.get_omaha_data())
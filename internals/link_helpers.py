@@ -17,18 +17,29 @@ import re
 import requests
 import json
 import logging
+import threading
+import time
+from concurrent import futures
+from contextlib import contextmanager
 from typing import Any, Optional
+from fastcore.net import urlread, urlrequest
+from fastcore.xtras import dict2obj
 from ghapi.core import GhApi
+from google.cloud import ndb  # type: ignore
 from urllib.error import HTTPError
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
 import base64
-import validators
+import functools
+import hashlib
 import html
+import ipaddress
 from framework import secrets
 
 
-github_crediential = None
-github_api_client = None
+github_credential = None
+# GhApi keeps the headers of its last response on the client object, so
+# each thread uses its own client for the shared credential.
+github_clients = threading.local()
 
 LINK_TYPE_CHROMIUM_BUG = 'chromium_bug'
 LINK_TYPE_GITHUB_ISSUE = 'github_issue'
@@ -40,6 +51,11 @@ LINK_TYPE_MOZILLA_BUG = 'mozilla_bug'
 LINK_TYPE_WEBKIT_BUG = 'webkit_bug'
 LINK_TYPE_SPECS = 'specs'
 LINK_TYPE_WEB = 'web'
+GITHUB_LINK_TYPES = (
+    LINK_TYPE_GITHUB_ISSUE,
+    LINK_TYPE_GITHUB_MARKDOWN,
+    LINK_TYPE_GITHUB_PULL_REQUEST,
+)
 LINK_TYPES_REGEX = {
     # https://bugs.chromium.org/p/chromium/issues/detail?id=
     # https://crbug.com/
@@ -76,34 +92,258 @@ WEBKIT_REVIEW_URL_PATTERN = re.compile(
   r'github.com/WebKit/standards-positions/', re.IGNORECASE
 )
 
+# One regex that tries each of the LINK_TYPES_REGEX patterns in order.
+LINK_TYPE_COMBINED_REGEX = re.compile('|'.join(
+    f'(?P<{link_type}>{regex.pattern})'
+    for link_type, regex in LINK_TYPES_REGEX.items()))
+
 URL_REGEX = re.compile(r'(https?://\S+)')
+# punctuation similar to string.punctuation except that it does not include "/"
+# this keep url ending with "/"
+URL_TRAILING_PUNCTUATION = r"""!"#$%&'()*+,-.:;<=>?@[\]^_`{|}~"""
+# A structural check of the url that stands in for validators.url(public=True).
+PUBLIC_URL_REGEX = re.compile(
+    r'https?://'
+    r'(?:[^\s/?#@]+@)?'  # Optional user:password@
+    r'(?P<host>'
+    r'(?:[^\W_](?:[\w-]{0,61}[^\W_])?\.)+(?:[^\W\d_]{2,63}|xn--[a-z0-9-]{1,59})'
+    r'|\d{1,3}(?:\.\d{1,3}){3}'
+    r'|\[[0-9a-f:.]+\])'
+    r'\.?(?::\d{1,5})?'
+    r'(?:[/?#]\S*)?',
+    re.IGNORECASE)
 
 TIMEOUT = 30  # We wait at most 30 seconds for each web page request.
 
+# Limits used by LinkFetcher when many links are parsed in one batch.
+MAX_FETCH_WORKERS = 10
+BATCH_DEADLINE = 8 * 60  # Seconds, leaving headroom under the 10 min task limit.
+GITHUB_API_HOST = 'api.github.com'
+# Host -> (max concurrent requests, min seconds between request starts).
+DEFAULT_HOST_LIMITS = (4, 0.1)
+HOST_LIMITS = {
+    # Be gentle with the GitHub API so that we don't burn through our quota.
+    GITHUB_API_HOST: (2, 0.5),
+}
+
+
+class NotModified(Exception):
+  """The linked resource has not changed since we last fetched it."""
+
 
-def valid_url(url):
-  try:
-    return validators.url(url, public=True)
-  except:
+def _get_header(headers, name: str) -> str | None:
+  """Read a response header regardless of the case used by the server."""
+  if not headers:
+    return None
+  for key, value in headers.items():
+    if key.lower() == name.lower():
+      return value
+  return None
+
+
+@functools.lru_cache(maxsize=10000)
+def valid_url(url: str) -> bool:
+  """Return True if url looks like a well-formed url on the public internet."""
+  match = PUBLIC_URL_REGEX.fullmatch(url)
+  if not match:
     return False
+  host = match.group('host').strip('[]')
+  if host[0].isdigit() or ':' in host:
+    try:
+      address = ipaddress.ip_address(host)
+    except ValueError:
+      # Dotted numbers that are not an IP address, e.g., 999.1.1.1.
+      return not host.replace('.', '').isdigit()
+    return address.is_global
+  return True
+
+
+# Digest of a string value -> the valid urls in it.  Keying by digest
+# keeps long field values from being held in memory by the cache.
+_urls_by_digest: dict[bytes, tuple[str, ...]] = {}
+URLS_CACHE_SIZE = 10000
+
+
+def _extract_urls_from_str(value: str) -> tuple[str, ...]:
+  """Extract the valid urls from a string, memoized by its digest."""
+  digest = hashlib.sha1(value.encode('utf-8', 'surrogatepass')).digest()
+  cached = _urls_by_digest.get(digest)
+  if cached is not None:
+    return cached
+
+  # remove trailing punctuation
+  urls = [
+      url.rstrip(URL_TRAILING_PUNCTUATION)
+      for url in URL_REGEX.findall(value)]
+  result = tuple(url for url in urls if valid_url(url))
+  if len(_urls_by_digest) >= URLS_CACHE_SIZE:
+    _urls_by_digest.clear()
+  _urls_by_digest[digest] = result
+  return result
+
+
+class TimeoutGhApi(GhApi):
+  """A GhApi client whose requests give up after TIMEOUT seconds.
+
+  GhApi sends its requests with no timeout, so a stalled response would
+  hold a LinkFetcher worker, and the batch waiting on it, indefinitely.
+  This is GhApi.__call__ with a timeout passed to urlread.
+  """
+
+  def __call__(
+      self, path: str, verb: Optional[str] = None,
+      headers: Optional[dict] = None, route: Optional[dict] = None,
+      query: Optional[dict] = None, data=None):
+    if verb is None:
+      verb = 'POST' if data else 'GET'
+    headers = {**self.headers, **(headers or {})}
+    if not path.startswith(('http://', 'https://')):
+      path = self.gh_host + path
+    if route:
+      route = {k: quote(str(v)) for k, v in route.items()}
+    return_json = 'json' in headers['Accept']
+    request = urlrequest(
+        path, verb, headers=headers, route=route or None,
+        query=query or None, data=data or None)
+    result, self.recv_hdrs = urlread(
+        request, return_json=return_json, return_headers=True,
+        timeout=TIMEOUT)
+    return dict2obj(result) if return_json else result
 
 
 def get_github_api_client():
-  """Set up the GitHub client."""
+  """Set up the GitHub client for this thread."""
   global github_credential
-  global github_api_client
-  if github_api_client is None:
-    github_credential = secrets.ApiCredential.get_github_credendial()
-    github_api_client = GhApi(token=github_credential.token)
+  credential = github_credential
+  if credential is None:
+    credential = secrets.ApiCredential.get_github_credendial()
+    github_credential = credential
+  if getattr(github_clients, 'credential', None) is not credential:
+    github_clients.client = TimeoutGhApi(token=credential.token)
+    github_clients.credential = credential
 
-  return github_api_client
+  return github_clients.client
 
 
 def rotate_github_client():
   """Try a different github client, e.g., after quota is used up."""
-  global github_api_client
-  github_credential.record_failure()
-  github_api_client = None  # A new one will be selected on when needed.
+  global github_credential
+  if github_credential:
+    github_credential.record_failure()
+  github_credential = None  # A new one will be selected on when needed.
+
+
+class HostThrottle():
+  """Limit the concurrency and request rate for a single host."""
+
+  def __init__(self, max_concurrent: int, min_interval: float):
+    self.semaphore = threading.BoundedSemaphore(max_concurrent)
+    self.min_interval = min_interval
+    self.lock = threading.Lock()
+    self.next_start = 0.0
+
+  @contextmanager
+  def slot(self):
+    """Wait for a free slot and for our turn to start a request."""
+    with self.semaphore:
+      with self.lock:
+        now = time.monotonic()
+        wait = self.next_start - now
+        self.next_start = max(now, self.next_start) + self.min_interval
+      if wait > 0:
+        time.sleep(wait)
+      yield
+
+
+class LinkFetcher():
+  """Parse many links concurrently with pooled, per-host throttled requests."""
+
+  def __init__(
+      self, max_workers: int = MAX_FETCH_WORKERS,
+      deadline: float = BATCH_DEADLINE):
+    self.max_workers = max_workers
+    self.deadline = deadline
+    self.lock = threading.Lock()
+    self.sessions: dict[str, requests.Session] = {}
+    self.throttles: dict[str, HostThrottle] = {}
+
+  def _get_throttle(self, host: str) -> HostThrottle:
+    with self.lock:
+      if host not in self.throttles:
+        max_concurrent, min_interval = HOST_LIMITS.get(
+            host, DEFAULT_HOST_LIMITS)
+        self.throttles[host] = HostThrottle(max_concurrent, min_interval)
+      return self.throttles[host]
+
+  def _get_session(self, host: str) -> requests.Session:
+    """Return a session that keeps a connection pool open to host."""
+    with self.lock:
+      if host not in self.sessions:
+        max_concurrent, _ = HOST_LIMITS.get(host, DEFAULT_HOST_LIMITS)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=max_concurrent)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        self.sessions[host] = session
+      return self.sessions[host]
+
+  @contextmanager
+  def host_slot(self, host: str):
+    """Hold one of the request slots for host, e.g., around a GitHub call."""
+    with self._get_throttle(host).slot():
+      yield
+
+  def get(self, url: str, **kwargs) -> requests.Response:
+    """Fetch url using the pooled session for its host."""
+    host = urlparse(url).netloc
+    with self.host_slot(host):
+      return self._get_session(host).get(url, timeout=TIMEOUT, **kwargs)
+
+  def parse_all(self, links: list['Link']) -> list['Link']:
+    """Parse the given links concurrently and return the ones that finished.
+
+    Links that are still pending when the batch deadline passes are left
+    unparsed so that the caller can skip them and retry them later.
+    """
+    if not links:
+      return []
+    if any(link.type in GITHUB_LINK_TYPES for link in links):
+      # Select the credential once rather than once per thread.
+      get_github_api_client()
+    context = ndb.get_context(raise_context_error=False)
+
+    def parse_one(link: Link) -> Link:
+      if context:
+        # NDB contexts are per-thread, but rotate_github_client() writes.
+        with context.client.context():
+          link.parse(fetcher=self)
+      else:
+        link.parse(fetcher=self)
+      return link
+
+    executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+    try:
+      pending = [executor.submit(parse_one, link) for link in links]
+      futures.wait(pending, timeout=self.deadline)
+    finally:
+      # Links that have not started are cancelled, but the ones in progress
+      # are still using our sessions, so wait for them before closing.
+      # Every fetch has a timeout, so this wait is bounded.
+      executor.shutdown(wait=True, cancel_futures=True)
+      self.close()
+    finished = [f.result() for f in pending if not f.cancelled()]
+    if len(finished) < len(links):
+      logging.warning(
+          f'Batch deadline passed with {len(links) - len(finished)} '
+          'links unparsed')
+    return finished
+
+  def close(self) -> None:
+    with self.lock:
+      for session in self.sessions.values():
+        session.close()
+      self.sessions = {}
 
 
 class Link():
@@ -112,13 +352,9 @@ class Link():
   def extract_urls_from_value(cls, value: Any) -> list[str]:
     """Extract the urls from the given value."""
     if isinstance(value, str):
-      urls = URL_REGEX.findall(value)
-
-      # remove trailing punctuation
-      # punctuation similar to string.punctuation except that it does not include "/"
-      # this keep url ending with "/"
-      punctuation = r"""!"#$%&'()*+,-.:;<=>?@[\]^_`{|}~"""
-      urls = [url.rstrip(punctuation) for url in urls]
+      if '://' not in value:
+        return []
+      return list(_extract_urls_from_str(value))
     elif isinstance(value, list):
       urls = [url for url in value if isinstance(url, str) and URL_REGEX.match(url)]
     else:
@@ -128,30 +364,88 @@ class Link():
   @classmethod
   def get_type(cls, link: str) -> str | None:
     """Return Link_Type if the given link is valid. Otherwise, return None."""
-    for link_type, regex in LINK_TYPES_REGEX.items():
-      if regex.match(link):
-        return link_type
-    return None
-
-  def __init__(self, url: str):
+    match = LINK_TYPE_COMBINED_REGEX.match(link)
+    if not match:
+      return None
+    return match.lastgroup
+
+  def __init__(
+      self, url: str, etag: str | None = None,
+      last_modified: str | None = None):
     self.url = url
     self.type = Link.get_type(url)
     self.is_parsed = False
     self.is_error = False
     self.http_error_code: Optional[int] = None
-    self.information = None
+    self.information: Optional[dict[str, Any]] = None
+    # Validators from the previous fetch, updated when we fetch again.
+    self.etag = etag
+    self.last_modified = last_modified
+    self.not_modified = False
+    self._fetcher: Optional[LinkFetcher] = None
+    self._response: Optional[requests.Response] = None
     logging.info(f'Constructed Link for {url} with type {self.type}')
 
+  def _get(self, url: str, **kwargs) -> requests.Response:
+    """Fetch url, through the LinkFetcher if we are part of a batch."""
+    if self._fetcher:
+      return self._fetcher.get(url, **kwargs)
+    return requests.get(url, timeout=TIMEOUT, **kwargs)
+
+  def _conditional_headers(self) -> dict[str, str]:
+    """Return headers that make a request conditional on a change."""
+    headers = {}
+    if self.etag:
+      headers['If-None-Match'] = self.etag
+    if self.last_modified:
+      headers['If-Modified-Since'] = self.last_modified
+    return headers
+
+  def _record_validators(self, headers) -> None:
+    """Remember the validators of a fresh response for next time."""
+    self.etag = _get_header(headers, 'ETag')
+    self.last_modified = _get_header(headers, 'Last-Modified')
+
+  def _call_github(self, endpoint_name: str, conditional=False, **kwargs):
+    """Call a GitHub API endpoint such as 'issues.get'.
+
+    If conditional is True, we send our validators so that GitHub can answer
+    304 without counting the request against our quota.
+    """
+    client = get_github_api_client()
+    group, verb = endpoint_name.split('.')
+    endpoint = getattr(getattr(client, group), verb)
+    headers = self._conditional_headers() if conditional else {}
+    with self._github_slot():
+      try:
+        resp = endpoint(headers=headers, **kwargs)
+      except HTTPError as e:
+        if e.code == 304:
+          raise NotModified()
+        raise e
+    if conditional:
+      # No other thread uses this client, so these headers are our own.
+      self._record_validators(getattr(client, 'recv_hdrs', None))
+    return resp
+
+  @contextmanager
+  def _github_slot(self):
+    """Apply the GitHub API rate limits if we are part of a batch."""
+    if self._fetcher:
+      with self._fetcher.host_slot(GITHUB_API_HOST):
+        yield
+    else:
+      yield
+
   def _fetch_github_file(
           self, owner: str, repo: str, ref: str, file_path: str,
           retries=1):
     """Get a file from GitHub."""
-    client = get_github_api_client()
     try:
       # try to get the branch information, if it exists, update branch name
       # this handles the case where the branch is renamed.
-      branch_information = client.repos.get_branch(
-          owner=owner, repo=repo, branch=ref)
+      branch_information = self._call_github(
+          'repos.get_branch', owner=owner, repo=repo, branch=ref)
       ref = branch_information.name
     except HTTPError as e:
       # if the branch does not exist, then it is probably a commit hash
@@ -159,7 +453,8 @@ class Link():
         raise e
 
     try:
-      information = client.repos.get_content(
+      information = self._call_github(
+          'repos.get_content', conditional=True,
           owner=owner, repo=repo, path=file_path, ref=ref)
       return information
     except HTTPError as e:
@@ -195,8 +490,9 @@ class Link():
           retries=1) -> dict[str, Any]:
     """Get an issue from GitHub."""
     try:
-      client = get_github_api_client()
-      resp = client.issues.get(owner=owner, repo=repo, issue_number=issue_id)
+      resp = self._call_github(
+          'issues.get', conditional=True,
+          owner=owner, repo=repo, issue_number=issue_id)
       return resp
     except HTTPError as e:
       logging.info(f'Got http response code {e.code}')
@@ -285,7 +581,8 @@ class Link():
     return information.get('issue', None)
 
   def _parse_html_head(self):
-    response = requests.get(self.url, timeout=TIMEOUT)
+    # Reuse the response that _validate_url() already fetched.
+    response = self._response or self._get(self.url)
     # unescape html, e.g. &amp; -> &
     html_str = html.unescape(response.text)
 
@@ -304,22 +601,38 @@ class Link():
     """The `_validate_url` method is used to validate the URL associated with the Link object. It
     sends a GET request to the URL and checks the response status code. If the status code is not
     200 (OK), it sets the `is_error` flag to True and stores the HTTP error code. This method is
-    used to determine if the URL is accessible and valid."""
-    res = requests.get(self.url, allow_redirects=True, timeout=TIMEOUT)
+    used to determine if the URL is accessible and valid.
+
+    If the server answers 304 to our conditional request, we set
+    `not_modified` and there is nothing more to parse."""
+    res = self._get(
+        self.url, allow_redirects=True, headers=self._conditional_headers())
+    self._response = res
+    if res.status_code == 304:
+      self.not_modified = True
+      return False
     if res.status_code != 200:
       self.is_error = True
       self.http_error_code = res.status_code
       return False
+    self._record_validators(res.headers)
     return True
 
-  def parse(self):
-    """Parse the link and store the information."""
+  def parse(self, fetcher: Optional[LinkFetcher] = None):
+    """Parse the link and store the information.
+
+    If a fetcher is given, requests use its pooled sessions and host limits.
+    """
     # Flush logs because GAE instances killed for exceeding request time limit
     # may lose logging output that has not been flushed.
     logging.getLogger().handlers[0].flush()
+    self._fetcher = fetcher
 
     try:
-      if not self.type or not self._validate_url():
+      # GitHub links are validated by the API call that parses them, so
+      # there is no need to fetch the HTML page first.
+      if not self.type or (
+          self.type not in GITHUB_LINK_TYPES and not self._validate_url()):
         # if the link is not valid, return early
         self.is_parsed = True
         return
@@ -346,6 +659,9 @@ class Link():
         self.information = self._parse_html_head()
       elif self.type == LINK_TYPE_WEB:
         self.information = None
+    except NotModified:
+      logging.info(f'Link {self.url} was not modified')
+      self.not_modified = True
     except Exception as e:
       logging.error(f'Error parsing {self.type} {self.url}: {e}')
       self.error = e
@@ -353,4 +669,7 @@ class Link():
       if isinstance(e, HTTPError):
         self.http_error_code = e.code
       self.information = None
+    finally:
+      self._fetcher = None
+      self._response = None
     self.is_parsed = True
@@ -14,10 +14,16 @@
 # limitations under the License.
 
 import testing_config
+import threading
+import time
 from unittest import mock
 from unittest import skip
+from urllib.error import HTTPError
+from internals import link_helpers
 from internals.link_helpers import (
+    HostThrottle,
     Link,
+    LinkFetcher,
     LINK_TYPE_CHROMIUM_BUG,
     LINK_TYPE_GITHUB_ISSUE,
     LINK_TYPE_GITHUB_MARKDOWN,
@@ -26,6 +32,8 @@ from internals.link_helpers import (
     LINK_TYPE_GOOGLE_DOCS,
     LINK_TYPE_MOZILLA_BUG,
     LINK_TYPE_SPECS,
+    LINK_TYPES_REGEX,
+    get_github_api_client,
     valid_url
 )
 
@@ -80,12 +88,19 @@ class LinkHelperTest(testing_config.CustomTestCase):
         'http://',
         'http://.',
         'https://invalid',
+        'https://...',
+        'http://localhost:8080/',
+        'http://127.0.0.1/',
+        'http://192.168.1.1/admin',
+        'ftp://www.google.com/',
     ]
     valid_urls = [
         'http://www.google.com/',
         'https://www.google.com/',
         'http://www.google.com',
         'https://www.google.com',
+        'https://user@www.google.com:8080/path?q=1#frag',
+        'http://8.8.8.8/',
     ]
     for url in invalid_urls:
       with self.subTest(url=url):
@@ -253,6 +268,221 @@ class LinkHelperTest(testing_config.CustomTestCase):
     self.assertEqual(link.is_error, True)
     self.assertEqual(link.information, None)
 
+  def test_get_type__matches_first_pattern(self):
+    """The combined regex picks the same type as trying each in order."""
+    urls = [
+        'https://crbug.com/1352598',
+        'https://github.com/GoogleChrome/chromium-dashboard/issues/999',
+        'https://github.com/GoogleChrome/chromium-dashboard/pull/3044',
+        'https://github.com/w3c/reporting/blob/master/EXPLAINER.md',
+        'https://developer.mozilla.org/en-US/docs/Web/HTML',
+        'https://docs.google.com/document/d/1-M_o-il38aW64Gyk4R23Yaxy1p2Uy7D0i6J5qTWzypU',
+        'https://bugzilla.mozilla.org/show_bug.cgi?id=1314686',
+        'https://bugs.webkit.org/show_bug.cgi?id=128456',
+        'https://dom.spec.whatwg.org/#validate',
+        'https://www.google.com/',
+        'ftp://www.google.com/',
+    ]
+    for url in urls:
+      with self.subTest(url=url):
+        expected = None
+        for link_type, regex in LINK_TYPES_REGEX.items():
+          if regex.match(url):
+            expected = link_type
+            break
+        self.assertEqual(expected, Link.get_type(url))
+
+  def test_extract_urls_from_value__list(self):
+    urls = Link.extract_urls_from_value(
+        ['https://www.google.com/', 'not a url', 'http://localhost/', 3])
+    self.assertEqual(['https://www.google.com/'], urls)
+
+  def test_extract_urls_from_value__cached_by_digest(self):
+    """Repeated values reuse the urls without keeping the value itself."""
+    value = 'see https://www.google.com/ ' + 'x' * 10000
+    with mock.patch.dict('internals.link_helpers._urls_by_digest', clear=True):
+      self.assertEqual(
+          ['https://www.google.com/'], Link.extract_urls_from_value(value))
+      with mock.patch('internals.link_helpers.valid_url') as mock_valid:
+        self.assertEqual(
+            ['https://www.google.com/'], Link.extract_urls_from_value(value))
+      mock_valid.assert_not_called()
+      self.assertEqual(
+          [20], [len(k) for k in link_helpers._urls_by_digest])
+
+  def test_extract_urls_from_value__no_urls(self):
+    self.assertEqual([], Link.extract_urls_from_value('just some text'))
+    self.assertEqual([], Link.extract_urls_from_value(None))
+    self.assertEqual([], Link.extract_urls_from_value(123))
+
   def test_extract_invalid_url(self):
     urls = Link.extract_urls_from_value('Some kind of https://... link.')
     self.assertEqual(len(urls), 0)
+
+
+class LinkFetcherTest(testing_config.CustomTestCase):
+
+  @mock.patch.object(LinkFetcher, 'get')
+  def test_parse_all__single_fetch_per_link(self, mock_get):
+    """Validation and parsing of a link share one request."""
+    mock_get.return_value = testing_config.Blank(
+        status_code=200, headers={'ETag': '"v1"'},
+        text='<title>A spec</title><meta name="description" content="D">')
+    links = [
+        Link('https://w3c.github.io/presentation-api/'),
+        Link('https://www.w3.org/TR/css-pseudo-4/'),
+    ]
+
+    actual = LinkFetcher().parse_all(links)
+
+    self.assertCountEqual(links, actual)
+    self.assertEqual(2, mock_get.call_count)
+    for link in links:
+      self.assertTrue(link.is_parsed)
+      self.assertFalse(link.is_error)
+      self.assertEqual('A spec', link.information['title'])
+      self.assertEqual('"v1"', link.etag)
+
+  @mock.patch.object(LinkFetcher, 'get')
+  def test_parse_all__http_error(self, mock_get):
+    """A failed fetch marks the link as an error."""
+    mock_get.return_value = testing_config.Blank(status_code=404, text='')
+    link = Link('https://www.w3.org/TR/missing/')
+
+    actual = LinkFetcher().parse_all([link])
+
+    self.assertEqual([link], actual)
+    self.assertTrue(link.is_error)
+    self.assertEqual(404, link.http_error_code)
+
+  @mock.patch.object(LinkFetcher, 'get')
+  def test_parse_all__deadline(self, mock_get):
+    """Links that have not started at the deadline are not returned."""
+    release = threading.Event()
+    def slow_get(url, **kwargs):
+      if 'slow' in url:
+        release.wait(5)
+      return testing_config.Blank(status_code=200, headers={}, text='')
+    mock_get.side_effect = slow_get
+    fast = Link('https://www.google.com/fast')
+    slow = Link('https://www.google.com/slow')
+    slow_2 = Link('https://www.google.com/slow/2')
+    queued = Link('https://www.google.com/queued')
+    fetcher = LinkFetcher(max_workers=2, deadline=0.5)
+    timer = threading.Timer(1.0, release.set)
+    timer.start()
+
+    with mock.patch.object(fetcher, 'close') as mock_close:
+      mock_close.side_effect = lambda: self.assertTrue(release.is_set())
+      actual = fetcher.parse_all([fast, slow, slow_2, queued])
+    timer.join()
+
+    # The links in progress at the deadline finished before shutdown.
+    self.assertEqual([fast, slow, slow_2], actual)
+    self.assertFalse(queued.is_parsed)
+    # The sessions were closed only after the slow fetches finished.
+    mock_close.assert_called_once()
+
+  @mock.patch.object(LinkFetcher, 'get')
+  def test_parse_all__not_modified(self, mock_get):
+    """A 304 response leaves the link unchanged and not in error."""
+    mock_get.return_value = testing_config.Blank(status_code=304, text='')
+    link = Link('https://www.w3.org/TR/css-pseudo-4/', etag='"v1"',
+                last_modified='Tue, 01 Oct 2024 00:00:00 GMT')
+
+    LinkFetcher().parse_all([link])
+
+    mock_get.assert_called_once_with(
+        'https://www.w3.org/TR/css-pseudo-4/', allow_redirects=True,
+        headers={
+            'If-None-Match': '"v1"',
+            'If-Modified-Since': 'Tue, 01 Oct 2024 00:00:00 GMT',
+        })
+    self.assertTrue(link.not_modified)
+    self.assertFalse(link.is_error)
+    self.assertIsNone(link.information)
+
+  def test_call_github__not_modified(self):
+    """A 304 from the GitHub API is reported as NotModified."""
+    client = mock.MagicMock()
+    client.issues.get.side_effect = HTTPError('url', 304, 'NM', {}, None)
+    link = Link('https://github.com/w3c/reporting/issues/1', etag='"v1"')
+
+    with mock.patch('internals.link_helpers.get_github_api_client',
+                    return_value=client):
+      link.parse()
+
+    client.issues.get.assert_called_once_with(
+        headers={'If-None-Match': '"v1"'},
+        owner='w3c', repo='reporting', issue_number=1)
+    self.assertTrue(link.not_modified)
+    self.assertFalse(link.is_error)
+
+  def test_call_github__records_validators(self):
+    """A fresh GitHub API response gives us validators for next time."""
+    client = mock.MagicMock()
+    client.issues.get.return_value = {'number': 1, 'labels': []}
+    client.recv_hdrs = {'ETag': 'W/"v2"', 'Last-Modified': 'yesterday'}
+    link = Link('https://github.com/w3c/reporting/issues/1')
+
+    with mock.patch('internals.link_helpers.get_github_api_client',
+                    return_value=client):
+      link.parse()
+
+    self.assertFalse(link.not_modified)
+    self.assertEqual(1, link.information['number'])
+    self.assertEqual('W/"v2"', link.etag)
+    self.assertEqual('yesterday', link.last_modified)
+
+  @mock.patch('internals.link_helpers.TimeoutGhApi')
+  @mock.patch('framework.secrets.ApiCredential.get_github_credendial')
+  def test_get_github_api_client__per_thread(self, mock_get_cred, mock_ghapi):
+    """Each thread has its own client, so response headers are not shared."""
+    mock_ghapi.side_effect = lambda token: mock.MagicMock()
+    with mock.patch('internals.link_helpers.github_credential', None):
+      main_client = get_github_api_client()
+      self.assertIs(main_client, get_github_api_client())
+      other_clients = []
+      thread = threading.Thread(
+          target=lambda: other_clients.append(get_github_api_client()))
+      thread.start()
+      thread.join()
+
+    mock_get_cred.assert_called_once()
+    self.assertIsNot(main_client, other_clients[0])
+
+  def test_parse_all__empty(self):
+    self.assertEqual([], LinkFetcher().parse_all([]))
+
+
+class HostThrottleTest(testing_config.CustomTestCase):
+
+  def test_slot__limits_concurrency(self):
+    """No more than max_concurrent callers hold a slot at once."""
+    throttle = HostThrottle(2, 0)
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+    def work():
+      with throttle.slot():
+        with lock:
+          active[0] += 1
+          peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+          active[0] -= 1
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    self.assertEqual(2, peak[0])
+
+  def test_slot__spaces_out_requests(self):
+    """Request starts are at least min_interval apart."""
+    throttle = HostThrottle(4, 0.05)
+    start = time.monotonic()
+    for _ in range(3):
+      with throttle.slot():
+        pass
+    self.assertGreaterEqual(time.monotonic() - start, 0.1)
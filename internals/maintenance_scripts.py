@@ -29,6 +29,8 @@ from internals.core_models import FeatureEntry, MilestoneSet, Stage
 from internals.review_models import Gate, Vote, Activity
 from internals.core_enums import *
 from internals.feature_links import batch_index_feature_entries
+from internals import feature_snapshot
+from internals import milestone_index
 from internals import stage_helpers
 import settings
 
@@ -804,3 +806,49 @@ class BackfillShippingYear(FlaskHandler):
 
     ndb.put_multi(batch)
     return f'{count} Features entities updated.'
+
+
+class BackfillMilestoneIndex(FlaskHandler):
+
+  def get_template_data(self, **kwargs) -> str:
+    """Rebuild the milestone index entity of every feature."""
+    self.require_cron_header()
+
+    stages_by_fid = stage_helpers.organize_all_stages_by_feature(
+        Stage.query().fetch())
+    existing_by_fid = {
+        index.key.integer_id(): index
+        for index in milestone_index.FeatureMilestoneIndex.query().fetch()}
+    count = 0
+    batch = []
+    BATCH_SIZE = 100
+    for fe in FeatureEntry.query().fetch():
+      fid = fe.key.integer_id()
+      index = milestone_index.make_index(fe, stages_by_fid.get(fid, []))
+      existing = existing_by_fid.pop(fid, None)
+      if milestone_index.is_same_index(index, existing):
+        continue
+      batch.append(index)
+      count += 1
+      if len(batch) > BATCH_SIZE:
+        ndb.put_multi(batch)
+        batch = []
+        logging.info('Updated %r so far', count)
+
+    ndb.put_multi(batch)
+    # Anything left over belongs to a feature that no longer exists.
+    ndb.delete_multi([index.key for index in existing_by_fid.values()])
+    return (f'{count} milestone index entities updated, '
+            f'{len(existing_by_fid)} deleted.')
+
+
+class RebuildFeatureListSnapshot(FlaskHandler):
+
+  def get_template_data(self, **kwargs) -> str:
+    """Rewrite every row of the /features.json snapshot.
+
+    Run this after changing the format of feature_entry_to_json_basic.
+    """
+    self.require_cron_header()
+    count = feature_snapshot.rebuild_all()
+    return f'{count} feature list rows written.'
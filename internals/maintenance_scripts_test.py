@@ -22,6 +22,7 @@ from api import converters
 from internals import maintenance_scripts
 from internals import core_enums
 from internals.core_models import FeatureEntry, Stage, MilestoneSet
+from internals.milestone_index import FeatureMilestoneIndex
 from internals.review_models import Gate, Vote
 import settings
 
@@ -794,3 +795,33 @@ class BackfillShippingYearTest(testing_config.CustomTestCase):
     actual = self.handler.calc_all_shipping_years()
     expected = {22222: 2023, 33333: 2024, 44444: 2030}
     self.assertEqual(expected, actual)
+
+
+class BackfillMilestoneIndexTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.fe = FeatureEntry(
+        name='feature a', summary='sum', category=1,
+        impl_status_chrome=core_enums.ENABLED_BY_DEFAULT)
+    self.fe.put()
+    self.fe_id = self.fe.key.integer_id()
+    Stage(feature_id=self.fe_id, stage_type=core_enums.STAGE_BLINK_SHIPPING,
+          milestones=MilestoneSet(desktop_first=120)).put()
+    self.handler = maintenance_scripts.BackfillMilestoneIndex()
+
+  def tearDown(self):
+    for kind in [FeatureEntry, Stage, FeatureMilestoneIndex]:
+      for entity in kind.query():
+        entity.key.delete()
+
+  def test_get_template_data__rebuild(self):
+    """Missing index entities are written and orphaned ones are deleted."""
+    FeatureMilestoneIndex.get_by_id(self.fe_id).key.delete()
+    FeatureMilestoneIndex(id=99999, milestones=[100]).put()
+
+    result = self.handler.get_template_data()
+
+    self.assertEqual('1 milestone index entities updated, 1 deleted.', result)
+    self.assertEqual(
+        [120], FeatureMilestoneIndex.get_by_id(self.fe_id).milestones)
+    self.assertIsNone(FeatureMilestoneIndex.get_by_id(99999))
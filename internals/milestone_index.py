@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Precomputed index of the milestones in which each feature appears.
+
+The roadmap and the enterprise release notes need to know which features
+are part of a given milestone, and why.  Rather than running a batch of
+Stage queries for every milestone, we keep one FeatureMilestoneIndex
+entity per feature.  It is recomputed whenever a FeatureEntry or Stage of
+that feature is put (see derived_entities), and it can be rebuilt with the
+/scripts/backfill_milestone_index maintenance script.
+"""
+
+import collections
+from typing import Iterable, Optional
+
+from google.cloud import ndb  # type: ignore
+
+from internals.core_enums import *
+from internals.core_models import FeatureEntry, Stage
+
+
+SHIPPING_STAGE_TYPES = frozenset([
+    STAGE_BLINK_SHIPPING, STAGE_PSA_SHIPPING, STAGE_FAST_SHIPPING,
+    STAGE_DEP_SHIPPING])
+ORIGIN_TRIAL_STAGE_TYPES = frozenset([
+    STAGE_BLINK_ORIGIN_TRIAL, STAGE_FAST_ORIGIN_TRIAL,
+    STAGE_DEP_DEPRECATION_TRIAL])
+DEV_TRIAL_STAGE_TYPES = frozenset([
+    STAGE_BLINK_DEV_TRIAL, STAGE_PSA_DEV_TRIAL, STAGE_FAST_DEV_TRIAL,
+    STAGE_DEP_DEV_TRIAL])
+# Note: Enterprise features use STAGE_ENT_ROLLOUT, which only counts
+# toward the release notes and not the roadmap.
+RELEASE_NOTES_STAGE_TYPES = SHIPPING_STAGE_TYPES | {STAGE_ENT_ROLLOUT}
+
+# The reasons that a feature can be listed in a milestone, in the order
+# that they are listed on the roadmap.
+MILESTONE_REASONS = [
+    ENABLED_BY_DEFAULT, DEPRECATED, REMOVED, INTERVENTION, ORIGIN_TRIAL,
+    BEHIND_A_FLAG]
+
+# MilestoneSet fields that put a stage into the release notes for any
+# milestone up to and including their value.
+RELEASE_NOTES_MILESTONE_FIELDS = [
+    'desktop_first', 'android_first', 'ios_first', 'webview_first',
+    'desktop_last', 'ios_last', 'webview_last']
+
+
+class FeatureMilestoneIndex(ndb.Model):
+  """The milestones that one feature is part of, keyed by feature ID."""
+  milestones = ndb.IntegerProperty(repeated=True)
+  # {str(milestone): [impl_status, ...]} listing the reasons that the
+  # feature is part of each milestone.
+  reasons = ndb.JsonProperty()
+  # The latest milestone of any shipping or rollout stage.  The feature
+  # is included in the release notes of every milestone up to this one.
+  release_notes_milestone = ndb.IntegerProperty()
+  updated = ndb.DateTimeProperty(auto_now=True)
+
+
+def _shipping_reason(
+    fe: FeatureEntry, allow_intervention: bool) -> Optional[int]:
+  """Return the reason that a shipping stage puts fe into a milestone."""
+  if fe.impl_status_chrome in (ENABLED_BY_DEFAULT, DEPRECATED, REMOVED):
+    return fe.impl_status_chrome
+  if allow_intervention and fe.impl_status_chrome == INTERVENTION:
+    return INTERVENTION
+  if fe.feature_type == FEATURE_TYPE_DEPRECATION_ID:
+    return DEPRECATED
+  if fe.feature_type == FEATURE_TYPE_INCUBATE_ID:
+    return ENABLED_BY_DEFAULT
+  return None
+
+
+def compute_reasons(
+    fe: FeatureEntry, stages: Iterable[Stage]) -> dict[int, list[int]]:
+  """Return {milestone: [impl_status, ...]} for the given feature."""
+  reasons: dict[int, set[int]] = collections.defaultdict(set)
+  for stage in stages:
+    ms = stage.milestones
+    if ms is None:
+      continue
+    desktop = ms.desktop_first
+    if stage.stage_type in SHIPPING_STAGE_TYPES:
+      if desktop is not None:
+        reason = _shipping_reason(fe, True)
+        if reason is not None:
+          reasons[desktop].add(reason)
+      elif ms.android_first is not None:
+        reason = _shipping_reason(fe, False)
+        if reason is not None:
+          reasons[ms.android_first].add(reason)
+    elif stage.stage_type in ORIGIN_TRIAL_STAGE_TYPES:
+      if desktop is not None:
+        reasons[desktop].add(ORIGIN_TRIAL)
+      else:
+        if ms.android_first is not None:
+          reasons[ms.android_first].add(ORIGIN_TRIAL)
+        if ms.webview_first is not None:
+          reasons[ms.webview_first].add(ORIGIN_TRIAL)
+    elif stage.stage_type in DEV_TRIAL_STAGE_TYPES:
+      if desktop is not None:
+        reasons[desktop].add(BEHIND_A_FLAG)
+      elif ms.android_first is not None:
+        reasons[ms.android_first].add(BEHIND_A_FLAG)
+
+  return {
+      milestone: sorted(milestone_reasons, key=MILESTONE_REASONS.index)
+      for milestone, milestone_reasons in reasons.items()}
+
+
+def compute_release_notes_milestone(stages: Iterable[Stage]) -> Optional[int]:
+  """Return the latest milestone of any unarchived shipping stage."""
+  candidates: list[int] = []
+  for stage in stages:
+    if stage.archived or stage.stage_type not in RELEASE_NOTES_STAGE_TYPES:
+      continue
+    if stage.rollout_milestone is not None:
+      candidates.append(stage.rollout_milestone)
+    if stage.milestones:
+      for field in RELEASE_NOTES_MILESTONE_FIELDS:
+        value = getattr(stage.milestones, field)
+        if value is not None:
+          candidates.append(value)
+  return max(candidates, default=None)
+
+
+def make_index(
+    fe: FeatureEntry, stages: Iterable[Stage]) -> FeatureMilestoneIndex:
+  """Return an unsaved index entity for the given feature and its stages."""
+  stages = list(stages)
+  reasons = compute_reasons(fe, stages)
+  return FeatureMilestoneIndex(
+      id=fe.key.integer_id(),
+      milestones=sorted(reasons),
+      reasons={str(m): r for m, r in reasons.items()},
+      release_notes_milestone=compute_release_notes_milestone(stages))
+
+
+def is_same_index(
+    index: FeatureMilestoneIndex,
+    existing: Optional[FeatureMilestoneIndex]) -> bool:
+  return bool(
+      existing and
+      existing.milestones == index.milestones and
+      existing.reasons == index.reasons and
+      existing.release_notes_milestone == index.release_notes_milestone)
+
+
+def update_feature(
+    feature_id: int, fe: Optional[FeatureEntry],
+    stages: Iterable[Stage]) -> None:
+  """Recompute the index entity of one feature, if it has changed."""
+  existing = FeatureMilestoneIndex.get_by_id(feature_id)
+  if fe is None:
+    if existing:
+      existing.key.delete()
+    return
+
+  index = make_index(fe, stages)
+  if not is_same_index(index, existing):
+    index.put()
+
+
+def get_feature_ids_in_milestone(milestone: int) -> dict[int, list[int]]:
+  """Return {impl_status: [feature_id, ...]} for the given milestone."""
+  return get_feature_ids_in_milestones([milestone])[milestone]
+
+
+def get_feature_ids_in_milestones(
+    milestones: list[int]) -> dict[int, dict[int, list[int]]]:
+  """Return {milestone: {impl_status: [feature_id, ...]}} for each milestone.
+
+  All the milestones are answered by a single query over the range that
+  spans them.
+  """
+  result: dict[int, dict[int, list[int]]] = {
+      milestone: {reason: [] for reason in MILESTONE_REASONS}
+      for milestone in milestones}
+  if not milestones:
+    return result
+
+  query = FeatureMilestoneIndex.query(
+      FeatureMilestoneIndex.milestones >= min(milestones),
+      FeatureMilestoneIndex.milestones <= max(milestones))
+  seen_ids: set[int] = set()
+  for index in query.fetch():
+    feature_id = index.key.integer_id()
+    if feature_id in seen_ids:
+      continue
+    seen_ids.add(feature_id)
+    for milestone_str, reasons in (index.reasons or {}).items():
+      milestone = int(milestone_str)
+      if milestone in result:
+        for reason in reasons:
+          result[milestone][reason].append(feature_id)
+  return result
+
+
+def get_release_notes_feature_ids(milestone: int) -> list[int]:
+  """Return IDs of features that have shipping stages in or after milestone."""
+  query = FeatureMilestoneIndex.query(
+      FeatureMilestoneIndex.release_notes_milestone >= milestone)
+  return [key.integer_id() for key in query.fetch(keys_only=True)]
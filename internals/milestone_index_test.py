@@ -0,0 +1,151 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from internals.core_enums import *
+from internals.core_models import FeatureEntry, MilestoneSet, Stage
+from internals import milestone_index
+from internals.milestone_index import FeatureMilestoneIndex
+
+
+class MilestoneIndexComputeTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.fe = FeatureEntry(
+        id=123, name='feature a', summary='sum', category=1,
+        impl_status_chrome=ENABLED_BY_DEFAULT,
+        feature_type=FEATURE_TYPE_EXISTING_ID)
+
+  def test_compute_reasons__no_stages(self):
+    """A feature with no stages is not in any milestone."""
+    self.assertEqual({}, milestone_index.compute_reasons(self.fe, []))
+
+  def test_compute_reasons__shipping(self):
+    """A shipping stage lists the feature under its impl status."""
+    stages = [
+        Stage(feature_id=123, stage_type=STAGE_BLINK_SHIPPING,
+              milestones=MilestoneSet(desktop_first=120, android_first=121)),
+        ]
+    self.assertEqual(
+        {120: [ENABLED_BY_DEFAULT]},
+        milestone_index.compute_reasons(self.fe, stages))
+
+  def test_compute_reasons__android_only(self):
+    """Android milestones count only when there is no desktop milestone."""
+    self.fe.impl_status_chrome = INTERVENTION
+    self.fe.feature_type = FEATURE_TYPE_DEPRECATION_ID
+    stages = [
+        Stage(feature_id=123, stage_type=STAGE_DEP_SHIPPING,
+              milestones=MilestoneSet(android_first=121)),
+        ]
+    self.assertEqual(
+        {121: [DEPRECATED]},
+        milestone_index.compute_reasons(self.fe, stages))
+
+  def test_compute_reasons__trials(self):
+    """Origin trials and dev trials have their own reasons."""
+    stages = [
+        Stage(feature_id=123, stage_type=STAGE_BLINK_DEV_TRIAL,
+              milestones=MilestoneSet(desktop_first=118)),
+        Stage(feature_id=123, stage_type=STAGE_BLINK_ORIGIN_TRIAL,
+              milestones=MilestoneSet(android_first=119, webview_first=120)),
+        Stage(feature_id=123, stage_type=STAGE_BLINK_SHIPPING,
+              milestones=MilestoneSet(desktop_first=120)),
+        Stage(feature_id=123, stage_type=STAGE_ENT_ROLLOUT,
+              milestones=MilestoneSet(desktop_first=121)),
+        ]
+    self.assertEqual(
+        {118: [BEHIND_A_FLAG],
+         119: [ORIGIN_TRIAL],
+         120: [ENABLED_BY_DEFAULT, ORIGIN_TRIAL]},
+        milestone_index.compute_reasons(self.fe, stages))
+
+  def test_compute_release_notes_milestone(self):
+    """The latest unarchived shipping or rollout milestone is used."""
+    stages = [
+        Stage(feature_id=123, stage_type=STAGE_BLINK_SHIPPING,
+              milestones=MilestoneSet(desktop_first=120, ios_last=124)),
+        Stage(feature_id=123, stage_type=STAGE_ENT_ROLLOUT,
+              rollout_milestone=122),
+        Stage(feature_id=123, stage_type=STAGE_BLINK_SHIPPING,
+              milestones=MilestoneSet(desktop_first=130), archived=True),
+        Stage(feature_id=123, stage_type=STAGE_BLINK_ORIGIN_TRIAL,
+              milestones=MilestoneSet(desktop_last=140)),
+        ]
+    self.assertEqual(
+        124, milestone_index.compute_release_notes_milestone(stages))
+    self.assertIsNone(milestone_index.compute_release_notes_milestone([]))
+
+
+class MilestoneIndexUpdateTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.fe = FeatureEntry(
+        name='feature a', summary='sum', category=1,
+        impl_status_chrome=ENABLED_BY_DEFAULT,
+        feature_type=FEATURE_TYPE_EXISTING_ID)
+    self.fe.put()
+    self.fe_id = self.fe.key.integer_id()
+    self.stage = Stage(
+        feature_id=self.fe_id, stage_type=STAGE_BLINK_SHIPPING,
+        milestones=MilestoneSet(desktop_first=120))
+    self.stage.put()
+
+  def tearDown(self):
+    for kind in [FeatureEntry, Stage, FeatureMilestoneIndex]:
+      for entity in kind.query():
+        entity.key.delete()
+
+  def test_put_hooks__stage(self):
+    """Putting a stage updates the index of its feature."""
+    self.assertEqual(
+        [self.fe_id],
+        milestone_index.get_feature_ids_in_milestone(120)[ENABLED_BY_DEFAULT])
+    self.assertEqual(
+        [self.fe_id], milestone_index.get_release_notes_feature_ids(120))
+
+    self.stage.milestones = MilestoneSet(desktop_first=121)
+    self.stage.put()
+
+    self.assertEqual(
+        [], milestone_index.get_feature_ids_in_milestone(120)[ENABLED_BY_DEFAULT])
+    self.assertEqual(
+        [self.fe_id],
+        milestone_index.get_feature_ids_in_milestone(121)[ENABLED_BY_DEFAULT])
+    self.assertEqual([], milestone_index.get_release_notes_feature_ids(122))
+
+  def test_put_hooks__feature_entry(self):
+    """Putting a feature entry updates the reasons in its index."""
+    self.fe.impl_status_chrome = REMOVED
+    self.fe.put()
+
+    actual = milestone_index.get_feature_ids_in_milestone(120)
+    self.assertEqual([], actual[ENABLED_BY_DEFAULT])
+    self.assertEqual([self.fe_id], actual[REMOVED])
+
+  def test_delete_hook__feature_entry(self):
+    """Deleting a feature entry removes its index entity."""
+    self.fe.key.delete()
+
+    self.assertIsNone(FeatureMilestoneIndex.get_by_id(self.fe_id))
+
+  def test_update_feature__unchanged(self):
+    """We do not rewrite an index entity that is already current."""
+    existing = FeatureMilestoneIndex.get_by_id(self.fe_id)
+
+    milestone_index.update_feature(self.fe_id, self.fe, [self.stage])
+
+    self.assertEqual(
+        existing.updated, FeatureMilestoneIndex.get_by_id(self.fe_id).updated)
@@ -19,9 +19,11 @@ from datetime import datetime, timedelta
 import collections
 import logging
 import difflib
+import random
 import re
 from typing import Any, Optional
 import urllib
+import uuid
 
 from api import converters
 from framework import permissions
@@ -32,6 +34,7 @@ from flask import render_template
 
 from framework import basehandlers
 from framework import cloud_tasks_helpers
+from framework import rediscache
 from framework import users
 import settings
 from internals import approval_defs
@@ -46,6 +49,11 @@ from internals.user_models import (
 
 OT_SUPPORT_EMAIL = 'origin-trials-support@google.com'
 BLINK_DEV_EMAIL = 'blink-dev@chromium.org'
+# Values with more tokens than this are not diffed, to bound the time that
+# it takes to format a notification email.
+MAX_DIFF_TOKENS = 60 * 1000
+TOO_LARGE_TO_DIFF = 'field changed (too large to diff)'
+DIFF_TOKEN_RE = re.compile(r'(\W)')
 
 
 def _determine_milestone_string(ship_stages: list[Stage]) -> str:
@@ -68,22 +76,46 @@ def _determine_milestone_string(ship_stages: list[Stage]) -> str:
     milestone_str = f'{first_android} (android)'
   return milestone_str
 
+def highlight_diffs(old_text, new_text) -> tuple[str, str]:
+  """Return old and new HTML with deletions and additions highlighted.
+
+  Both sides come from a single walk over the SequenceMatcher opcodes.
+  """
+  old_tokens = DIFF_TOKEN_RE.split(old_text)
+  new_tokens = DIFF_TOKEN_RE.split(new_text)
+  if len(old_tokens) + len(new_tokens) > MAX_DIFF_TOKENS:
+    logging.info('Skipped diff of %d and %d tokens',
+                 len(old_tokens), len(new_tokens))
+    return (escape(old_text),
+            f'<i>{TOO_LARGE_TO_DIFF}</i><br/>{escape(new_text)}')
+
+  old_parts: list[str] = []
+  new_parts: list[str] = []
+  matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens)
+  for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    if tag == 'equal':
+      for token in old_tokens[i1:i2]:
+        if token:
+          text = escape(token)
+          old_parts.append(text)
+          new_parts.append(text)
+      continue
+    for token in old_tokens[i1:i2]:
+      if token:
+        old_parts.append(
+            f'<span style="background:#FDD">{escape(token)}</span>')
+    for token in new_tokens[j1:j2]:
+      if token:
+        new_parts.append(
+            f'<span style="background:#DFD">{escape(token)}</span>')
+  return ''.join(old_parts), ''.join(new_parts)
+
+
 def highlight_diff(old_text, new_text, highlight_type):
-  differ = difflib.ndiff(
-      re.split(r'(\W)', old_text), re.split(r'(\W)', new_text))
-  highlighted_text = []
-  for item in differ:
-    text = escape(item[2:])
-    if not text: continue
-    if item.startswith('-') and highlight_type == 'deletion':
-      highlighted_text.append(
-          f'<span style="background:#FDD">{text}</span>')
-    elif item.startswith('+') and highlight_type == 'addition':
-      highlighted_text.append(
-          f'<span style="background:#DFD">{text}</span>')
-    elif item.startswith(' '):
-      highlighted_text.append(text)
-  return ''.join(highlighted_text)
+  highlighted_old, highlighted_new = highlight_diffs(old_text, new_text)
+  if highlight_type == 'deletion':
+    return highlighted_old
+  return highlighted_new
 
 def format_email_body(
     template_path, fe: FeatureEntry, changes: list[dict[str, Any]],
@@ -100,9 +132,9 @@ def format_email_body(
     new_val = prop['new_val']
     old_val = prop['old_val']
 
-    # Escaping values before passing to highlight_diff
-    highlighted_old_val = highlight_diff(old_val, new_val, 'deletion')
-    highlighted_new_val = highlight_diff(old_val, new_val, 'addition')
+    # highlight_diffs escapes the values
+    highlighted_old_val, highlighted_new_val = highlight_diffs(
+        old_val, new_val)
 
     # Using f-strings for clear formatting
     formatted_changes += (
@@ -297,6 +329,109 @@ def add_reviewers(
   accumulate_reasons(addr_reasons, recipients, reasons)
 
 
+# Each user's starred feature IDs are cached as a redis set.  Redis cannot
+# store an empty set, so every cached set also holds this member, and a set
+# without it is treated as not cached.
+STAR_SET_CACHE_KEY = 'FeatureStarUserSet'
+STAR_SET_COMPLETE = '0'
+STAR_SET_TTL = 60 * 60  # seconds
+# Each star or unstar gives the user a new star version.  Cached searches
+# for starred-by:me are keyed by it, and a star set that was being rebuilt
+# while the user starred a feature is only stored if it did not change.
+STAR_VERSION_CACHE_KEY = 'FeatureStarVersion'
+STAR_VERSION_TTL = 24 * STAR_SET_TTL
+
+# Star count changes are spread over this many counter shards per feature.
+STAR_COUNTER_SHARDS = 10
+
+
+def star_version_cache_key(email: str) -> str:
+  return '%s|%s' % (STAR_VERSION_CACHE_KEY, email)
+
+
+def bump_star_version(email: str) -> str:
+  """Give the user a new star version and return it."""
+  version = uuid.uuid4().hex
+  rediscache.set(
+      star_version_cache_key(email), version, time=STAR_VERSION_TTL)
+  return version
+
+
+def get_star_version(email: str) -> str:
+  """Return the user's current star version."""
+  version = rediscache.get(star_version_cache_key(email))
+  if version is None:
+    version = bump_star_version(email)
+  return version
+
+
+def star_set_cache_key(email: str) -> str:
+  return '%s|%s' % (STAR_SET_CACHE_KEY, email)
+
+
+class FeatureStarCounterShard(ndb.Model):
+  """Change in a feature's star_count that is not yet in FeatureEntry.
+
+  Starring a feature used to update FeatureEntry.star_count directly,
+  which contended with feature edits and invalidated the feature caches.
+  Now each star or unstar adjusts one of several shards, and
+  flush_star_counts() periodically adds them into star_count.
+  """
+  feature_id = ndb.IntegerProperty(required=True)
+  delta = ndb.IntegerProperty(default=0)
+
+  @classmethod
+  @ndb.transactional(retries=4)
+  def increment(cls, feature_id: int, delta: int) -> None:
+    shard_id = '%d-%d' % (feature_id, random.randrange(STAR_COUNTER_SHARDS))
+    shard = cls.get_by_id(shard_id)
+    if not shard:
+      shard = cls(id=shard_id, feature_id=feature_id)
+    shard.delta += delta
+    shard.put()
+
+
+@ndb.transactional(retries=4)
+def _flush_feature_star_count(feature_id: int, keys: list[ndb.Key]) -> bool:
+  """Add the given shards into star_count and delete them, atomically.
+
+  Returns True if the feature's star_count was changed.
+  """
+  shards = [s for s in ndb.get_multi(keys) if s]
+  delta = sum(s.delta for s in shards)
+  feature_entry = FeatureEntry.get_by_id(feature_id) if delta else None
+  if feature_entry:
+    star_count = feature_entry.star_count + delta
+    if star_count < 0:
+      logging.error('count would be < 0: %r', (feature_id, star_count))
+      star_count = 0
+    feature_entry.star_count = star_count
+    feature_entry.put()
+  ndb.delete_multi([s.key for s in shards])
+  return feature_entry is not None
+
+
+def flush_star_counts() -> int:
+  """Add pending star count changes into each feature's star_count.
+
+  Each feature is updated in the same transaction that deletes its
+  shards, so a failed update leaves the changes pending.  Returns the
+  number of features that were updated.
+  """
+  keys_by_feature: dict[int, list[ndb.Key]] = collections.defaultdict(list)
+  for shard in FeatureStarCounterShard.query():
+    keys_by_feature[shard.feature_id].append(shard.key)
+
+  num_updated = 0
+  for feature_id, keys in keys_by_feature.items():
+    try:
+      if _flush_feature_star_count(feature_id, keys):
+        num_updated += 1
+    except Exception:
+      logging.exception('Could not flush star count of %r', feature_id)
+  return num_updated
+
+
 class FeatureStar(ndb.Model):
   """A FeatureStar represent one user's interest in one feature."""
   email = ndb.StringProperty(required=True)
@@ -325,25 +460,44 @@ class FeatureStar(ndb.Model):
     else:
       return  # No need to update anything in datastore
 
-    feature_entry = FeatureEntry.get_by_id(feature_id)
-    feature_entry.star_count += 1 if starred else -1
-    if feature_entry.star_count < 0:
-      logging.error('count would be < 0: %r', (email, feature_id, starred))
-      return
-    feature_entry.put()
+    bump_star_version(email)
+    # Change the cached set in place, if the user has one.
+    if starred:
+      rediscache.add_to_set(star_set_cache_key(email), feature_id)
+    else:
+      rediscache.remove_from_set(star_set_cache_key(email), feature_id)
+    FeatureStarCounterShard.increment(feature_id, 1 if starred else -1)
 
   @classmethod
-  def get_user_stars(self, email):
-    """Return a list of feature_ids of all features that the user starred."""
+  @ndb.tasklet
+  def get_user_stars_async(self, email):
+    """Return a future for the feature_ids of all features the user starred."""
+    cache_key = star_set_cache_key(email)
+    cached = rediscache.get_set(cache_key)
+    if cached and STAR_SET_COMPLETE in cached:
+      cached.discard(STAR_SET_COMPLETE)
+      return sorted((int(m) for m in cached), reverse=True)
+
+    # Read the version before querying so that a star set during the query
+    # keeps this rebuild from being stored.
+    version = get_star_version(email)
     q = FeatureStar.query()
     q = q.filter(FeatureStar.email == email)
     q = q.filter(FeatureStar.starred == True)
-    feature_stars = q.fetch(None)
+    feature_stars = yield q.fetch_async(None)
     logging.info('found %d stars for %r', len(feature_stars), email)
     feature_ids = [fs.feature_id for fs in feature_stars]
     logging.info('returning %r', feature_ids)
+    rediscache.replace_set(
+        cache_key, [STAR_SET_COMPLETE] + feature_ids, time=STAR_SET_TTL,
+        guard_key=star_version_cache_key(email), guard_value=version)
     return sorted(feature_ids, reverse=True)
 
+  @classmethod
+  def get_user_stars(self, email):
+    """Return a list of feature_ids of all features that the user starred."""
+    return self.get_user_stars_async(email).result()
+
   @classmethod
   def get_feature_starrers(self, feature_id: int) -> list[UserPref]:
     """Return list of UserPref objects for starrers that want notifications."""
@@ -360,6 +514,17 @@ class FeatureStar(ndb.Model):
     return user_prefs
 
 
+class FlushStarCountsHandler(basehandlers.FlaskHandler):
+
+  def get_template_data(self, **kwargs) -> str:
+    """Add pending star count changes into FeatureEntry.star_count."""
+    self.require_cron_header()
+    num_updated = flush_star_counts()
+    msg = f'Updated star counts of {num_updated} features'
+    logging.info(msg)
+    return msg
+
+
 class NotifyInactiveUsersHandler(basehandlers.FlaskHandler):
   JSONIFY = True
   DEFAULT_LAST_VISIT = datetime(2022, 8, 1)  # 2022-08-01
@@ -22,6 +22,7 @@ import werkzeug.exceptions  # Flask HTTP stuff.
 from google.cloud import ndb  # type: ignore
 
 from api import converters
+from framework import rediscache
 
 from internals import approval_defs
 from internals import core_enums
@@ -171,6 +172,37 @@ class EmailFormattingTest(testing_config.CustomTestCase):
          ),
         actual_high_new);
 
+  def test_highlight_diffs__both_sides(self):
+    """It produces both highlighted sides in one call."""
+    actual_old, actual_new = notifier.highlight_diffs(
+        'start remove middle end', 'start middle add end')
+
+    self.assertEqual(
+        notifier.highlight_diff(
+            'start remove middle end', 'start middle add end', 'deletion'),
+        actual_old)
+    self.assertEqual(
+        ('start '
+         'middle '
+         '<span style="background:#DFD">add</span>'
+         '<span style="background:#DFD"> </span>'
+         'end'
+         ),
+        actual_new)
+
+  @mock.patch('internals.notifier.MAX_DIFF_TOKENS', 10)
+  def test_highlight_diffs__too_large(self):
+    """Very large values are escaped but not diffed."""
+    old = 'a <b> c d e f'
+    new = 'a <b> c d e f g'
+
+    actual_old, actual_new = notifier.highlight_diffs(old, new)
+
+    self.assertEqual('a &lt;b&gt; c d e f', actual_old)
+    self.assertEqual(
+        '<i>field changed (too large to diff)</i><br/>a &lt;b&gt; c d e f g',
+        actual_new)
+
   def test_format_email_body__new(self):
     """We generate an email body for new features."""
     with test_app.app_context():
@@ -828,6 +860,10 @@ class FeatureStarTest(testing_config.CustomTestCase):
     self.fe_1.key.delete()
     self.fe_2.key.delete()
     self.fe_3.key.delete()
+    for kind in [notifier.FeatureStar, notifier.FeatureStarCounterShard]:
+      for entity in kind.query():
+        entity.key.delete()
+    rediscache.flushall()
 
   def test_get_star__no_existing(self):
     """User has never starred the given feature."""
@@ -845,6 +881,9 @@ class FeatureStarTest(testing_config.CustomTestCase):
     self.assertEqual(email, actual.email)
     self.assertEqual(feature_id, actual.feature_id)
     self.assertTrue(actual.starred)
+    # The count is updated when pending changes are flushed.
+    self.assertEqual(0, FeatureEntry.get_by_id(feature_id).star_count)
+    self.assertEqual(1, notifier.flush_star_counts())
     updated_fe = FeatureEntry.get_by_id(feature_id)
     self.assertEqual(1, updated_fe.star_count)
 
@@ -853,9 +892,41 @@ class FeatureStarTest(testing_config.CustomTestCase):
     self.assertEqual(email, actual.email)
     self.assertEqual(feature_id, actual.feature_id)
     self.assertFalse(actual.starred)
+    notifier.flush_star_counts()
     updated_fe = FeatureEntry.get_by_id(feature_id)
     self.assertEqual(0, updated_fe.star_count)
 
+  def test_flush_star_counts(self):
+    """Pending changes from many users are added into star_count."""
+    feature_id = self.fe_1.key.integer_id()
+    for i in range(5):
+      notifier.FeatureStar.set_star('user%d@example.com' % i, feature_id)
+    notifier.FeatureStar.set_star('user0@example.com', feature_id, False)
+    self.assertEqual(1, notifier.flush_star_counts())
+    self.assertEqual(4, FeatureEntry.get_by_id(feature_id).star_count)
+    self.assertEqual([], notifier.FeatureStarCounterShard.query().fetch())
+    # Nothing is pending now.
+    self.assertEqual(0, notifier.flush_star_counts())
+    self.assertEqual(4, FeatureEntry.get_by_id(feature_id).star_count)
+
+  def test_flush_star_counts__never_negative(self):
+    """A count that was already out of step does not go below zero."""
+    feature_id = self.fe_1.key.integer_id()
+    notifier.FeatureStarCounterShard.increment(feature_id, -1)
+    notifier.flush_star_counts()
+    self.assertEqual(0, FeatureEntry.get_by_id(feature_id).star_count)
+
+  def test_flush_star_counts__failed_put(self):
+    """Changes stay pending if the feature could not be updated."""
+    feature_id = self.fe_1.key.integer_id()
+    notifier.FeatureStar.set_star('user0@example.com', feature_id)
+    with mock.patch.object(FeatureEntry, 'put', side_effect=ValueError):
+      self.assertEqual(0, notifier.flush_star_counts())
+    self.assertEqual(0, FeatureEntry.get_by_id(feature_id).star_count)
+
+    self.assertEqual(1, notifier.flush_star_counts())
+    self.assertEqual(1, FeatureEntry.get_by_id(feature_id).star_count)
+
   def test_get_user_stars__no_stars(self):
     """User has never starred any features."""
     email = 'user4@example.com'
@@ -881,6 +952,56 @@ class FeatureStarTest(testing_config.CustomTestCase):
     for feature_id in expected_ids:
       notifier.FeatureStar.get_star(email, feature_id).key.delete()
 
+  def test_get_user_stars__cached(self):
+    """The user's cached stars are updated when the user stars a feature."""
+    email = 'user6@example.com'
+    feature_1_id = self.fe_1.key.integer_id()
+    feature_2_id = self.fe_2.key.integer_id()
+    notifier.FeatureStar.set_star(email, feature_1_id)
+    self.assertEqual([feature_1_id], notifier.FeatureStar.get_user_stars(email))
+    version = notifier.get_star_version(email)
+    cache_key = notifier.star_set_cache_key(email)
+    self.assertEqual(
+        {notifier.STAR_SET_COMPLETE, str(feature_1_id)},
+        rediscache.get_set(cache_key))
+    with mock.patch.object(notifier.FeatureStar, 'query') as mock_query:
+      actual = notifier.FeatureStar.get_user_stars(email)
+    mock_query.assert_not_called()
+    self.assertEqual([feature_1_id], actual)
+
+    notifier.FeatureStar.set_star(email, feature_2_id)
+    notifier.FeatureStar.set_star(email, feature_1_id, starred=False)
+    # The search cache version changes, but the set is changed in place.
+    self.assertNotEqual(version, notifier.get_star_version(email))
+    self.assertEqual(
+        {notifier.STAR_SET_COMPLETE, str(feature_2_id)},
+        rediscache.get_set(cache_key))
+    with mock.patch.object(notifier.FeatureStar, 'query') as mock_query:
+      actual = notifier.FeatureStar.get_user_stars(email)
+    mock_query.assert_not_called()
+    self.assertEqual([feature_2_id], actual)
+
+  def test_get_user_stars__cached_empty(self):
+    """A user with no stars is cached too."""
+    email = 'user7@example.com'
+    self.assertEqual([], notifier.FeatureStar.get_user_stars(email))
+    self.assertEqual(
+        {notifier.STAR_SET_COMPLETE},
+        rediscache.get_set(notifier.star_set_cache_key(email)))
+
+  def test_get_user_stars__star_during_rebuild(self):
+    """A set rebuilt while the user starred a feature is not stored."""
+    email = 'user8@example.com'
+    feature_1_id = self.fe_1.key.integer_id()
+    old_version = notifier.get_star_version(email)
+    notifier.FeatureStar.set_star(email, feature_1_id)
+    # This is what a rebuild that started before set_star() would write.
+    self.assertFalse(rediscache.replace_set(
+        notifier.star_set_cache_key(email), [notifier.STAR_SET_COMPLETE],
+        guard_key=notifier.star_version_cache_key(email),
+        guard_value=old_version))
+    self.assertEqual([feature_1_id], notifier.FeatureStar.get_user_stars(email))
+
   def test_get_feature_starrers__no_stars(self):
     """No user has starred the given feature."""
     feature_1_id = self.fe_1.key.integer_id()
@@ -350,16 +350,15 @@ class SLOOverdueHandler(basehandlers.FlaskHandler):
 
   def get_overdue_gates_and_features(self):
     """Return lists of newly and long overdue review gates, and their FEs."""
-    overdue_gates: list[Gate] = slo.get_overdue_gates(
+    overdue_gates = slo.get_overdue_gates_with_remaining(
         approval_defs.APPROVAL_FIELDS_BY_ID, approval_defs.DEFAULT_SLO_LIMIT)
     newly_overdue_gates: list[Gate] = []
     long_overdue_gates: list[Gate] = []
     relevant_feature_ids: set[int] = set()
-    for og in overdue_gates:
-      appr_def = approval_defs.APPROVAL_FIELDS_BY_ID.get(og.gate_type)
-      slo_limit = (appr_def.slo_initial_response
-                   if appr_def else approval_defs.DEFAULT_SLO_LIMIT)
-      remaining = slo.remaining_days(og.requested_on, slo_limit)
+    for og, remaining in overdue_gates:
+      slo_limit = slo.get_slo_limit(
+          og, approval_defs.APPROVAL_FIELDS_BY_ID,
+          approval_defs.DEFAULT_SLO_LIMIT)
       if remaining == -1:
         newly_overdue_gates.append(og)
         relevant_feature_ids.add(og.feature_id)
@@ -360,8 +360,11 @@ class SLOOverdueHandlerTest(testing_config.CustomTestCase):
         state=Gate.PREPARING)
     self.gate_1.put()
     self.handler = reminders.SLOOverdueHandler()
-    # Just a non-empty date, the value is ignored by mock_remaining_days
-    self.request_date = datetime(2023, 6, 7, 12, 30, 0)
+    self.request_date = datetime(2023, 6, 7, 12, 30, 0)  # Wed
+    # The enterprise gate has an SLO of 5 weekdays.
+    self.not_due_date = datetime(2023, 6, 13, 12, 30, 0)  # Tue
+    self.newly_overdue_date = datetime(2023, 6, 15, 12, 30, 0)  # Thu
+    self.long_overdue_date = datetime(2023, 6, 21, 12, 30, 0)  # Wed
 
   def tearDown(self) -> None:
     kinds: list[ndb.Model] = [FeatureEntry, Stage, Gate]
@@ -377,11 +380,11 @@ class SLOOverdueHandlerTest(testing_config.CustomTestCase):
     expected = {'message': expected_message}
     self.assertEqual(actual, expected)
 
-  @mock.patch('internals.slo.remaining_days')
-  def test_get_template_data__no_reviews_due(self, mock_remaining_days):
+  @mock.patch('internals.slo.now_utc')
+  def test_get_template_data__no_reviews_due(self, mock_now):
     self.gate_1.state = Vote.REVIEW_REQUESTED
     self.gate_1.put()
-    mock_remaining_days.return_value = 1
+    mock_now.return_value = self.not_due_date
 
     with test_app.app_context():
       actual = self.handler.get_template_data()
@@ -390,12 +393,12 @@ class SLOOverdueHandlerTest(testing_config.CustomTestCase):
     expected = {'message': expected_message}
     self.assertEqual(actual, expected)
 
-  @mock.patch('internals.slo.remaining_days')
-  def test_get_template_data__one_due_unassigned(self, mock_remaining_days):
+  @mock.patch('internals.slo.now_utc')
+  def test_get_template_data__one_due_unassigned(self, mock_now):
     self.gate_1.state = Vote.REVIEW_REQUESTED
     self.gate_1.requested_on = self.request_date
     self.gate_1.put()
-    mock_remaining_days.return_value = -1
+    mock_now.return_value = self.newly_overdue_date
 
     with test_app.app_context():
       actual = self.handler.get_template_data()
@@ -408,14 +411,14 @@ class SLOOverdueHandlerTest(testing_config.CustomTestCase):
     expected = {'message': expected_message}
     self.assertEqual(actual, expected)
 
-  @mock.patch('internals.slo.remaining_days')
-  def test_get_template_data__one_due_assigned(self, mock_remaining_days):
+  @mock.patch('internals.slo.now_utc')
+  def test_get_template_data__one_due_assigned(self, mock_now):
     self.gate_1.state = Vote.REVIEW_REQUESTED
     self.gate_1.assignee_emails = [
         'b_assignee@example.com', 'a_assignee@example.com']
     self.gate_1.requested_on = self.request_date
     self.gate_1.put()
-    mock_remaining_days.return_value = -1
+    mock_now.return_value = self.newly_overdue_date
 
     with test_app.app_context():
       actual = self.handler.get_template_data()
@@ -427,12 +430,12 @@ class SLOOverdueHandlerTest(testing_config.CustomTestCase):
     expected = {'message': expected_message}
     self.assertEqual(actual, expected)
 
-  @mock.patch('internals.slo.remaining_days')
-  def test_get_template_data__one_overdue_unassigned(self, mock_remaining_days):
+  @mock.patch('internals.slo.now_utc')
+  def test_get_template_data__one_overdue_unassigned(self, mock_now):
     self.gate_1.state = Vote.REVIEW_REQUESTED
     self.gate_1.requested_on = self.request_date
     self.gate_1.put()
-    mock_remaining_days.return_value = -approval_defs.DEFAULT_SLO_LIMIT
+    mock_now.return_value = self.long_overdue_date
 
     with test_app.app_context():
       actual = self.handler.get_template_data()
@@ -445,14 +448,14 @@ class SLOOverdueHandlerTest(testing_config.CustomTestCase):
     expected = {'message': expected_message}
     self.assertEqual(actual, expected)
 
-  @mock.patch('internals.slo.remaining_days')
-  def test_get_template_data__one_overdue_assigned(self, mock_remaining_days):
+  @mock.patch('internals.slo.now_utc')
+  def test_get_template_data__one_overdue_assigned(self, mock_now):
     self.gate_1.state = Vote.REVIEW_REQUESTED
     self.gate_1.assignee_emails = [
         'mhoste@google.com', 'a_assignee@example.com']
     self.gate_1.requested_on = self.request_date
     self.gate_1.put()
-    mock_remaining_days.return_value = -approval_defs.DEFAULT_SLO_LIMIT
+    mock_now.return_value = self.long_overdue_date
 
     with test_app.app_context():
       actual = self.handler.get_template_data()
@@ -466,11 +469,11 @@ class SLOOverdueHandlerTest(testing_config.CustomTestCase):
     expected = {'message': expected_message}
     self.assertEqual(actual, expected)
 
-  @mock.patch('internals.slo.remaining_days')
-  def test_get_template_data__old_reviews(self, mock_remaining_days):
+  @mock.patch('internals.slo.now_utc')
+  def test_get_template_data__old_reviews(self, mock_now):
     self.gate_1.state = Vote.REVIEW_REQUESTED
     self.gate_1.put()
-    mock_remaining_days.return_value = 99
+    mock_now.return_value = datetime(2023, 9, 1, 12, 30, 0)
 
     with test_app.app_context():
       actual = self.handler.get_template_data()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-feature rollups of review latency for the review latency report.
+
+Each FeatureReviewLatency entity holds the latency of every gate on one
+feature that has had at least one review requested.  When a Gate is put,
+only that gate's entry in its feature's rollup is replaced, and only if
+its request time or latency changed.  A daily cron job rebuilds all the
+rollups to repair any update that was lost.  The report then reads just
+the rollups of features with a review requested in the date window.
+"""
+
+import collections
+from datetime import datetime
+import logging
+from typing import Any, Iterable, Optional
+
+from google.cloud import ndb  # type: ignore
+
+from framework.basehandlers import FlaskHandler
+from internals import slo
+from internals.core_models import FeatureEntry, Stage
+from internals.review_models import Gate
+
+
+# This means that the feature team has not yet requested this review.
+NOT_STARTED_LATENCY = -1
+# This means that the feature team is still waiting for an initial response.
+PENDING_LATENCY = -2
+# Used to sort features that have no requested reviews.
+NO_REQUEST_DATE = datetime(2000, 1, 1)
+
+
+def latency(gate: Gate) -> int:
+  """Return the number of weekdays that the review was pending."""
+  if not gate.requested_on:
+    return NOT_STARTED_LATENCY
+  if not gate.responded_on:
+    return PENDING_LATENCY
+  return slo.weekdays_between(gate.requested_on, gate.responded_on)
+
+
+def make_entry(gate: Gate) -> dict[str, Any]:
+  """Return the part of a rollup that describes one gate."""
+  return {
+      'gate_id': gate.key.integer_id(),
+      'gate_type': gate.gate_type,
+      'requested_on': (
+          gate.requested_on.isoformat() if gate.requested_on else None),
+      'latency': latency(gate),
+  }
+
+
+class FeatureReviewLatency(ndb.Model):
+  """The review latency of each gate of one feature.  Key is feature ID."""
+  feature_id = ndb.IntegerProperty(required=True)
+  feature_name = ndb.StringProperty(indexed=False)
+  # One entry per gate, as produced by make_entry().
+  gates = ndb.JsonProperty(default=[])
+  # The request times of gates that have been requested, for date windows.
+  request_dates = ndb.DateTimeProperty(repeated=True)
+  earliest_request = ndb.DateTimeProperty(default=NO_REQUEST_DATE)
+
+  def set_gates(self, entries: list[dict[str, Any]]) -> None:
+    self.gates = sorted(entries, key=lambda e: (e['gate_type'], e['gate_id']))
+    self.request_dates = sorted(
+        datetime.fromisoformat(e['requested_on'])
+        for e in entries if e['requested_on'])
+    self.earliest_request = min(self.request_dates, default=NO_REQUEST_DATE)
+
+  def latencies(self) -> list[tuple[int, int]]:
+    """Return (gate_type, latency) pairs sorted by gate_type."""
+    return sorted((e['gate_type'], e['latency']) for e in self.gates)
+
+
+def build_rollup(
+    fe: FeatureEntry, gates: list[Gate]) -> Optional[FeatureReviewLatency]:
+  """Make the rollup for a feature, or None if no review was requested."""
+  if not any(g.requested_on for g in gates):
+    return None
+  feature_id = fe.key.integer_id()
+  rollup = FeatureReviewLatency(
+      id=feature_id, feature_id=feature_id, feature_name=fe.name)
+  rollup.set_gates([make_entry(g) for g in gates])
+  return rollup
+
+
+def update_gate(gate: Gate) -> None:
+  """Replace one gate's entry in its feature's rollup if it changed."""
+  rollup = FeatureReviewLatency.get_by_id(gate.feature_id)
+  if not rollup:
+    if not gate.requested_on:
+      return
+    fe = FeatureEntry.get_by_id(gate.feature_id)
+    if not fe:
+      return
+    gates = Gate.query(Gate.feature_id == gate.feature_id).fetch()
+    rollup = build_rollup(fe, gates)
+    if rollup:
+      rollup.put()
+    return
+
+  entry = make_entry(gate)
+  if entry in rollup.gates:
+    return
+  entries = [e for e in rollup.gates if e['gate_id'] != entry['gate_id']]
+  rollup.set_gates(entries + [entry])
+  rollup.put()
+
+
+def update_feature(
+    feature_id: int, fe: Optional[FeatureEntry],
+    stages: Iterable[Stage]) -> None:
+  """Keep the feature name in the rollup current."""
+  rollup = FeatureReviewLatency.get_by_id(feature_id)
+  if not rollup:
+    return
+  if not fe:
+    rollup.key.delete()
+  elif rollup.feature_name != fe.name:
+    rollup.feature_name = fe.name
+    rollup.put()
+
+
+def get_rollups(
+    start: datetime, end: Optional[datetime] = None
+) -> list[FeatureReviewLatency]:
+  """Return rollups of features with a review requested in [start, end).
+
+  They are sorted by the earliest review request on each feature.
+  """
+  query = FeatureReviewLatency.query(
+      FeatureReviewLatency.request_dates >= start)
+  if end:
+    query = query.filter(FeatureReviewLatency.request_dates < end)
+  rollups_by_id = {r.feature_id: r for r in query.fetch()}
+  return sorted(
+      rollups_by_id.values(),
+      key=lambda r: (r.earliest_request, r.feature_id))
+
+
+def rebuild_all() -> int:
+  """Recompute every rollup and return the number of them."""
+  # One query over all gates is cheaper than an IN query on every feature
+  # with a requested review, which NDB runs as one query per feature.
+  gates_by_fid: dict[int, list[Gate]] = collections.defaultdict(list)
+  for g in Gate.query():
+    gates_by_fid[g.feature_id].append(g)
+  feature_ids = [
+      fid for fid, gates in gates_by_fid.items()
+      if any(g.requested_on for g in gates)]
+  features = ndb.get_multi(
+      [ndb.Key('FeatureEntry', fid) for fid in feature_ids])
+
+  rollups = []
+  for fe in features:
+    if fe:
+      rollup = build_rollup(fe, gates_by_fid[fe.key.integer_id()])
+      if rollup:
+        rollups.append(rollup)
+  ndb.put_multi(rollups)
+
+  current_keys = {r.key for r in rollups}
+  stale_keys = [
+      k for k in FeatureReviewLatency.query().fetch(keys_only=True)
+      if k not in current_keys]
+  ndb.delete_multi(stale_keys)
+  return len(rollups)
+
+
+class RebuildReviewLatency(FlaskHandler):
+
+  def get_template_data(self, **kwargs) -> str:
+    """Recompute the review latency rollups of all features."""
+    self.require_cron_header()
+    num_rollups = rebuild_all()
+    msg = f'Rebuilt review latency of {num_rollups} features'
+    logging.info(msg)
+    return msg
@@ -0,0 +1,129 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from datetime import datetime
+from unittest import mock
+
+from google.cloud import ndb  # type: ignore
+
+from internals import review_latency
+from internals.core_models import FeatureEntry
+from internals.review_latency import FeatureReviewLatency
+from internals.review_models import Gate
+
+
+class ReviewLatencyTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.fe = FeatureEntry(name='feature one', summary='sum', category=1)
+    self.fe.put()
+    self.fe_id = self.fe.key.integer_id()
+    self.gate_1 = Gate(
+        feature_id=self.fe_id, gate_type=1, stage_id=1, state=Gate.PREPARING)
+    self.gate_1.put()
+    self.gate_2 = Gate(
+        feature_id=self.fe_id, gate_type=2, stage_id=1, state=Gate.PREPARING)
+    self.gate_2.put()
+
+  def tearDown(self):
+    kinds: list[ndb.Model] = [FeatureEntry, Gate, FeatureReviewLatency]
+    for kind in kinds:
+      for entity in kind.query():
+        entity.key.delete()
+
+  def test_latency(self):
+    """Latency is in weekdays, or says why there is none yet."""
+    self.assertEqual(
+        review_latency.NOT_STARTED_LATENCY,
+        review_latency.latency(self.gate_1))
+    self.gate_1.requested_on = datetime(2024, 3, 15)  # Fri
+    self.assertEqual(
+        review_latency.PENDING_LATENCY, review_latency.latency(self.gate_1))
+    self.gate_1.responded_on = datetime(2024, 3, 19, 20)  # Tue
+    self.assertEqual(2, review_latency.latency(self.gate_1))
+
+  def test_update_gate__no_requests(self):
+    """Features without review requests have no rollup."""
+    self.assertIsNone(FeatureReviewLatency.get_by_id(self.fe_id))
+
+  def test_update_gate(self):
+    """The rollup is created on the first request and patched after that."""
+    self.gate_1.requested_on = datetime(2024, 3, 15)
+    self.gate_1.put()
+    rollup = FeatureReviewLatency.get_by_id(self.fe_id)
+    self.assertEqual('feature one', rollup.feature_name)
+    self.assertEqual([datetime(2024, 3, 15)], rollup.request_dates)
+    self.assertEqual(
+        [(1, review_latency.PENDING_LATENCY),
+         (2, review_latency.NOT_STARTED_LATENCY)],
+        rollup.latencies())
+
+    with mock.patch('internals.review_models.Gate.query') as mock_query:
+      self.gate_1.responded_on = datetime(2024, 3, 19, 20)
+      self.gate_1.put()
+      self.gate_2.requested_on = datetime(2024, 3, 12)
+      self.gate_2.put()
+    mock_query.assert_not_called()
+
+    rollup = FeatureReviewLatency.get_by_id(self.fe_id)
+    self.assertEqual(
+        [(1, 2), (2, review_latency.PENDING_LATENCY)], rollup.latencies())
+    self.assertEqual(datetime(2024, 3, 12), rollup.earliest_request)
+
+  def test_update_feature(self):
+    """The rollup follows renames and deletion of its feature."""
+    self.gate_1.requested_on = datetime(2024, 3, 15)
+    self.gate_1.put()
+    self.fe.name = 'new name'
+    self.fe.put()
+    rollup = FeatureReviewLatency.get_by_id(self.fe_id)
+    self.assertEqual('new name', rollup.feature_name)
+
+    self.fe.key.delete()
+    self.assertIsNone(FeatureReviewLatency.get_by_id(self.fe_id))
+
+  def test_get_rollups(self):
+    """We can find the features with a request in any date window."""
+    self.gate_1.requested_on = datetime(2024, 3, 15)
+    self.gate_1.put()
+    self.gate_2.requested_on = datetime(2024, 1, 10)
+    self.gate_2.put()
+
+    def ids(rollups):
+      return [r.feature_id for r in rollups]
+
+    self.assertEqual(
+        [self.fe_id], ids(review_latency.get_rollups(datetime(2024, 1, 1))))
+    self.assertEqual(
+        [self.fe_id],
+        ids(review_latency.get_rollups(
+            datetime(2024, 3, 1), datetime(2024, 4, 1))))
+    self.assertEqual(
+        [],
+        ids(review_latency.get_rollups(
+            datetime(2024, 2, 1), datetime(2024, 3, 1))))
+
+  def test_rebuild_all(self):
+    """Rebuilding creates missing rollups and removes stale ones."""
+    self.gate_1.requested_on = datetime(2024, 3, 15)
+    self.gate_1.put()
+    FeatureReviewLatency.get_by_id(self.fe_id).key.delete()
+    FeatureReviewLatency(id=999, feature_id=999, feature_name='gone').put()
+
+    self.assertEqual(1, review_latency.rebuild_all())
+    self.assertEqual(
+        [self.fe_id],
+        [r.feature_id for r in FeatureReviewLatency.query()])
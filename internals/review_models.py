@@ -22,6 +22,8 @@ import logging
 from typing import Optional
 from google.cloud import ndb  # type: ignore
 
+from internals import search_cache
+
 class OwnersFile(ndb.Model):
   """Describes the properties to store raw API_OWNERS content."""
   url = ndb.StringProperty(required=True)
@@ -148,6 +150,10 @@ class Vote(ndb.Model):
 
   # Note: set_vote() moved to approval_defs.py
 
+  def _post_put_hook(self, future) -> None:
+    # Votes are used by searches such as is:recently-reviewed.
+    search_cache.bump_generation()
+
 
 class Gate(ndb.Model):
   """Gates regulate the completion of a stage."""
@@ -172,6 +178,8 @@ class Gate(ndb.Model):
   assignee_emails = ndb.StringProperty(repeated=True)
   next_action = ndb.DateProperty()
   additional_review = ndb.BooleanProperty(default=False)
+  # Gates written before this was added have no value.
+  updated = ndb.DateTimeProperty(auto_now=True)
 
   # TODO(jrobbins): implement request_review()
 
@@ -192,6 +200,21 @@ class Gate(ndb.Model):
       gates_dict[gate.gate_type].append(gate)
     return gates_dict
 
+  def _post_put_hook(self, future) -> None:
+    # Gates are used by searches such as pending-approval-by:me.
+    search_cache.bump_generation()
+    if future.exception() is not None:
+      return
+    gate_id = self.key.integer_id()
+    ndb.get_context().call_on_commit(
+        lambda: _schedule_latency_update(gate_id))
+
+
+def _schedule_latency_update(gate_id: int) -> None:
+  # Imported here because that module depends on this module.
+  from internals import derived_entities
+  derived_entities.schedule_gate_update(gate_id)
+
 
 class Amendment(ndb.Model):
   """Activity log entries can record changes to fields."""
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Chrome milestone schedules from chromiumdash.
+
+The schedule of a milestone stops changing some time after it reaches
+the stable channel.  Those final schedules are stored in the datastore
+and kept in memory for the life of the instance.  Schedules of later
+milestones are cached in redis for a limited time so that changes to
+them are picked up.  Any milestones that are not cached are fetched
+concurrently using a pooled session.
+"""
+
+from concurrent import futures
+from datetime import datetime, timedelta
+import json
+import logging
+import threading
+from typing import Any, Iterable, Optional
+
+from google.cloud import ndb  # type: ignore
+import requests
+
+from framework import rediscache
+from framework import utils
+import settings
+
+
+SCHEDULE_URL = (
+    'https://chromiumdash.appspot.com/fetch_milestone_schedule?mstone=%d')
+FUTURE_SCHEDULE_TTL = 60 * 60  # 1 hour
+# The schedule of a milestone is final this long after its stable date.
+FINAL_AFTER = timedelta(days=30)
+FETCH_TIMEOUT = 20  # seconds
+MAX_FETCH_WORKERS = 8
+
+Schedule = dict[str, Any]
+
+
+class MilestoneSchedule(ndb.Model):
+  """The final schedule of a past milestone.  Key is the milestone number."""
+  schedule = ndb.JsonProperty(required=True)
+  fetched_on = ndb.DateTimeProperty(auto_now_add=True)
+
+
+# Final schedules that this instance has already loaded.
+_final_schedules: dict[int, Schedule] = {}
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def cache_key(milestone: int) -> str:
+  return 'chromerelease|%s' % milestone
+
+
+def placeholder(milestone: int) -> Schedule:
+  """Return the schedule used when chromiumdash has no data."""
+  return {
+      'stable_date': None,
+      'earliest_beta': None,
+      'latest_beta': None,
+      'mstone': milestone,
+      'version': milestone,
+  }
+
+
+def is_final(schedule: Schedule, now: Optional[datetime] = None) -> bool:
+  """Return True if the schedule of this milestone will not change."""
+  stable_date_str = schedule.get('stable_date')
+  if not stable_date_str:
+    return False
+  try:
+    stable_date = datetime.strptime(
+        stable_date_str, utils.CHROMIUM_SCHEDULE_DATE_FORMAT)
+  except ValueError:
+    return False
+  now = now or datetime.now()
+  return stable_date + FINAL_AFTER < now
+
+
+def _get_session() -> requests.Session:
+  """Return a session that keeps connections to chromiumdash open."""
+  global _session
+  with _session_lock:
+    if _session is None:
+      adapter = requests.adapters.HTTPAdapter(
+          pool_connections=1, pool_maxsize=MAX_FETCH_WORKERS)
+      _session = requests.Session()
+      _session.mount('https://', adapter)
+    return _session
+
+
+def fetch_schedule(milestone: int) -> Optional[Schedule]:
+  """Fetch one milestone schedule from chromiumdash, or None on failure."""
+  try:
+    result = _get_session().get(
+        SCHEDULE_URL % milestone, timeout=FETCH_TIMEOUT)
+  except requests.exceptions.RequestException:
+    logging.exception('Could not fetch schedule of M%d', milestone)
+    return None
+  if result.status_code != 200:
+    return None
+  logging.info(
+      'result.content is:\n%s', result.content[:settings.MAX_LOG_LINE])
+  try:
+    result_json = json.loads(result.content)
+  except ValueError:
+    return None
+  if not result_json.get('mstones'):
+    return None
+  schedule = result_json['mstones'][0]
+  for unused_field in ('owners', 'feature_freeze', 'ldaps'):
+    schedule.pop(unused_field, None)
+  return schedule
+
+
+def _fetch_concurrently(milestones: list[int]) -> dict[int, Schedule]:
+  """Fetch the given milestones and return the ones that were found."""
+  if len(milestones) == 1:
+    fetched = [fetch_schedule(milestones[0])]
+  else:
+    num_workers = min(MAX_FETCH_WORKERS, len(milestones))
+    with futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+      fetched = list(executor.map(fetch_schedule, milestones))
+  return {m: s for m, s in zip(milestones, fetched) if s}
+
+
+def _store(schedules: dict[int, Schedule]) -> None:
+  """Persist final schedules and cache the others for a while."""
+  now = datetime.now()
+  final_entities = []
+  for milestone, schedule in schedules.items():
+    if is_final(schedule, now):
+      _final_schedules[milestone] = schedule
+      final_entities.append(MilestoneSchedule(id=milestone, schedule=schedule))
+    else:
+      rediscache.set(
+          cache_key(milestone), schedule, time=FUTURE_SCHEDULE_TTL)
+  ndb.put_multi(final_entities)
+
+
+def get_schedules(milestones: Iterable[int]) -> dict[int, Schedule]:
+  """Return the schedule of each of the given milestones.
+
+  Milestones that chromiumdash does not know about get a placeholder
+  schedule, which is not cached.  Each call returns new dicts that the
+  caller may modify.
+  """
+  milestones = list(dict.fromkeys(milestones))
+  found = {m: _final_schedules[m] for m in milestones
+           if m in _final_schedules}
+
+  missing = [m for m in milestones if m not in found]
+  if missing:
+    cached = rediscache.get_multi([cache_key(m) for m in missing]) or {}
+    from_redis = {m: cached[cache_key(m)] for m in missing
+                  if cached.get(cache_key(m))}
+    # A cached schedule may have become final since it was cached.
+    _store({m: s for m, s in from_redis.items() if is_final(s)})
+    found.update(from_redis)
+
+  missing = [m for m in milestones if m not in found]
+  if missing:
+    entities = ndb.get_multi(
+        [ndb.Key(MilestoneSchedule, m) for m in missing])
+    for entity in entities:
+      if entity:
+        milestone = entity.key.integer_id()
+        _final_schedules[milestone] = entity.schedule
+        found[milestone] = entity.schedule
+
+  missing = [m for m in milestones if m not in found]
+  if missing:
+    logging.info('fetching schedules of milestones %r', missing)
+    fetched = _fetch_concurrently(missing)
+    _store(fetched)
+    found.update(fetched)
+
+  return {m: dict(found[m]) if m in found else placeholder(m)
+          for m in milestones}
+
+
+def get_schedule(milestone: int) -> Schedule:
+  """Return the schedule of one milestone."""
+  return get_schedules([milestone])[milestone]
@@ -0,0 +1,95 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from datetime import datetime
+from unittest import mock
+
+from framework import rediscache
+from internals import schedule_store
+
+PAST = {'mstone': 100, 'stable_date': '2022-05-24T00:00:00'}
+FUTURE = {'mstone': 200, 'stable_date': '2030-01-01T00:00:00'}
+
+
+class ScheduleStoreTest(testing_config.CustomTestCase):
+
+  def tearDown(self):
+    rediscache.flushall()
+    schedule_store._final_schedules.clear()
+    for entity in schedule_store.MilestoneSchedule.query():
+      entity.key.delete()
+
+  def test_is_final(self):
+    """Only milestones that were stable a while ago have final schedules."""
+    now = datetime(2024, 1, 1)
+    self.assertTrue(schedule_store.is_final(PAST, now))
+    self.assertFalse(schedule_store.is_final(FUTURE, now))
+    self.assertFalse(schedule_store.is_final(
+        {'stable_date': '2023-12-20T00:00:00'}, now))
+    self.assertFalse(schedule_store.is_final({'stable_date': None}, now))
+    self.assertFalse(schedule_store.is_final({'stable_date': 'soon'}, now))
+
+  @mock.patch('internals.schedule_store.fetch_schedule')
+  def test_get_schedules__fetches_missing(self, mock_fetch):
+    """Milestones are fetched once, and unknown ones get a placeholder."""
+    mock_fetch.side_effect = lambda m: {100: PAST, 200: FUTURE}.get(m)
+
+    actual = schedule_store.get_schedules([100, 200, 300])
+    self.assertEqual(PAST, actual[100])
+    self.assertEqual(FUTURE, actual[200])
+    self.assertEqual(schedule_store.placeholder(300), actual[300])
+    self.assertCountEqual(
+        [100, 200, 300], [c.args[0] for c in mock_fetch.call_args_list])
+
+    # Past milestones are stored permanently, later ones are cached.
+    self.assertEqual(
+        PAST, schedule_store.MilestoneSchedule.get_by_id(100).schedule)
+    self.assertIsNone(schedule_store.MilestoneSchedule.get_by_id(200))
+    self.assertEqual(
+        FUTURE, rediscache.get(schedule_store.cache_key(200)))
+
+    mock_fetch.reset_mock()
+    actual = schedule_store.get_schedules(range(100, 101))
+    self.assertEqual({100: PAST}, actual)
+    actual = schedule_store.get_schedules([200])
+    self.assertEqual({200: FUTURE}, actual)
+    mock_fetch.assert_not_called()
+
+  @mock.patch('internals.schedule_store.fetch_schedule')
+  def test_get_schedules__loads_final_from_datastore(self, mock_fetch):
+    """Final schedules survive a flushed cache and a new instance."""
+    schedule_store.MilestoneSchedule(id=100, schedule=PAST).put()
+    actual = schedule_store.get_schedule(100)
+    self.assertEqual(PAST, actual)
+    mock_fetch.assert_not_called()
+
+  @mock.patch('internals.schedule_store.fetch_schedule')
+  def test_get_schedules__copies(self, mock_fetch):
+    """Callers can modify the returned dicts without changing the store."""
+    mock_fetch.return_value = PAST
+    schedule_store.get_schedule(100)['version'] = 100
+    self.assertNotIn('version', schedule_store.get_schedule(100))
+
+  @mock.patch('requests.Session.get')
+  def test_fetch_schedule(self, mock_get):
+    """We keep the fields that we use from chromiumdash."""
+    mock_get.return_value = testing_config.Blank(
+        status_code=200,
+        content='{"mstones": [{"mstone": 100, "owners": "x", "ldaps": "y"}]}')
+    self.assertEqual({'mstone': 100}, schedule_store.fetch_schedule(100))
+
+    mock_get.return_value = testing_config.Blank(status_code=500, content='')
+    self.assertIsNone(schedule_store.fetch_schedule(100))
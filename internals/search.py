@@ -13,12 +13,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import base64
+import binascii
 import dataclasses
 import datetime
+import json
 import logging
 import re
-from typing import Any, Optional, Self, Union
+from typing import Any, Optional, Self, Union, cast
 
+from google.cloud import ndb  # type: ignore
 from google.cloud.ndb import Key
 from google.cloud.ndb.tasklets import Future  # for type checking only
 
@@ -29,13 +33,17 @@ from internals import (
   feature_helpers,
   fetchchannels,
   notifier,
+  search_cache,
+  search_facets,
   search_fulltext,
+  search_parser,
+  search_planner,
   search_queries,
+  search_trace,
 )
 from internals.core_models import FeatureEntry
 from internals.review_models import (Gate, Vote)
 
-MAX_TERMS = 6
 DEFAULT_RESULTS_PER_PAGE = 100
 
 
@@ -75,14 +83,13 @@ def process_pending_approval_me_query() -> list[int] | Future:
   return future_feature_ids
 
 
-def process_starred_me_query() -> list[int]:
-  """Return a list of features starred by the current user."""
+def process_starred_me_query() -> list[int] | Future:
+  """Return a future for features starred by the current user."""
   user = users.get_current_user()
   if not user:
     return []
 
-  feature_ids = notifier.FeatureStar.get_user_stars(user.email())
-  return feature_ids
+  return notifier.FeatureStar.get_user_stars_async(user.email())
 
 
 def process_recent_reviews_query() -> list[int] | Future:
@@ -102,12 +109,13 @@ class QueryContext:
   @classmethod
   def current(cls) -> Self:
     """Computes the "current" QueryContext based on ambient information."""
-    current_stable = None
+    current_stable = 0
     for version in fetchchannels.get_omaha_data()[0]['versions']:
       if version['channel'] == 'stable':
         current_stable = int(version['version'].split('.')[0])
         break
-    assert current_stable is not None
+    if not current_stable:
+      logging.warning('The current stable milestone is unknown')
     return cls(now=datetime.datetime.now(), current_stable_milestone=current_stable)
 
 
@@ -186,38 +194,47 @@ def parse_query_value_list(
   return [parse_query_value_interval(part, context) for part in vals_str.split(',')]
 
 
-# A full-text query term consisting of a single word or quoted string.
-# The single word case cannot contain an operator.
-# We do not support any kind of escaped quotes in quoted strings.
-TEXT_PATTERN = r'[^":=><! ]+|"[^"]+"'
-# The JSON field name of a feature field.
-FIELD_NAME_PATTERN = r'[-.a-z_0-9]+'
-# Comparison operators.
-OPERATORS_PATTERN = r':|=|<=|<|>=|>|!='
-# A value that a feature field can be compared against.  It can be
-# a single word or a quoted string.
-VALUE_PATTERN = r'(?:[^", .]|\.[^", .])+|"[^"]+"'
-VALUES_PATTERN = (
-  rf'(?:{VALUE_PATTERN})(?:\.\.(?:{VALUE_PATTERN})|(?:,(?:{VALUE_PATTERN}))*)'
-)
-# Logical operators.
-LOGICAL_OPERATORS_PATTERN = r'OR\s+|-'
-
-# Overall, a query term can be either a structured term or a full-text term.
-# Structured terms look like: FIELD OPERATOR VALUE.
-# Full-text terms look like: SINGLE_WORD, or like: "QUOTED STRING".
-TERM_RE = re.compile(
-    '(?P<logical>%s)?(?:(?P<field>%s)(?P<op>%s)(?P<val>%s)|(?P<textterm>%s))\s+' % (
-        LOGICAL_OPERATORS_PATTERN, FIELD_NAME_PATTERN, OPERATORS_PATTERN,
-        VALUES_PATTERN, TEXT_PATTERN),
-    re.I)
-
 SIMPLE_QUERY_TERMS = [
     'deleted_unlisted=false', 'deleted_unlisted_enterprise=false',
     'pending-approval-by:me', 'starred-by:me',
     'is:recently-reviewed', 'owner:me', 'editor:me', 'can_edit:me', 'cc:me']
 
 
+ME_QUERY_TERMS = [term for term in SIMPLE_QUERY_TERMS if term.endswith(':me')]
+
+
+def make_search_cache_key(
+    node: Optional[search_parser.Node], sort_spec: str, show_unlisted: bool, show_deleted: bool,
+    show_enterprise: bool, context: QueryContext) -> str:
+  """Return the search_cache key for the given search.
+
+  Results of searches with :me terms are cached per user, while other
+  searches are shared by everyone who can see the same set of features.
+  """
+  user_key = 'shared'
+  uses_now = False
+  uses_stars = False
+  for _, field_name, op_str, vals_str, _ in search_parser.leaves(node):
+    term = field_name + op_str + vals_str
+    if term in ME_QUERY_TERMS:
+      user = users.get_current_user()
+      user_key = user.email() if user else 'anon'
+      uses_stars = uses_stars or term == 'starred-by:me'
+    if NOW_RELATIVE_DATE.search(vals_str):
+      uses_now = True
+
+  # Starring does not put the feature, so it does not bump the search
+  # generation.  Instead, it changes the user's star version.
+  if uses_stars and user_key != 'anon':
+    user_key += '|' + notifier.get_star_version(user_key)
+
+  return search_cache.make_key(
+      search_parser.canonicalize(node), sort_spec,
+      [show_unlisted, show_deleted, show_enterprise], user_key,
+      context.current_stable_milestone,
+      context.now.strftime('%Y-%m-%dT%H:%M') if uses_now else None)
+
+
 def process_query_term(
   is_negation: bool, field_name: str, op_str: str, vals_str: str, context: QueryContext
 ) -> Future:
@@ -281,6 +298,10 @@ def _resolve_promise_to_id_list(
     if key_or_projection_list and isinstance(key_or_projection_list[0], Key):
       id_list = [k.integer_id() for k in key_or_projection_list]
       logging.info('got key future that yielded %r', id_list)
+    elif key_or_projection_list and isinstance(key_or_projection_list[0], int):
+      # Tasklets such as full-text search yield the IDs themselves.
+      id_list = key_or_projection_list
+      logging.info('got ID future that yielded %r', id_list)
     else:
       id_list = [proj.feature_id for proj in key_or_projection_list]
       logging.info('got projection future that yielded %r', id_list)
@@ -311,6 +332,102 @@ def _sort_by_total_order(
   return sorted_id_list
 
 
+@dataclasses.dataclass
+class SearchPage:
+  """One page of search results and the cursor for the next page."""
+  features: list[dict[str, Any]]
+  total_count: int
+  next_cursor: Optional[str] = None
+  # True if total_count is only a lower bound on the number of results.
+  is_estimate: bool = False
+  # {field: [{value, label, count}, ...]} over all results, if requested.
+  facet_counts: Optional[dict[str, list[dict[str, Any]]]] = None
+
+
+@dataclasses.dataclass
+class SearchCursor:
+  """Where a page of search results left off.
+
+  snapshot_id identifies the cached result list that the page was sliced
+  from, and position and last_id are the sort key of the last row on the
+  page.  Pages read directly from the datastore index carry the index
+  cursor instead.
+  """
+  snapshot_id: Optional[str] = None
+  position: int = 0
+  last_id: Optional[int] = None
+  index_cursor: Optional[str] = None
+
+  def encode(self) -> str:
+    json_str = json.dumps(dataclasses.astuple(self), separators=(',', ':'))
+    return base64.urlsafe_b64encode(json_str.encode()).decode()
+
+  @classmethod
+  def decode(cls, cursor_str: str) -> Self:
+    """Parse a cursor string, raising ValueError if it is not valid."""
+    try:
+      fields = json.loads(base64.urlsafe_b64decode(cursor_str.encode()))
+      return cls(*fields)
+    except (TypeError, binascii.Error, UnicodeError) as err:
+      raise ValueError('Invalid search cursor') from err
+
+
+def _resume_position(sorted_id_list: list[int], cursor: SearchCursor) -> int:
+  """Return the index of the first row after the cursor.
+
+  If the result list has changed since the cursor was made, continue after
+  the row that was last shown, or at the same position if it is gone.
+  """
+  if cursor.last_id is None:
+    return cursor.position
+  prev = cursor.position - 1
+  if 0 <= prev < len(sorted_id_list) and sorted_id_list[prev] == cursor.last_id:
+    return cursor.position
+  try:
+    return sorted_id_list.index(cursor.last_id) + 1
+  except ValueError:
+    return cursor.position
+
+
+def _is_visible(
+    fe: FeatureEntry, show_unlisted: bool, show_deleted: bool,
+    show_enterprise: bool) -> bool:
+  """Apply the same scope that the permission terms apply."""
+  if fe.deleted and not show_deleted:
+    return False
+  if fe.unlisted and not show_unlisted:
+    return False
+  if (not show_enterprise and
+      (fe.feature_type or 0) > core_enums.FEATURE_TYPE_DEPRECATION_ID):
+    return False
+  return True
+
+
+def _fetch_index_ordered_page(
+    order, show_unlisted: bool, show_deleted: bool, show_enterprise: bool,
+    num: int, cursor: SearchCursor) -> tuple[list[int], SearchCursor, bool]:
+  """Read feature IDs in index order, stopping once the page is full."""
+  query = FeatureEntry.query().order(order)
+  index_cursor = (
+      ndb.Cursor(urlsafe=cursor.index_cursor) if cursor.index_cursor else None)
+  ids: list[int] = []
+  more = True
+  while more and len(ids) < num:
+    # Never read more than the page still needs, so that the index cursor
+    # does not skip past visible features that did not fit on this page.
+    features, index_cursor, more = query.fetch_page(
+        num - len(ids), start_cursor=index_cursor)
+    ids.extend(
+        fe.key.integer_id() for fe in features
+        if _is_visible(fe, show_unlisted, show_deleted, show_enterprise))
+
+  next_cursor = SearchCursor(
+      position=cursor.position + len(ids),
+      last_id=ids[-1] if ids else cursor.last_id,
+      index_cursor=index_cursor.urlsafe().decode() if index_cursor else None)
+  return ids, next_cursor, more
+
+
 def process_query(
   user_query: str,
   sort_spec: str | None = None,
@@ -321,12 +438,41 @@ def process_query(
   num=DEFAULT_RESULTS_PER_PAGE,
   context: Optional[QueryContext] = None,
 ) -> tuple[list[dict[str, Any]], int]:
+  """Parse the user's query, run it, and return a list of features."""
+  page = process_query_page(
+      user_query, sort_spec=sort_spec, show_unlisted=show_unlisted,
+      show_deleted=show_deleted, show_enterprise=show_enterprise,
+      start=start, num=num, context=context)
+  return page.features, page.total_count
+
+
+def process_query_page(
+  user_query: str,
+  sort_spec: str | None = None,
+  show_unlisted=False,
+  show_deleted=False,
+  show_enterprise=False,
+  start=0,
+  num=DEFAULT_RESULTS_PER_PAGE,
+  context: Optional[QueryContext] = None,
+  cursor: Optional[str] = None,
+  estimate_count=False,
+  facets: Optional[list[str]] = None,
+) -> SearchPage:
+  """Return one page of results, starting at start or after cursor.
+
+  When estimate_count is set and the query only lists features in an
+  indexed order, the page is read straight from the index and reading
+  stops as soon as it is full.  Then total_count is only a lower bound.
+
+  If facets lists search_facets.FACET_FIELDS, the page also counts all
+  results by each value of those fields.
+  """
+  # 1a. Parse the user query into a tree of terms.
+  node = search_parser.parse_query(user_query)
   if context is None:
     context = QueryContext.current()
-
-  """Parse the user's query, run it, and return a list of features."""
-  # 1a. Parse the user query into terms.
-  terms = TERM_RE.findall(user_query + ' ')[:MAX_TERMS] or []
+  search_cursor = SearchCursor.decode(cursor) if cursor else None
 
   # 1b. Add permission and search scope terms.
   permission_terms = []
@@ -350,55 +496,325 @@ def process_query(
   # 1c. Parse the sort directive.
   sort_spec = sort_spec or '-created.when'
 
-  # 2a. Create parallel queries for each term.  Each yields a future.
-  logging.info('creating parallel queries for %r', terms)
-  feature_id_future_ops = create_future_operations_from_queries(terms, context)
+  # 1d. A query with no terms is just the features in sort order.  If the
+  # caller does not need an exact count, page through the index directly.
+  index_order = search_queries.index_sort_order(sort_spec)
+  if (estimate_count and node is None and not facets and
+      index_order is not None and
+      (search_cursor is None or search_cursor.snapshot_id is None)):
+    if search_cursor is None:
+      search_cursor = SearchCursor(position=0)
+      if start:
+        # Skip the first start rows, which could not be shown anyway.
+        _, search_cursor, _ = _fetch_index_ordered_page(
+            index_order, show_unlisted, show_deleted, show_enterprise,
+            start, search_cursor)
+    page_ids, index_cursor, more = _fetch_index_ordered_page(
+        index_order, show_unlisted, show_deleted, show_enterprise,
+        num, search_cursor)
+    logging.info('read %r result IDs in index order', len(page_ids))
+    return SearchPage(
+        features=feature_helpers.get_by_ids(page_ids),
+        total_count=index_cursor.position + (1 if more else 0),
+        next_cursor=index_cursor.encode() if more else None,
+        is_estimate=more)
+
+  # 1e. Identical searches are common, so reuse the sorted IDs of an
+  # earlier one if nothing has been edited since then.
+  cache_key = make_search_cache_key(
+      node, sort_spec, show_unlisted, show_deleted, show_enterprise, context)
+  sorted_id_list = search_cache.get(cache_key)
+  if sorted_id_list is None:
+    trace = search_trace.SearchTrace()
+    sorted_id_list = _run_query(
+        node, permission_terms, sort_spec, context,
+        show_unlisted=show_unlisted, show_deleted=show_deleted,
+        show_enterprise=show_enterprise, trace=trace)
+    trace.log()
+    search_cache.set(cache_key, sorted_id_list)
+  else:
+    logging.info('using %r cached result IDs', len(sorted_id_list))
+  total_count = len(sorted_id_list)
 
-  # 2b. Create parallel queries for each permission queries.
-  logging.info('creating parallel queries for %r', permission_terms)
-  permissions_future_ops = create_future_operations_from_queries(
-    permission_terms, context
-  )
+  # 5. Paginate
+  if search_cursor:
+    if search_cursor.snapshot_id != cache_key:
+      logging.info('result set changed since the cursor was made')
+    start = _resume_position(sorted_id_list, search_cursor)
+  paginated_id_list = sorted_id_list[start : start + num]
+  next_cursor: Optional[str] = None
+  if start + num < total_count and paginated_id_list:
+    next_cursor = SearchCursor(
+        snapshot_id=cache_key, position=start + len(paginated_id_list),
+        last_id=paginated_id_list[-1]).encode()
 
-  # 2c. Create a parallel query for total sort order.
-  logging.info('creating total sort order for %r', sort_spec)
-  total_order_promise = search_queries.total_order_query_async(sort_spec)
+  # 6. Fetch the actual issues that have those IDs in the sorted results.
+  # TODO(jrobbins): This still returns Feature dicts.
+  features_on_page = feature_helpers.get_by_ids(paginated_id_list)
 
-  # 3. Get the result of each future and combine them into a result ID set.
-  logging.info('now waiting on futures')
+  logging.info('features_on_page is %r',
+               [f['name'] for f in features_on_page])
 
-  # 3a. Process user query: negation, AND, and OR.
-  feature_id_future_ops = process_negation_operations(feature_id_future_ops)
-  query_clauses = process_and_operations(feature_id_future_ops)
-  result_id_set = process_or_operations(query_clauses)
-  logging.info('got %r result IDs w/o permissions', len(result_id_set))
+  # 7. Count all results by the requested facet fields.
+  facet_counts = None
+  if facets:
+    facet_counts = search_facets.count_facets(facets, sorted_id_list)
+  return SearchPage(
+      features_on_page, total_count, next_cursor=next_cursor,
+      facet_counts=facet_counts)
+
+
+def _term_kind(term) -> str:
+  """Return the search_planner kind of a parsed term."""
+  _, field_name, op_str, vals_str, textterm = term
+  if textterm:
+    return search_planner.KIND_TEXT
+  if field_name + op_str + vals_str in ME_QUERY_TERMS:
+    return search_planner.KIND_ME
+  if is_predefined_query_term(field_name, op_str, vals_str):
+    return search_planner.KIND_PREDEFINED
+  return search_planner.KIND_FIELD
+
+
+def _make_term_matcher(term, context: QueryContext):
+  """Return a function to check a field term in memory, or None."""
+  logical_op, field_name, op_str, vals_str, textterm = term
+  if textterm or is_predefined_query_term(field_name, op_str, vals_str):
+    return None
+  if logical_op.strip() == '-':
+    op_str = search_queries.negate_operator(op_str)
+  val_list = parse_query_value_list(vals_str, context)
+  return search_queries.single_field_matcher(field_name, op_str, val_list)
 
-  # 3b. Process all permission ops, then interesect to apply permisisons.
-  permission_clauses = process_and_operations(permissions_future_ops)
-  permission_ids = process_or_operations(permission_clauses)
-  result_id_set.intersection_update(permission_ids)
-  logging.info('got %r result IDs with permissions', len(result_id_set))
+
+def _record_term_counts(term_ops) -> None:
+  """Save the number of results of each term for future planning."""
+  for term, ops in term_ops:
+    if len(ops) != 1 or ops[0][0] == '-':
+      continue
+    search_planner.record(term, len(_resolve_promise_to_id_list(ops[0][1])))
+
+
+class _TreeEvaluator:
+  """Run the terms of a query tree and combine their results bottom-up."""
+
+  def __init__(
+      self, context: QueryContext, trace: search_trace.SearchTrace):
+    self.context = context
+    self.trace = trace
+    self.leaf_ops: dict[int, list] = {}
+    self._all_ids_future: Optional[Future] = None
+    self._all_ids: Optional[set[int]] = None
+
+  def prefetch_all_ids(self) -> None:
+    """Start reading all feature IDs, which NOT and '-' terms need."""
+    if self._all_ids_future is None:
+      self._all_ids_future = self.trace.track(
+          'all feature IDs', fetch_all_feature_ids_async())
+
+  def all_ids(self) -> set[int]:
+    if self._all_ids is None:
+      self.prefetch_all_ids()
+      self._all_ids = set(
+          _resolve_promise_to_id_list(self._all_ids_future))
+    return self._all_ids
+
+  def launch(self, terms: list[search_parser.Term]) -> None:
+    """Start a query for each term so that they all run in parallel."""
+    for term in terms:
+      ops = create_future_operations_from_queries([term], self.context)
+      for logical_op, future in ops:
+        self.trace.track(search_planner.term_signature(term), future)
+        if logical_op == '-':
+          self.prefetch_all_ids()
+      self.leaf_ops[id(term)] = ops
+
+  def record_counts(self, terms: list[search_parser.Term]) -> None:
+    _record_term_counts([(term, self.leaf_ops[id(term)]) for term in terms])
+
+  def evaluate(self, node: search_parser.Node) -> Optional[set[int]]:
+    """Return the IDs that match node, or None if it has no conditions."""
+    if isinstance(node, search_parser.Term):
+      ops = self.leaf_ops[id(node)]
+      if not ops:
+        return None
+      logical_op, future = ops[0]
+      feature_ids = _resolve_promise_to_id_list(future)
+      if logical_op == '-':
+        return self.all_ids().difference(feature_ids)
+      return set(feature_ids)
+
+    if isinstance(node, search_parser.Not):
+      child_ids = self.evaluate(node.child)
+      if child_ids is None:
+        return None
+      return self.all_ids().difference(child_ids)
+
+    child_id_sets = [
+        id_set for id_set in (self.evaluate(child) for child in node.children)
+        if id_set is not None]
+    if not child_id_sets:
+      return None
+    result_id_set = set(child_id_sets[0])
+    for id_set in child_id_sets[1:]:
+      if isinstance(node, search_parser.And):
+        result_id_set.intersection_update(id_set)
+      else:
+        result_id_set.update(id_set)
+    return result_id_set
+
+
+def _has_not(node: search_parser.Node) -> bool:
+  if isinstance(node, search_parser.Not):
+    return True
+  if isinstance(node, search_parser.Term):
+    return False
+  return any(_has_not(child) for child in node.children)
+
+
+def _and_clause_terms(
+    node: Optional[search_parser.Node]) -> Optional[list[search_parser.Term]]:
+  """Return the terms of a query that is one AND clause, otherwise None."""
+  if isinstance(node, search_parser.Term):
+    return [node]
+  if (isinstance(node, search_parser.And) and
+      all(isinstance(child, search_parser.Term) for child in node.children)):
+    return cast(list[search_parser.Term], list(node.children))
+  return None
+
+
+def _run_restricted(
+    plan: search_planner.Plan, context: QueryContext, show_unlisted: bool,
+    show_deleted: bool, show_enterprise: bool,
+    trace: search_trace.SearchTrace) -> Optional[set[int]]:
+  """Run the first term of the plan and check the others on its results.
+
+  Returns None if the first term matched too many features to check the
+  others in memory.
+  """
+  evaluator = _TreeEvaluator(context, trace)
+  evaluator.launch([plan.first])
+  candidate_ids = evaluator.evaluate(plan.first)
+  if candidate_ids is None:
+    return None
+  evaluator.record_counts([plan.first])
+  logging.info('plan: first term yields %r candidates', len(candidate_ids))
+  if len(candidate_ids) > search_planner.RESTRICT_LIMIT:
+    logging.info('plan: too many candidates to restrict other terms')
+    return None
+  if not candidate_ids:
+    return candidate_ids
+
+  # Permissions and the supported field terms are checked on the
+  # candidate entities instead of by scanning the whole index.
+  candidates_future = trace.track(
+      'candidate entities',
+      feature_helpers.get_entries_by_id_async(list(candidate_ids)))
+  candidates = [
+      fe for fe in candidates_future.result()
+      if _is_visible(fe, show_unlisted, show_deleted, show_enterprise)]
+  queried_terms = []
+  for term in plan.rest:
+    matcher = _make_term_matcher(term, context)
+    if matcher:
+      candidates = [fe for fe in candidates if matcher(fe)]
+    else:
+      queried_terms.append(term)
+  result_id_set = {fe.key.integer_id() for fe in candidates}
+  logging.info(
+      'plan: %r candidates left after in-memory checks, %r terms to query',
+      len(result_id_set), len(queried_terms))
+
+  if queried_terms and result_id_set:
+    evaluator.launch(queried_terms)
+    for term in queried_terms:
+      term_ids = evaluator.evaluate(term)
+      if term_ids is not None:
+        result_id_set.intersection_update(term_ids)
+  return result_id_set
+
+
+def _run_query(
+    node: Optional[search_parser.Node], permission_terms, sort_spec: str,
+    context: QueryContext, show_unlisted=False, show_deleted=False,
+    show_enterprise=False,
+    trace: Optional[search_trace.SearchTrace] = None) -> list[int]:
+  """Run the queries for all terms and return the sorted result IDs."""
+  if trace is None:
+    trace = search_trace.SearchTrace()
+  # 2a. Create a parallel query for total sort order.
+  logging.info('creating total sort order for %r', sort_spec)
+  total_order_promise = trace.track(
+      'total order', search_queries.total_order_query_async(sort_spec))
+
+  # 2b. If the query is one AND clause and one of its terms is expected to
+  # match few features, run that term first and restrict the other terms
+  # and the permissions to its results.
+  result_id_set = None
+  clause_terms = _and_clause_terms(node)
+  if clause_terms:
+    plan = search_planner.make_plan(
+        clause_terms, [_term_kind(t) for t in clause_terms])
+    if plan:
+      result_id_set = _run_restricted(
+          plan, context, show_unlisted, show_deleted, show_enterprise, trace)
+
+  if result_id_set is None:
+    result_id_set = _run_in_parallel(node, permission_terms, context, trace)
 
   result_id_list = list(result_id_set)
-  total_count = len(result_id_list)
 
   # 4. Finish getting the total sort order. Then, sort the IDs according
   # to their position in the complete sorted list.
   total_order_ids = _resolve_promise_to_id_list(total_order_promise)
   logging.info('sorting')
-  sorted_id_list = _sort_by_total_order(result_id_list, total_order_ids)
+  with trace.step('sort'):
+    sorted_id_list = _sort_by_total_order(result_id_list, total_order_ids)
   logging.info('sorted %r result IDs', len(sorted_id_list))
+  return sorted_id_list
 
-  # 5. Paginate
-  paginated_id_list = sorted_id_list[start : start + num]
 
-  # 6. Fetch the actual issues that have those IDs in the sorted results.
-  # TODO(jrobbins): This still returns Feature dicts.
-  features_on_page = feature_helpers.get_by_ids(paginated_id_list)
+def _run_in_parallel(
+    node: Optional[search_parser.Node], permission_terms,
+    context: QueryContext, trace: search_trace.SearchTrace) -> set[int]:
+  """Run every term and permission term at once and combine the results."""
+  # 2c. Create parallel queries for each term in the tree.  Each yields
+  # a future.
+  terms = search_parser.leaves(node)
+  logging.info('creating parallel queries for %r', terms)
+  evaluator = _TreeEvaluator(context, trace)
+  evaluator.launch(terms)
+  if node is None or _has_not(node):
+    evaluator.prefetch_all_ids()
 
-  logging.info('features_on_page is %r',
-               [f['name'] for f in features_on_page])
-  return features_on_page, total_count
+  # 2d. Create parallel queries for each permission queries.
+  logging.info('creating parallel queries for %r', permission_terms)
+  permissions_future_ops = []
+  for term in permission_terms:
+    ops = create_future_operations_from_queries([term], context)
+    for _, future in ops:
+      trace.track('permission %s%s%s' % term[1:4], future)
+    permissions_future_ops.extend(ops)
+
+  # 3. Get the result of each future and combine them into a result ID set.
+  logging.info('now waiting on futures')
+
+  # 3a. Process user query: combine the results of the terms through the
+  # NOT, AND, and OR nodes of the tree.  If there were no conditions, all
+  # features match.
+  result_id_set = None
+  if node is not None:
+    result_id_set = evaluator.evaluate(node)
+  if result_id_set is None:
+    result_id_set = set(evaluator.all_ids())
+  logging.info('got %r result IDs w/o permissions', len(result_id_set))
+  evaluator.record_counts(terms)
+
+  # 3b. Process all permission ops, then interesect to apply permisisons.
+  for _, future in permissions_future_ops:
+    result_id_set.intersection_update(_resolve_promise_to_id_list(future))
+  logging.info('got %r result IDs with permissions', len(result_id_set))
+  return result_id_set
 
 
 def create_future_operations_from_queries(terms, context: QueryContext):
@@ -408,7 +824,7 @@ def create_future_operations_from_queries(terms, context: QueryContext):
     is_negation = (logical_op.strip() == '-')
     is_normal_query = False
     if textterm:
-      future = search_fulltext.search_fulltext(textterm)
+      future = search_fulltext.search_fulltext_async(textterm)
     elif is_predefined_query_term(field_name, op_str, vals_str):
       logging.info('Running predefined query term: %r %r %r',
                    field_name, op_str, vals_str)
@@ -428,69 +844,13 @@ def create_future_operations_from_queries(terms, context: QueryContext):
   return feature_id_future_ops
 
 
-def process_or_operations(or_clauses):
-  """Process OR operations for all id sets."""
-  # If there were no conditions, all features match.
-  if not or_clauses:
-    return fetch_all_feature_ids_set()
-
-  result_id_set = set()
-  for id_set in or_clauses:
-    result_id_set.update(id_set)
-  return result_id_set
-
-
-def process_and_operations(feature_id_future_ops):
-  """ Process all AND operations in between OR clauses."""
-  or_clauses = []
-
-  current_result_set = None
-  for logical_op, future in feature_id_future_ops:
-    if logical_op == 'OR' and current_result_set is not None:
-      # Add the proceeding AND result
-      or_clauses.append(current_result_set)
-      current_result_set = None
-
-    if type(future) == set:
-      feature_ids = future
-    else:
-      feature_ids = _resolve_promise_to_id_list(future)
-
-    if current_result_set is None:
-      logging.info('first term yields %r', feature_ids)
-      current_result_set = set(feature_ids)
-      continue
-
-    logging.info('combining result so far with %r', feature_ids)
-    current_result_set.intersection_update(feature_ids)
-
-  if current_result_set is not None:
-    or_clauses.append(current_result_set)
-  return or_clauses
-
-
-def process_negation_operations(feature_id_future_ops):
-  """ Turn all negation operations into AND operations."""
-  new_future_ops = []
-  all_ids_set = None
-  for logical_op, future in feature_id_future_ops:
-    if logical_op != '-':
-      # Skip all non-negation operations.
-      new_future_ops.append((logical_op, future))
-      continue
-
-    if all_ids_set is None:
-      all_ids_set = fetch_all_feature_ids_set()
-
-    feature_ids = _resolve_promise_to_id_list(future)
-    result_set = all_ids_set.difference(feature_ids)
-    new_future_ops.append(('', result_set))
-
-  return new_future_ops
+def fetch_all_feature_ids_async() -> Future:
+  """Return a future for the keys of all FeatureEntry entities."""
+  return FeatureEntry.query().fetch_async(keys_only=True)
 
 
 def fetch_all_feature_ids_set():
   """Fetch all FeatureEntry ids. """
-  all_feature_keys = FeatureEntry.query().fetch(keys_only=True)
+  all_feature_keys = fetch_all_feature_ids_async().result()
   feature_ids_set = set(key.integer_id() for key in all_feature_keys)
   return feature_ids_set
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache of sorted search result IDs.
+
+Search results depend on features, stages, gates, votes, and the
+full-text index.  Rather than tracking which cached searches each write
+affects, every such write starts a new feature-cache generation, and the
+generation is part of every cache key.  Entries from older generations
+are never read again and simply expire.
+"""
+
+import hashlib
+import json
+from typing import Any, Optional
+import uuid
+
+from framework import rediscache
+
+
+GENERATION_KEY = 'FeatureCacheGeneration'
+CACHE_KEY = 'FeatureSearch'
+# Entries also expire on their own, which bounds how stale the results
+# of terms that depend on the current time can get.
+SEARCH_CACHE_TTL = 5 * 60  # seconds
+
+
+def get_generation() -> str:
+  return rediscache.get(GENERATION_KEY) or '0'
+
+
+def bump_generation() -> None:
+  """Make every previously cached search result unreachable."""
+  rediscache.set(GENERATION_KEY, uuid.uuid4().hex, time=0)
+
+
+def make_key(*parts: Any) -> str:
+  """Return a cache key for a search described by JSON-serializable parts.
+
+  The generation is read here, before the search runs, so that results
+  computed while a write is happening are stored under the old generation.
+  """
+  digest = hashlib.sha1(
+      json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+  return '%s|%s|%s' % (CACHE_KEY, get_generation(), digest)
+
+
+def get(cache_key: str) -> Optional[list[int]]:
+  return rediscache.get(cache_key)
+
+
+def set(cache_key: str, sorted_ids: list[int]) -> None:
+  rediscache.set(cache_key, sorted_ids, time=SEARCH_CACHE_TTL)
@@ -0,0 +1,60 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from internals.core_models import FeatureEntry
+from internals.review_models import Gate
+from internals import search_cache
+
+
+class SearchCacheTest(testing_config.CustomTestCase):
+
+  def test_make_key__stable(self):
+    """The same parts give the same key within a generation."""
+    self.assertEqual(
+        search_cache.make_key(['owner:me'], '-created.when', 'shared'),
+        search_cache.make_key(['owner:me'], '-created.when', 'shared'))
+    self.assertNotEqual(
+        search_cache.make_key(['owner:me'], '-created.when', 'shared'),
+        search_cache.make_key(['owner:me'], 'name', 'shared'))
+
+  def test_get_set(self):
+    """We can store and read back a sorted ID list."""
+    cache_key = search_cache.make_key('test_get_set')
+    self.assertIsNone(search_cache.get(cache_key))
+    search_cache.set(cache_key, [3, 1, 2])
+    self.assertEqual([3, 1, 2], search_cache.get(cache_key))
+
+  def test_bump_generation(self):
+    """Bumping the generation changes every key."""
+    before = search_cache.make_key('test_bump_generation')
+    search_cache.bump_generation()
+    self.assertNotEqual(before, search_cache.make_key('test_bump_generation'))
+
+  def test_bump_generation__on_put(self):
+    """Writing features and gates starts a new generation."""
+    generation = search_cache.get_generation()
+    fe = FeatureEntry(name='feature a', summary='sum', category=1)
+    fe.put()
+    self.assertNotEqual(generation, search_cache.get_generation())
+
+    generation = search_cache.get_generation()
+    gate = Gate(
+        feature_id=fe.key.integer_id(), stage_id=1, gate_type=1, state=1)
+    gate.put()
+    self.assertNotEqual(generation, search_cache.get_generation())
+
+    gate.key.delete()
+    fe.key.delete()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Counts of search results for each value of a few feature fields.
+
+For each facet field we build a {value: [feature_id, ...]} index of all
+features with a projection query so that no entities are read.  Counting
+the results of a search is then a set intersection per value.  Each index
+is cached as a redis hash of the values of each feature, so when a
+FeatureEntry is put (see derived_entities), only the values of that
+feature are replaced, and only if they changed.
+"""
+
+import logging
+from typing import Any, Iterable, Optional
+
+from framework import rediscache
+from internals import core_enums, search_queries
+from internals.core_models import FeatureEntry, Stage
+
+
+# Each index is a complete hash of {feature_id: values}, see
+# rediscache.replace_complete_hash().  All of them share one version.
+CACHE_KEY = 'FeatureFacetIndex'
+VERSION_CACHE_KEY = 'FeatureFacetIndexVersion'
+FACET_INDEX_TTL = 60 * 60  # seconds
+
+# Fields with few distinct values that the feature list can filter on.
+FACET_FIELDS = [
+    'impl_status_chrome',
+    'category',
+    'feature_type',
+    'intent_stage',
+    'browsers.chrome.blink_component',
+]
+
+FacetIndex = dict[Any, list[int]]
+
+
+def cache_key(field_name: str) -> str:
+  return '%s|%s' % (CACHE_KEY, field_name)
+
+
+def parse_facets(facets_str: Optional[str]) -> list[str]:
+  """Return the requested facet fields, raising ValueError if unknown."""
+  if not facets_str:
+    return []
+  field_names = [name.strip().lower() for name in facets_str.split(',')]
+  field_names = [name for name in field_names if name]
+  for name in field_names:
+    if name not in FACET_FIELDS:
+      raise ValueError('Unknown facet field %r' % name)
+  return list(dict.fromkeys(field_names))
+
+
+def build_index(field_name: str) -> FacetIndex:
+  """Read {value: [feature_id, ...]} for one field from the datastore."""
+  prop = search_queries.QUERIABLE_FIELDS[field_name]
+  index: dict[Any, set[int]] = {}
+  # A projection on a repeated property yields one result per value.
+  for projected in FeatureEntry.query(projection=[prop]).fetch():
+    value = prop._get_value(projected)
+    values = value if prop._repeated else [value]
+    for val in values:
+      index.setdefault(val, set()).add(projected.key.integer_id())
+  return {val: sorted(ids) for val, ids in index.items()}
+
+
+def _feature_values(field_name: str, fe: Optional[FeatureEntry]) -> list:
+  """Return the values that one feature has for a facet field."""
+  if fe is None:
+    return []
+  prop = search_queries.QUERIABLE_FIELDS[field_name]
+  value = prop._get_value(fe)
+  return list(value) if prop._repeated else [value]
+
+
+def _load_cached_index(field_name: str) -> Optional[FacetIndex]:
+  fields = rediscache.get_complete_hash(cache_key(field_name))
+  if fields is None:
+    return None
+  index: FacetIndex = {}
+  for field, values in fields.items():
+    for val in values:
+      index.setdefault(val, []).append(int(field))
+  return index
+
+
+def _store_index(
+    field_name: str, index: FacetIndex, version: Optional[str]) -> None:
+  """Cache the index unless a feature was updated since version was read."""
+  values_by_feature: dict[int, list] = {}
+  for val, ids in index.items():
+    for fid in ids:
+      values_by_feature.setdefault(fid, []).append(val)
+  rediscache.replace_complete_hash(
+      cache_key(field_name), values_by_feature, VERSION_CACHE_KEY, version,
+      time=FACET_INDEX_TTL)
+
+
+def get_indexes(field_names: list[str]) -> dict[str, FacetIndex]:
+  """Return the index of each field, building any that are not cached."""
+  version = rediscache.get(VERSION_CACHE_KEY)
+  indexes: dict[str, FacetIndex] = {}
+  for name in field_names:
+    index = _load_cached_index(name)
+    if index is None:
+      logging.info('building facet index for %r', name)
+      index = build_index(name)
+      _store_index(name, index, version)
+    indexes[name] = index
+  return indexes
+
+
+def count_facets(
+    field_names: list[str],
+    feature_ids: Iterable[int]) -> dict[str, list[dict[str, Any]]]:
+  """Return {field: [{value, label, count}, ...]} over the given features.
+
+  Values that no given feature has are omitted, and the rest are listed
+  with the most common first.
+  """
+  if not field_names:
+    return {}
+  id_set = set(feature_ids)
+  result: dict[str, list[dict[str, Any]]] = {}
+  for name, index in get_indexes(field_names).items():
+    counts = []
+    for value, ids in index.items():
+      count = len(id_set.intersection(ids))
+      if count:
+        counts.append({
+            'value': value,
+            'label': core_enums.convert_enum_int_to_string(name, value),
+            'count': count,
+        })
+    counts.sort(key=lambda c: (-c['count'], str(c['label'])))
+    result[name] = counts
+  return result
+
+
+def update_feature(
+    feature_id: int, fe: Optional[FeatureEntry],
+    stages: Iterable[Stage]) -> None:
+  """Replace this feature's values in any facet index that they changed."""
+  for name in FACET_FIELDS:
+    rediscache.update_complete_hash_field(
+        cache_key(name), feature_id, _feature_values(name, fe),
+        VERSION_CACHE_KEY, time=FACET_INDEX_TTL)
@@ -0,0 +1,111 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from unittest import mock
+
+from framework import rediscache
+from internals import core_enums, search_facets
+from internals.core_models import FeatureEntry
+
+
+class SearchFacetsTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.fe_1 = FeatureEntry(
+        name='feature 1', summary='sum', category=core_enums.SECURITY,
+        blink_components=['Blink>A', 'Blink>B'])
+    self.fe_1.put()
+    self.fe_2 = FeatureEntry(
+        name='feature 2', summary='sum', category=core_enums.SECURITY,
+        blink_components=['Blink>B'])
+    self.fe_2.put()
+    self.fe_3 = FeatureEntry(
+        name='feature 3', summary='sum', category=core_enums.MISC,
+        blink_components=['Blink>A'])
+    self.fe_3.put()
+    self.ids = [fe.key.integer_id() for fe in (self.fe_1, self.fe_2, self.fe_3)]
+
+  def tearDown(self):
+    for fe in (self.fe_1, self.fe_2, self.fe_3):
+      fe.key.delete()
+    rediscache.flushall()
+
+  def test_parse_facets(self):
+    """We accept known facet fields and reject others."""
+    self.assertEqual([], search_facets.parse_facets(None))
+    self.assertEqual([], search_facets.parse_facets(''))
+    self.assertEqual(
+        ['category', 'feature_type'],
+        search_facets.parse_facets('Category, feature_type,category'))
+    with self.assertRaises(ValueError):
+      search_facets.parse_facets('category,name')
+
+  def test_build_index(self):
+    """The index lists the features that have each value."""
+    index = search_facets.build_index('browsers.chrome.blink_component')
+    self.assertCountEqual([self.ids[0], self.ids[2]], index['Blink>A'])
+    self.assertCountEqual([self.ids[0], self.ids[1]], index['Blink>B'])
+
+  def test_count_facets(self):
+    """Counts are over the given features, most common first."""
+    actual = search_facets.count_facets(
+        ['category', 'browsers.chrome.blink_component'], self.ids[1:])
+    self.assertEqual(
+        [{'value': core_enums.MISC, 'label': 'Miscellaneous', 'count': 1},
+         {'value': core_enums.SECURITY, 'label': 'Security', 'count': 1}],
+        actual['category'])
+    self.assertEqual(
+        [{'value': 'Blink>A', 'label': 'Blink>A', 'count': 1},
+         {'value': 'Blink>B', 'label': 'Blink>B', 'count': 1}],
+        actual['browsers.chrome.blink_component'])
+    self.assertEqual({}, search_facets.count_facets([], self.ids))
+
+  def test_count_facets__cached(self):
+    """The index is built once, and edits update only that feature."""
+    with mock.patch(
+        'internals.search_facets.build_index',
+        wraps=search_facets.build_index) as build:
+      search_facets.count_facets(['category'], self.ids)
+      search_facets.count_facets(['category'], self.ids)
+      self.assertEqual(1, len(build.mock_calls))
+      self.assertIsNotNone(
+          rediscache.get_hash(search_facets.cache_key('category')))
+
+      self.fe_3.category = core_enums.SECURITY
+      self.fe_3.put()
+      self.assertEqual(
+          [core_enums.SECURITY],
+          rediscache.get_hash_field(
+              search_facets.cache_key('category'), self.ids[2]))
+      actual = search_facets.count_facets(['category'], self.ids)
+      self.assertEqual(1, len(build.mock_calls))
+      self.assertEqual(
+          [{'value': core_enums.SECURITY, 'label': 'Security', 'count': 3}],
+          actual['category'])
+
+  def test_count_facets__update_during_build(self):
+    """An index built before a concurrent update is not cached."""
+    def build_and_update(field_name):
+      index = search_facets.build_index(field_name)
+      self.fe_3.category = core_enums.SECURITY
+      self.fe_3.put()
+      return index
+
+    with mock.patch(
+        'internals.search_facets.build_index', side_effect=build_and_update):
+      search_facets.count_facets(['category'], self.ids)
+    self.assertIsNone(
+        rediscache.get_hash(search_facets.cache_key('category')))
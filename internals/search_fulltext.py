@@ -22,9 +22,8 @@ from google.cloud import ndb  # type: ignore
 
 from framework.basehandlers import FlaskHandler
 from internals.core_models import FeatureEntry
-from internals.feature_helpers import (
-    get_future_results,
-    get_entries_by_id_async)
+from internals import search_cache
+from internals.feature_helpers import get_entries_by_id_async
 
 
 # We consider all words that have three or more letters.
@@ -45,6 +44,9 @@ class FeatureWords(ndb.Model):
   feature_id = ndb.IntegerProperty(required=True)
   words = ndb.StringProperty(repeated=True)
 
+  def _post_put_hook(self, future) -> None:
+    search_cache.bump_generation()
+
 
 def _get_strings_dict(fe: FeatureEntry) -> dict[str, list[str|None]]:
   return {
@@ -186,12 +188,14 @@ def canonicalize_string(s: str) -> str:
   return ' ' + canonicalized + ' '  # Avoids matching partial words.
 
 
-def post_process_phrase(
-    phrase: str, feature_ids: list[int],
-    field_name: str|None = None) -> list[int]:
+@ndb.tasklet
+def post_process_phrase_async(
+    phrase: str, feature_ids: list[int], field_name: str|None = None):
   """Fetch the given features and check if they really have the phrase.
   if field_name is specified, check only within that field."""
-  features = get_future_results(get_entries_by_id_async(feature_ids))
+  features = []
+  if feature_ids:
+    features = yield get_entries_by_id_async(feature_ids)
   canon_phrase = canonicalize_string(phrase)
   result = []
   for fe in features:
@@ -203,9 +207,32 @@ def post_process_phrase(
   return result
 
 
-def search_fulltext(
-    textterm: str, field_name: str|None = None) -> Optional[list[int]]:
-  """Return IDs of features that contain word(s) from textterm.
+def post_process_phrase(
+    phrase: str, feature_ids: list[int],
+    field_name: str|None = None) -> list[int]:
+  """Blocking version of post_process_phrase_async()."""
+  return post_process_phrase_async(
+      phrase, feature_ids, field_name=field_name).result()
+
+
+@ndb.tasklet
+def _search_words_async(
+    textterm: str, word_set: set[str], num_words: int,
+    field_name: str|None):
+  query = FeatureWords.query()
+  for search_word in word_set:
+    query = query.filter(FeatureWords.words == search_word)
+  feature_projections = yield query.fetch_async(projection=['feature_id'])
+  feature_ids = [proj.feature_id for proj in feature_projections]
+  if num_words > 1 or field_name:
+    feature_ids = yield post_process_phrase_async(
+        textterm, feature_ids, field_name=field_name)
+  return feature_ids
+
+
+def search_fulltext_async(
+    textterm: str, field_name: str|None = None) -> Optional[ndb.Future]:
+  """Return a future for IDs of features that contain word(s) from textterm.
   if field_name is specified, check only within that field."""
   word_set, num_words = parse_words([textterm])
   if not word_set:
@@ -213,15 +240,14 @@ def search_fulltext(
     return None  # user is searching for stop words.
 
   logging.info('looking for words: %r', word_set)
-  query = FeatureWords.query()
-  for search_word in word_set:
-    query = query.filter(FeatureWords.words == search_word)
-  feature_projections = query.fetch(projection=['feature_id'])
-  feature_ids = [proj.feature_id for proj in feature_projections]
-  if num_words > 1 or field_name:
-    return post_process_phrase(textterm, feature_ids, field_name=field_name)
-  else:
-    return feature_ids
+  return _search_words_async(textterm, word_set, num_words, field_name)
+
+
+def search_fulltext(
+    textterm: str, field_name: str|None = None) -> Optional[list[int]]:
+  """Blocking version of search_fulltext_async()."""
+  future = search_fulltext_async(textterm, field_name=field_name)
+  return future.result() if future else None
 
 
 class ReindexAllFeatures(FlaskHandler):
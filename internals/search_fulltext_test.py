@@ -220,7 +220,28 @@ class SearchFulltextFunctionsTest(testing_config.CustomTestCase):
     assert_found('two', field_name='cc_emails')
     assert_not_found('two', field_name='creator_email')
 
-  # TODO(jrobbins): Unit test for search_fulltext.
+  def test_search_fulltext_async(self):
+    """Word and phrase searches yield feature IDs from a future."""
+    fe = core_models.FeatureEntry(
+        name='Once upon a time', summary='rode and strode all around',
+        category=core_enums.NETWORKING)
+    fe.put()
+    search_fulltext.index_feature(fe)
+    fe_id = fe.key.integer_id()
+
+    future = search_fulltext.search_fulltext_async('strode')
+    self.assertEqual([fe_id], future.result())
+    future = search_fulltext.search_fulltext_async('"strode all around"')
+    self.assertEqual([fe_id], future.result())
+    future = search_fulltext.search_fulltext_async('"around all strode"')
+    self.assertEqual([], future.result())
+    self.assertIsNone(search_fulltext.search_fulltext_async('the'))
+    self.assertEqual([fe_id], search_fulltext.search_fulltext('strode'))
+
+    for fw in search_fulltext.FeatureWords.query():
+      fw.key.delete()
+    fe.key.delete()
+
 
   # TODO(jrobbins): Unit test for ReindexAllFeatures.
 
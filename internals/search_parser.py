@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parse feature search queries into a tree of terms.
+
+A query is a sequence of terms, which are ANDed together unless they are
+separated by OR.  AND binds more tightly than OR, and parentheses can be
+used to group terms.  A term or group can be negated with a leading "-"
+or with NOT.  For example:
+
+  owner:me (category=Security OR -browsers.chrome.status=1) NOT is:recently-reviewed
+
+Parsed queries are immutable, so they are kept in an LRU cache keyed by
+the query string.
+"""
+
+import dataclasses
+import functools
+import re
+from typing import Any, NamedTuple, Optional, Union
+
+
+# Longest query that we will run, counting terms rather than characters.
+MAX_TERMS = 20
+# Deepest nesting of parentheses and NOTs that we will parse.
+MAX_DEPTH = 10
+# Number of distinct query strings to keep parsed.
+PARSE_CACHE_SIZE = 256
+
+# A full-text query term consisting of a single word or quoted string.
+# The single word case cannot contain an operator or parenthesis.
+# We do not support any kind of escaped quotes in quoted strings.
+TEXT_PATTERN = r'[^":=><!()\s]+|"[^"]+"'
+# The JSON field name of a feature field.
+FIELD_NAME_PATTERN = r'[-.a-z_0-9]+'
+# Comparison operators.
+OPERATORS_PATTERN = r':|=|<=|<|>=|>|!='
+# A value that a feature field can be compared against.  It can be
+# a single word or a quoted string.
+VALUE_PATTERN = r'(?:[^", .()]|\.[^", .()])+|"[^"]+"'
+VALUES_PATTERN = (
+  rf'(?:{VALUE_PATTERN})(?:\.\.(?:{VALUE_PATTERN})|(?:,(?:{VALUE_PATTERN}))*)'
+)
+
+# Overall, a query term can be either a structured term or a full-text term.
+# Structured terms look like: FIELD OPERATOR VALUE.
+# Full-text terms look like: SINGLE_WORD, or like: "QUOTED STRING".
+# Anything in the query that is not a term or a parenthesis is ignored.
+TOKEN_RE = re.compile(
+    r'(?P<paren>[()])|(?P<negparen>-(?=\())|'
+    r'(?P<negation>-)?(?:(?P<field>%s)(?P<op>%s)(?P<val>%s)|(?P<textterm>%s))'
+    r'(?=[\s()]|$)' % (
+        FIELD_NAME_PATTERN, OPERATORS_PATTERN, VALUES_PATTERN, TEXT_PATTERN),
+    re.I)
+
+AND = 'AND'
+OR = 'OR'
+NOT = 'NOT'
+LPAREN = '('
+RPAREN = ')'
+
+
+class Term(NamedTuple):
+  """One search term.  logical_op is '-' if the term is negated."""
+  logical_op: str
+  field_name: str
+  op_str: str
+  vals_str: str
+  textterm: str
+
+
+@dataclasses.dataclass(frozen=True)
+class And:
+  children: tuple['Node', ...]
+
+
+@dataclasses.dataclass(frozen=True)
+class Or:
+  children: tuple['Node', ...]
+
+
+@dataclasses.dataclass(frozen=True)
+class Not:
+  child: 'Node'
+
+
+Node = Union[Term, And, Or, Not]
+Token = Union[Term, str]
+
+
+def tokenize(user_query: str) -> list[Token]:
+  """Return the terms, logical operators, and parentheses of a query."""
+  tokens: list[Token] = []
+  for m in TOKEN_RE.finditer(user_query):
+    if m.group('paren'):
+      tokens.append(m.group('paren'))
+    elif m.group('negparen'):
+      tokens.append(NOT)
+    elif m.group('textterm') and not m.group('negation'):
+      word = m.group('textterm')
+      if word.upper() == OR:
+        # OR has always been accepted in any case.
+        tokens.append(OR)
+      elif word in (AND, NOT):
+        tokens.append(word)
+      else:
+        tokens.append(Term('', '', '', '', word))
+    else:
+      tokens.append(Term(
+          m.group('negation') or '', m.group('field') or '',
+          m.group('op') or '', m.group('val') or '',
+          m.group('textterm') or ''))
+  return tokens
+
+
+class Parser:
+  """Recursive-descent parser over the tokens of one query.
+
+  query   := or_expr
+  or_expr := and_expr (OR and_expr)*
+  and_expr := unary ([AND] unary)*
+  unary   := NOT unary | '(' or_expr ')' | term
+
+  Nesting is limited to MAX_DEPTH so that long queries cannot exhaust
+  the stack.
+  """
+
+  def __init__(self, tokens: list[Token]):
+    self.tokens = tokens
+    self.pos = 0
+    self.depth = 0
+
+  def peek(self) -> Optional[Token]:
+    return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+  def take(self) -> Optional[Token]:
+    token = self.peek()
+    self.pos += 1
+    return token
+
+  def parse(self) -> Optional[Node]:
+    node = self.parse_or()
+    if self.peek() is not None:
+      raise ValueError('Unmatched ")" in query')
+    return node
+
+  def parse_or(self) -> Optional[Node]:
+    children = []
+    while True:
+      child = self.parse_and()
+      if child is not None:
+        children.append(child)
+      if self.peek() != OR:
+        break
+      self.take()
+    return _combine(Or, children)
+
+  def parse_and(self) -> Optional[Node]:
+    children = []
+    while True:
+      token = self.peek()
+      if token == AND:
+        self.take()
+        continue
+      if token is None or token in (OR, RPAREN):
+        break
+      child = self.parse_unary()
+      if child is not None:
+        children.append(child)
+    return _combine(And, children)
+
+  def parse_unary(self) -> Optional[Node]:
+    token = self.take()
+    if token in (NOT, LPAREN):
+      self.depth += 1
+      if self.depth > MAX_DEPTH:
+        raise ValueError(
+            'Queries can be nested at most %d levels deep' % MAX_DEPTH)
+      try:
+        return self.parse_nested(token)
+      finally:
+        self.depth -= 1
+    assert isinstance(token, Term)
+    return token
+
+  def parse_nested(self, token: Token) -> Optional[Node]:
+    if token == NOT:
+      if self.peek() in (None, OR, AND, RPAREN):
+        return None  # A dangling NOT is ignored.
+      child = self.parse_unary()
+      if isinstance(child, Term) and child.logical_op != '-':
+        return child._replace(logical_op='-')
+      return Not(child) if child is not None else None
+    node = self.parse_or()
+    if self.take() != RPAREN:
+      raise ValueError('Missing ")" in query')
+    return node
+
+
+def _combine(cls, children: list[Node]) -> Optional[Node]:
+  """Return one And or Or node, flattening nested nodes of the same kind."""
+  flat: list[Node] = []
+  for child in children:
+    if isinstance(child, cls):
+      flat.extend(child.children)
+    else:
+      flat.append(child)
+  if not flat:
+    return None
+  if len(flat) == 1:
+    return flat[0]
+  return cls(tuple(flat))
+
+
+def leaves(node: Optional[Node]) -> list[Term]:
+  """Return all the terms in the tree, from left to right."""
+  if node is None:
+    return []
+  if isinstance(node, Term):
+    return [node]
+  if isinstance(node, Not):
+    return leaves(node.child)
+  return [term for child in node.children for term in leaves(child)]
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_query(user_query: str) -> Optional[Node]:
+  """Return the tree for a query, or None if it has no terms.
+
+  Raises ValueError if the query cannot be run.
+  """
+  node = Parser(tokenize(user_query)).parse()
+  if len(leaves(node)) > MAX_TERMS:
+    raise ValueError('Queries can have at most %d terms' % MAX_TERMS)
+  return node
+
+
+def canonicalize(node: Optional[Node]) -> Any:
+  """Return a JSON-serializable form of the tree that ignores term order.
+
+  The children of AND and OR nodes can be reordered without changing the
+  results of the search, so they are sorted.
+  """
+  if node is None:
+    return None
+  if isinstance(node, Term):
+    return ['term', list(node)]
+  if isinstance(node, Not):
+    return ['not', canonicalize(node.child)]
+  kind = 'and' if isinstance(node, And) else 'or'
+  return [kind, sorted(
+      (canonicalize(child) for child in node.children), key=repr)]
@@ -0,0 +1,200 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from internals import search_parser
+from internals.search_parser import And, Not, Or, Term
+
+
+def term(field_name, op_str, vals_str, logical_op=''):
+  return Term(logical_op, field_name, op_str, vals_str, '')
+
+
+def text(textterm, logical_op=''):
+  return Term(logical_op, '', '', '', textterm)
+
+
+class TokenizeTest(testing_config.CustomTestCase):
+
+  def test_empty_query(self):
+    """An empty user query string should yield zero search terms."""
+    self.assertEqual([], search_parser.tokenize(''))
+    self.assertEqual([], search_parser.tokenize('   '))
+
+  def test_structured_query_terms(self):
+    """We can parse operator terms."""
+    self.assertEqual(
+        [term('field', '=', 'value')],
+        search_parser.tokenize('field=value'))
+    self.assertEqual(
+        [term('field', '>', 'value')],
+        search_parser.tokenize('field>value'))
+    self.assertEqual(
+        [term('flag_name', '=', 'version')],
+        search_parser.tokenize('flag_name=version'))
+    self.assertEqual(
+        [term('flag_name', '=', 'enable-super-stuff')],
+        search_parser.tokenize('flag_name=enable-super-stuff'))
+    self.assertEqual(
+        [term('flag_name', '=', '"enable super stuff"')],
+        search_parser.tokenize('flag_name="enable super stuff"'))
+
+  def test_structured_query_terms__complex(self):
+    """We can parse complex operator terms."""
+    self.assertEqual(
+        [term('field', '=', 'value', logical_op='-')],
+        search_parser.tokenize('-field=value'))
+    self.assertEqual(
+        ['OR', term('field', '>', 'value')],
+        search_parser.tokenize('OR field>value'))
+    self.assertEqual(
+        ['OR', term('flag_name', '=', 'enable-super-stuff')],
+        search_parser.tokenize('or flag_name=enable-super-stuff'))
+
+  def test_structured_query_terms__quick_or(self):
+    """We can parse queries that use quick-OR syntax for multiple values."""
+    self.assertEqual(
+        [term('field', '=', 'value1,value2,value3')],
+        search_parser.tokenize('field=value1,value2,value3'))
+    self.assertEqual(
+        [term('field', '=', '"enum one","enum two","enum three"')],
+        search_parser.tokenize('field="enum one","enum two","enum three"'))
+
+  def test_structured_query_terms__interval(self):
+    """We can parse queries that use interval syntax for paired inequalities."""
+    self.assertEqual(
+        [term('field', '=', '1..7')], search_parser.tokenize('field=1..7'))
+    self.assertEqual(
+        [term('field', '=', '2024-01-01..2024-04-01')],
+        search_parser.tokenize('field=2024-01-01..2024-04-01'))
+    self.assertEqual(
+        [term('field', '=', '"one".."three"')],
+        search_parser.tokenize('field="one".."three"'))
+
+  def test_text_terms(self):
+    """We can parse text terms."""
+    self.assertEqual([text('hello')], search_parser.tokenize('hello'))
+    self.assertEqual(
+        [text('"hello there people"')],
+        search_parser.tokenize('"hello there people"'))
+    self.assertEqual(
+        [text('hello', logical_op='-')],
+        search_parser.tokenize('-hello'))
+    self.assertEqual(
+        ['OR', text('"memory location $0x25"')],
+        search_parser.tokenize('OR "memory location $0x25"'))
+
+  def test_grouping(self):
+    """Parentheses and logical words are separate tokens."""
+    self.assertEqual(
+        ['NOT', '(', term('a', '=', '1'), 'AND', term('b', '=', '2'), ')'],
+        search_parser.tokenize('NOT (a=1 AND b=2)'))
+    self.assertEqual(
+        ['NOT', '(', text('hello'), ')'],
+        search_parser.tokenize('-(hello)'))
+    self.assertEqual(
+        ['(', term('a', '=', '"x (y)"'), ')'],
+        search_parser.tokenize('(a="x (y)")'))
+    # Only uppercase AND and NOT are operators.
+    self.assertEqual(
+        [text('and'), text('not')], search_parser.tokenize('and not'))
+
+  def test_malformed(self):
+    """Malformed queries are treated like full text, junk ignored."""
+    self.assertEqual([], search_parser.tokenize(':: = == := > >> >>>'))
+    self.assertEqual([text('word')], search_parser.tokenize('=word'))
+    self.assertEqual([text('1,2..3')], search_parser.tokenize('field=1,2..3'))
+    self.assertEqual(
+        [text('1..2..3')], search_parser.tokenize('field=1..2..3'))
+
+
+class ParseQueryTest(testing_config.CustomTestCase):
+
+  def test_empty(self):
+    self.assertIsNone(search_parser.parse_query(''))
+    self.assertIsNone(search_parser.parse_query('()'))
+
+  def test_and_or(self):
+    """AND binds more tightly than OR."""
+    a, b, c = term('a', '=', '1'), term('b', '=', '2'), term('c', '=', '3')
+    self.assertEqual(a, search_parser.parse_query('a=1'))
+    self.assertEqual(And((a, b)), search_parser.parse_query('a=1 b=2'))
+    self.assertEqual(And((a, b)), search_parser.parse_query('a=1 AND b=2'))
+    self.assertEqual(
+        Or((And((a, b)), c)), search_parser.parse_query('a=1 b=2 OR c=3'))
+    self.assertEqual(
+        And((a, Or((b, c)))), search_parser.parse_query('a=1 (b=2 OR c=3)'))
+    self.assertEqual(
+        Or((a, b, c)), search_parser.parse_query('a=1 OR (b=2 OR c=3)'))
+
+  def test_negation(self):
+    """Single terms are negated in place, groups are wrapped in Not."""
+    a, b = term('a', '=', '1'), term('b', '=', '2')
+    neg_a = term('a', '=', '1', logical_op='-')
+    self.assertEqual(neg_a, search_parser.parse_query('-a=1'))
+    self.assertEqual(neg_a, search_parser.parse_query('NOT a=1'))
+    self.assertEqual(Not(neg_a), search_parser.parse_query('NOT -a=1'))
+    self.assertEqual(
+        Not(Or((a, b))), search_parser.parse_query('-(a=1 OR b=2)'))
+    self.assertEqual(
+        And((b, Not(Or((a, b))))),
+        search_parser.parse_query('b=2 NOT (a=1 OR b=2)'))
+    self.assertEqual(a, search_parser.parse_query('a=1 NOT'))
+
+  def test_errors(self):
+    """Queries that cannot be run raise ValueError."""
+    with self.assertRaises(ValueError):
+      search_parser.parse_query('(a=1 OR b=2')
+    with self.assertRaises(ValueError):
+      search_parser.parse_query('a=1) OR b=2')
+    with self.assertRaises(ValueError):
+      search_parser.parse_query(
+          ' '.join('w%d' % i for i in range(search_parser.MAX_TERMS + 1)))
+
+  def test_errors__too_deep(self):
+    """Deeply nested queries raise ValueError rather than RecursionError."""
+    depth = search_parser.MAX_DEPTH
+    self.assertIsNotNone(
+        search_parser.parse_query('(' * depth + 'a=1' + ')' * depth))
+    with self.assertRaises(ValueError):
+      search_parser.parse_query('(' * 1500 + 'a=1' + ')' * 1500)
+    with self.assertRaises(ValueError):
+      search_parser.parse_query('NOT ' * 1500 + 'a=1')
+    with self.assertRaises(ValueError):
+      search_parser.parse_query('-(' * 1500 + 'a=1' + ')' * 1500)
+
+  def test_cached(self):
+    """Parsing the same query again reuses the tree."""
+    self.assertIs(
+        search_parser.parse_query('a=1 (b=2 OR c=3)'),
+        search_parser.parse_query('a=1 (b=2 OR c=3)'))
+
+  def test_leaves(self):
+    self.assertEqual([], search_parser.leaves(None))
+    self.assertEqual(
+        [term('a', '=', '1'), term('b', '=', '2'), text('x')],
+        search_parser.leaves(search_parser.parse_query('a=1 -(b=2 OR x)')))
+
+  def test_canonicalize(self):
+    """Reordering ANDed terms or ORed clauses gives the same result."""
+    def canon(user_query):
+      return search_parser.canonicalize(search_parser.parse_query(user_query))
+
+    self.assertEqual(canon('a=1 b=2'), canon('b=2 a=1'))
+    self.assertEqual(canon('a=1 b=2 OR c=3'), canon('c=3 OR b=2 a=1'))
+    self.assertNotEqual(canon('a=1 b=2'), canon('a=1 OR b=2'))
+    self.assertNotEqual(canon('a=1 b=2'), canon('a=1 -b=2'))
+    self.assertNotEqual(canon('a=1 (b=2 OR c=3)'), canon('a=1 b=2 OR c=3'))
+    self.assertIsNone(canon(''))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Decide the order in which the terms of a feature search are run.
+
+By default every term of a search, plus the permission terms, is run as
+its own datastore query in parallel, and the results are intersected.
+When a search is a single AND clause with a term that is expected to
+match few features, it is cheaper to run that term first and then check
+the other terms and the permissions against just those candidates.
+
+The expected number of matches of each term comes from the counts seen
+the last time that term was run, cached in redis, or else from a default
+for that kind of term.
+"""
+
+import dataclasses
+import logging
+from typing import Optional
+
+from framework import rediscache
+from internals.search_parser import Term
+
+
+STATS_CACHE_KEY = 'SearchTermStats'
+STATS_TTL = 24 * 60 * 60  # seconds
+
+# Kinds of search terms.
+KIND_ME = 'me'
+KIND_TEXT = 'text'
+KIND_PREDEFINED = 'predefined'
+KIND_FIELD = 'field'
+
+# Number of matches assumed for terms that have not been run recently.
+DEFAULT_ESTIMATES = {
+    KIND_ME: 50,
+    KIND_TEXT: 200,
+    KIND_PREDEFINED: 1000,
+    KIND_FIELD: 1000,
+}
+# Negated terms other than field terms are evaluated by subtracting from
+# the set of all features, so they are never cheap.
+NEGATED_ESTIMATE = 100000
+
+# A term expected to match at most this many features is run first.
+CHEAP_TERM_LIMIT = 100
+# If the first term leaves at most this many candidates, the remaining
+# terms and the permissions are checked on the candidate entities.
+RESTRICT_LIMIT = 200
+
+
+@dataclasses.dataclass
+class Plan:
+  """The term to run first and the terms to run after it."""
+  first: Term
+  rest: list[Term]
+
+
+def term_signature(term) -> str:
+  logical_op, field_name, op_str, vals_str, textterm = term
+  return '%s|%s%s%s%s' % (
+      logical_op.strip(), field_name.lower(), op_str, vals_str, textterm)
+
+
+def _stats_key(term) -> str:
+  return '%s|%s' % (STATS_CACHE_KEY, term_signature(term))
+
+
+def estimate(term, kind: str) -> int:
+  """Return the number of features that term is expected to match."""
+  if term[0].strip() == '-' and kind != KIND_FIELD:
+    return NEGATED_ESTIMATE
+  count = rediscache.get(_stats_key(term))
+  if count is not None:
+    return count
+  return DEFAULT_ESTIMATES[kind]
+
+
+def record(term, count: int) -> None:
+  """Remember how many features term matched."""
+  rediscache.set(_stats_key(term), count, time=STATS_TTL)
+
+
+def make_plan(terms: list[Term], kinds: list[str]) -> Optional[Plan]:
+  """Choose a term to run before the others, if any, and log why.
+
+  Returns None if all the terms should be run in parallel.
+  """
+  if any(term[0].strip() == 'OR' for term in terms):
+    logging.info('plan: run all terms in parallel because of OR')
+    return None
+  if not terms:
+    return None
+
+  estimates = [estimate(term, kind) for term, kind in zip(terms, kinds)]
+  cheapest = min(range(len(terms)), key=lambda i: estimates[i])
+  logging.info(
+      'plan: estimates %r',
+      [(term_signature(t), e) for t, e in zip(terms, estimates)])
+  if estimates[cheapest] > CHEAP_TERM_LIMIT:
+    logging.info('plan: run all terms in parallel, none are cheap')
+    return None
+
+  logging.info('plan: run %r first', term_signature(terms[cheapest]))
+  return Plan(terms[cheapest], terms[:cheapest] + terms[cheapest + 1:])
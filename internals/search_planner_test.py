@@ -0,0 +1,68 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from framework import rediscache
+from internals import search_planner
+from internals.search_planner import KIND_FIELD, KIND_ME, KIND_TEXT
+
+OWNER_ME = ('', 'owner', ':', 'me', '')
+CATEGORY = ('', 'category', '=', 'Security', '')
+NOT_OWNER_ME = ('-', 'owner', ':', 'me', '')
+OR_CATEGORY = ('OR ', 'category', '=', 'Misc', '')
+TEXT = ('', '', '', '', 'planner')
+
+
+class SearchPlannerTest(testing_config.CustomTestCase):
+
+  def tearDown(self):
+    for term in [OWNER_ME, CATEGORY, TEXT]:
+      rediscache.delete(search_planner._stats_key(term))
+
+  def test_estimate__defaults(self):
+    """Terms that have not been run are estimated by their kind."""
+    self.assertEqual(50, search_planner.estimate(OWNER_ME, KIND_ME))
+    self.assertEqual(1000, search_planner.estimate(CATEGORY, KIND_FIELD))
+    self.assertEqual(
+        search_planner.NEGATED_ESTIMATE,
+        search_planner.estimate(NOT_OWNER_ME, KIND_ME))
+
+  def test_estimate__recorded(self):
+    """Counts seen when a term was run are used as its estimate."""
+    search_planner.record(CATEGORY, 7)
+    self.assertEqual(7, search_planner.estimate(CATEGORY, KIND_FIELD))
+
+  def test_make_plan__cheap_first(self):
+    """The cheapest term is run first if it is cheap enough."""
+    plan = search_planner.make_plan(
+        [CATEGORY, OWNER_ME, TEXT], [KIND_FIELD, KIND_ME, KIND_TEXT])
+    self.assertEqual(OWNER_ME, plan.first)
+    self.assertEqual([CATEGORY, TEXT], plan.rest)
+
+  def test_make_plan__none_cheap(self):
+    """If every term is expected to match many features, run all at once."""
+    search_planner.record(OWNER_ME, 500)
+    plan = search_planner.make_plan(
+        [CATEGORY, OWNER_ME], [KIND_FIELD, KIND_ME])
+    self.assertIsNone(plan)
+
+  def test_make_plan__or(self):
+    """Queries with OR are always run in parallel."""
+    plan = search_planner.make_plan(
+        [OWNER_ME, OR_CATEGORY], [KIND_ME, KIND_FIELD])
+    self.assertIsNone(plan)
+
+  def test_make_plan__empty(self):
+    self.assertIsNone(search_planner.make_plan([], []))
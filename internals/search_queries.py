@@ -26,7 +26,7 @@ from framework import users
 from internals import core_enums
 from internals.core_models import FeatureEntry, Stage
 from internals.review_models import (Gate, Vote)
-from internals.search_fulltext import (search_fulltext, FULLTEXT_FIELDS)
+from internals.search_fulltext import (search_fulltext_async, FULLTEXT_FIELDS)
 
 T = TypeVar('T')
 QueryValue: TypeAlias = bool | int | str | datetime.datetime
@@ -108,7 +108,7 @@ def single_field_query_async(
   if field_name in COMPLEX_FIELDS:
     return COMPLEX_FIELDS[field_name](operator, val_list, limit)
   elif operator == ':' and field_name in FULLTEXT_FIELDS:
-    return search_fulltext(str(val_list[0]), field_name=field_name)
+    return search_fulltext_async(str(val_list[0]), field_name=field_name)
   elif field_name in QUERIABLE_FIELDS:
     # It is a query on a field in FeatureEntry.
     query = FeatureEntry.query()
@@ -152,6 +152,52 @@ def single_field_query_async(
   return future
 
 
+def single_field_matcher(
+  field_name: str,
+  operator: str,
+  val_list: list[QueryValue | Interval[QueryValue]],
+) -> Optional[Callable[[FeatureEntry], bool]]:
+  """Return a function that applies a FeatureEntry field term in memory.
+
+  This gives the same results as single_field_query_async for the
+  equality terms that it supports, and returns None for any other term.
+  """
+  field_name = field_name.lower()
+  if (operator != '=' or not val_list or val_list == [''] or
+      field_name in COMPLEX_FIELDS or field_name not in QUERIABLE_FIELDS):
+    return None
+  field = QUERIABLE_FIELDS[field_name]
+  if not field._indexed:
+    return None
+  if core_enums.is_enum_field(field_name):
+    if any(isinstance(val, Interval) for val in val_list):
+      return None
+    int_list: list[int] = [
+        core_enums.convert_enum_string_to_int(field_name, val)
+        for val in val_list]
+    if any(val < 0 for val in int_list):
+      return None
+    val_list = list(int_list)
+  validate_values(field, val_list)
+
+  def value_matches(value) -> bool:
+    for val in val_list:
+      if isinstance(val, Interval):
+        if value is not None and val.low <= value <= val.high:
+          return True
+      elif value == val:
+        return True
+    return False
+
+  def matches(fe: FeatureEntry) -> bool:
+    values = field._get_value(fe)
+    if not field._repeated:
+      values = [values]
+    return any(value_matches(value) for value in values)
+
+  return matches
+
+
 def negate_operator(operator: str) -> str:
   """Negate field operators."""
   if operator == '=':
@@ -217,6 +263,22 @@ def total_order_query_async(sort_spec: str) -> list[int] | Future:
   return keys_promise
 
 
+# Sort fields that every FeatureEntry has a value for.  Datastore leaves
+# entities without a value out of an ordered query, so only these can be
+# paged through directly from the index.
+ALWAYS_SET_SORT_FIELDS = ['created.when', 'updated.when']
+
+
+def index_sort_order(sort_spec: str) -> Optional[Property]:
+  """Return the order for a FeatureEntry query sorted by sort_spec, if any."""
+  descending = sort_spec.startswith('-')
+  field_name = sort_spec.lstrip('-').lower()
+  if field_name not in ALWAYS_SET_SORT_FIELDS:
+    return None
+  field: Property = SORTABLE_FIELDS[field_name]
+  return -field if descending else field
+
+
 def _sorted_by_joined_model(
     joinable_model_class: Model, condition: FilterNode, descending: bool,
     order_by: Property) -> Future:
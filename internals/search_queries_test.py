@@ -264,6 +264,34 @@ class SearchFeaturesTest(testing_config.CustomTestCase):
     actual = search_queries.single_field_query_async('zodiac', '=', ['leo'])
     self.assertCountEqual([], actual)
 
+  def test_single_field_matcher__same_as_query(self):
+    """Supported terms match the same features in memory as in a query."""
+    features = [self.feature_1, self.feature_2, self.feature_3]
+    for field_name, val_list in [
+        ('owner', ['owner@example.com']),
+        ('owner', ['owner@example.com', 'random@example.com']),
+        ('browsers.chrome.status', ['3']),
+        ('accurate_as_of', [search_queries.Interval(
+            datetime.datetime(2023, 1, 1), datetime.datetime(2023, 12, 31))]),
+        ]:
+      matcher = search_queries.single_field_matcher(field_name, '=', val_list)
+      promise = search_queries.single_field_query_async(
+          field_name, '=', val_list)
+      self.assertCountEqual(
+          [key.integer_id() for key in promise.get_result()],
+          [fe.key.integer_id() for fe in features if matcher(fe)])
+
+  def test_single_field_matcher__unsupported(self):
+    """Terms that cannot be checked in memory give None."""
+    self.assertIsNone(search_queries.single_field_matcher(
+        'accurate_as_of', '<', [datetime.datetime(2024, 1, 1)]))
+    self.assertIsNone(search_queries.single_field_matcher(
+        'browsers.chrome.desktop', '=', [100]))
+    self.assertIsNone(search_queries.single_field_matcher(
+        'any_start_milestone', '=', [100]))
+    self.assertIsNone(search_queries.single_field_matcher(
+        'zodiac', '=', ['leo']))
+
   def test_handle_me_query_async__owner_anon(self):
     """We can return a list of features owned by the user."""
     testing_config.sign_in('visitor@example.com', 111)
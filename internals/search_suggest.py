@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Prefix index for type-ahead suggestions in the feature search box.
+
+Each instance keeps a sorted array of the lowercased feature names, blink
+components, search tags, and owner emails of all listed features, and
+answers prefix lookups with a binary search.  The array is built from the
+[(kind, value), ...] rows of each feature, which are cached in a redis
+hash keyed by feature ID.  When a FeatureEntry or Stage is put (see
+derived_entities), only that feature's field of the hash is replaced and
+the version is bumped.  Each lookup reads the current version, and an
+instance that is behind reloads the hash.
+"""
+
+import bisect
+import dataclasses
+import logging
+from typing import Iterable, Optional
+
+from framework import rediscache
+from internals.core_models import FeatureEntry, Stage
+
+
+# The rows are a complete hash, see rediscache.replace_complete_hash().
+ROWS_CACHE_KEY = 'FeatureSuggestRows'
+VERSION_CACHE_KEY = 'FeatureSuggestVersion'
+# The rows are rebuilt from the datastore at least this often.
+ROWS_TTL = 60 * 60  # seconds
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+KIND_NAME = 'name'
+KIND_COMPONENT = 'blink_component'
+KIND_TAG = 'tag'
+KIND_OWNER = 'owner'
+
+# The search field that each kind of suggestion completes.
+KIND_FIELDS = {
+    KIND_NAME: 'name',
+    KIND_COMPONENT: 'browsers.chrome.blink_component',
+    KIND_TAG: 'tag',
+    KIND_OWNER: 'owner',
+}
+
+Row = tuple[str, str]  # (kind, value)
+
+
+def compute_rows(fe: Optional[FeatureEntry]) -> list[Row]:
+  """Return the values of one feature that can be suggested."""
+  if fe is None or fe.deleted or fe.unlisted:
+    return []
+  rows = [(KIND_NAME, fe.name)] if fe.name else []
+  rows.extend((KIND_COMPONENT, c) for c in fe.blink_components or [] if c)
+  rows.extend((KIND_TAG, t) for t in fe.search_tags or [] if t)
+  rows.extend((KIND_OWNER, e) for e in fe.owner_emails or [] if e)
+  return rows
+
+
+def _name_keys(name: str) -> list[str]:
+  """Feature names also match at the start of each later word."""
+  words = name.lower().split()
+  return [' '.join(words[i:]) for i in range(len(words))]
+
+
+@dataclasses.dataclass
+class Suggestion:
+  kind: str
+  value: str
+  # Number of listed features that have this value.
+  count: int
+
+  @property
+  def query(self) -> str:
+    """The search term that finds the features with this value."""
+    value = self.value
+    if any(c in value for c in ' ,()"'):
+      value = '"%s"' % value
+    return '%s=%s' % (KIND_FIELDS[self.kind], value)
+
+  def to_json(self) -> dict[str, object]:
+    return {
+        'kind': self.kind,
+        'value': self.value,
+        'count': self.count,
+        'query': self.query,
+    }
+
+
+class SuggestIndex:
+  """A sorted array of (lowercased key, suggestion) for prefix lookups."""
+
+  def __init__(self, version: Optional[str], rows_by_feature: dict[int, list[Row]]):
+    self.version = version
+    counts: dict[Row, int] = {}
+    for rows in rows_by_feature.values():
+      for row in set(rows):
+        counts[row] = counts.get(row, 0) + 1
+
+    entries: list[tuple[str, Suggestion]] = []
+    for (kind, value), count in counts.items():
+      suggestion = Suggestion(kind, value, count)
+      keys = _name_keys(value) if kind == KIND_NAME else [value.lower()]
+      entries.extend((key, suggestion) for key in keys)
+    entries.sort(key=lambda entry: (entry[0], entry[1].kind, entry[1].value))
+    self.keys = [key for key, _ in entries]
+    self.suggestions = [suggestion for _, suggestion in entries]
+
+  def lookup(self, prefix: str, num: int) -> list[Suggestion]:
+    """Return up to num suggestions whose keys start with prefix."""
+    prefix = prefix.strip().lower()
+    if not prefix:
+      return []
+    result: list[Suggestion] = []
+    seen: set[int] = set()
+    i = bisect.bisect_left(self.keys, prefix)
+    while (i < len(self.keys) and len(result) < num and
+           self.keys[i].startswith(prefix)):
+      suggestion = self.suggestions[i]
+      # A name can match at more than one of its words.
+      if id(suggestion) not in seen:
+        seen.add(id(suggestion))
+        result.append(suggestion)
+      i += 1
+    return result
+
+
+_index: Optional[SuggestIndex] = None
+
+
+def _load_all_rows() -> dict[int, list[Row]]:
+  rows_by_feature: dict[int, list[Row]] = {}
+  query = FeatureEntry.query(
+      FeatureEntry.deleted == False, FeatureEntry.unlisted == False)
+  for fe in query:
+    rows = compute_rows(fe)
+    if rows:
+      rows_by_feature[fe.key.integer_id()] = rows
+  return rows_by_feature
+
+
+def _load_cached_rows() -> Optional[dict[int, list[Row]]]:
+  fields = rediscache.get_complete_hash(ROWS_CACHE_KEY)
+  if fields is None:
+    return None
+  return {int(field): rows for field, rows in fields.items()}
+
+
+def get_index() -> SuggestIndex:
+  """Return this instance's index, reloading it if it is out of date.
+
+  Without redis, e.g., on a dev server, the version is always None and
+  the index is only rebuilt after this instance updates a feature.
+  """
+  global _index
+  version = rediscache.get(VERSION_CACHE_KEY)
+  if _index is not None and _index.version == version:
+    return _index
+
+  rows_by_feature = _load_cached_rows()
+  if rows_by_feature is None:
+    logging.info('building suggestion rows from the datastore')
+    rows_by_feature = _load_all_rows()
+    rediscache.replace_complete_hash(
+        ROWS_CACHE_KEY, rows_by_feature, VERSION_CACHE_KEY, version,
+        time=ROWS_TTL)
+  _index = SuggestIndex(version, rows_by_feature)
+  return _index
+
+
+def suggest(prefix: str, num: int = DEFAULT_SUGGESTIONS) -> list[Suggestion]:
+  return get_index().lookup(prefix, min(num, MAX_SUGGESTIONS))
+
+
+def update_feature(
+    feature_id: int, fe: Optional[FeatureEntry],
+    stages: Iterable[Stage]) -> None:
+  """Replace one feature's rows in the cache and bump the version."""
+  global _index
+  if rediscache.update_complete_hash_field(
+      ROWS_CACHE_KEY, feature_id, compute_rows(fe), VERSION_CACHE_KEY,
+      time=0):
+    _index = None
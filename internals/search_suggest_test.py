@@ -0,0 +1,168 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from unittest import mock
+
+from framework import rediscache
+from internals import search_suggest
+from internals.core_models import FeatureEntry
+from internals.search_suggest import (
+    KIND_COMPONENT, KIND_NAME, KIND_OWNER, KIND_TAG, Suggestion)
+
+
+class SuggestIndexTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.index = search_suggest.SuggestIndex('v1', {
+        1: [(KIND_NAME, 'CSS Grid Layout'), (KIND_COMPONENT, 'Blink>CSS'),
+            (KIND_OWNER, 'owner@example.com')],
+        2: [(KIND_NAME, 'Grid lanes'), (KIND_COMPONENT, 'Blink>CSS'),
+            (KIND_TAG, 'layout')],
+    })
+
+  def test_lookup__prefix(self):
+    """Values are matched case-insensitively by prefix."""
+    self.assertEqual(
+        [Suggestion(KIND_COMPONENT, 'Blink>CSS', 2)],
+        self.index.lookup('blink>c', 10))
+    self.assertEqual(
+        [Suggestion(KIND_OWNER, 'owner@example.com', 1)],
+        self.index.lookup('OWN', 10))
+    self.assertEqual([], self.index.lookup('zzz', 10))
+    self.assertEqual([], self.index.lookup('  ', 10))
+
+  def test_lookup__name_words(self):
+    """Feature names also match at the start of a later word."""
+    self.assertEqual(
+        [Suggestion(KIND_NAME, 'Grid lanes', 1),
+         Suggestion(KIND_NAME, 'CSS Grid Layout', 1)],
+        self.index.lookup('grid', 10))
+    self.assertEqual(
+        [Suggestion(KIND_NAME, 'CSS Grid Layout', 1),
+         Suggestion(KIND_TAG, 'layout', 1)],
+        self.index.lookup('layout', 10))
+
+  def test_lookup__num(self):
+    self.assertEqual(1, len(self.index.lookup('grid', 1)))
+
+  def test_suggestion_query(self):
+    """Each suggestion gives the search term that finds its features."""
+    self.assertEqual(
+        'name="CSS Grid Layout"',
+        Suggestion(KIND_NAME, 'CSS Grid Layout', 1).query)
+    self.assertEqual('tag=layout', Suggestion(KIND_TAG, 'layout', 1).query)
+
+
+class SearchSuggestTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    rediscache.delete(search_suggest.ROWS_CACHE_KEY)
+    rediscache.delete(search_suggest.VERSION_CACHE_KEY)
+    self.fe_1 = FeatureEntry(
+        name='Suggest one', summary='sum', category=1,
+        blink_components=['Blink>Suggest'])
+    self.fe_1.put()
+    self.fe_2 = FeatureEntry(
+        name='Suggest two', summary='sum', category=1, unlisted=True)
+    self.fe_2.put()
+
+  def tearDown(self):
+    self.fe_1.key.delete()
+    self.fe_2.key.delete()
+
+  def test_compute_rows(self):
+    """Unlisted and deleted features are not suggested."""
+    self.assertEqual(
+        [(KIND_NAME, 'Suggest one'), (KIND_COMPONENT, 'Blink>Suggest')],
+        search_suggest.compute_rows(self.fe_1))
+    self.assertEqual([], search_suggest.compute_rows(self.fe_2))
+    self.assertEqual([], search_suggest.compute_rows(None))
+
+  def test_suggest(self):
+    """Only listed features are suggested."""
+    actual = search_suggest.suggest('suggest')
+    self.assertEqual(['Suggest one'], [s.value for s in actual])
+
+  def test_suggest__reuses_index(self):
+    """The index is only rebuilt after the cached rows change."""
+    with mock.patch(
+        'internals.search_suggest._load_all_rows',
+        wraps=search_suggest._load_all_rows) as load:
+      index_1 = search_suggest.get_index()
+      self.assertIs(index_1, search_suggest.get_index())
+      self.assertEqual(1, len(load.mock_calls))
+
+      self.fe_2.unlisted = False
+      self.fe_2.put()
+      index_2 = search_suggest.get_index()
+      self.assertIsNot(index_1, index_2)
+      # The put updated the cached rows, so nothing was reloaded.
+      self.assertEqual(1, len(load.mock_calls))
+      self.assertEqual(
+          ['Suggest one', 'Suggest two'],
+          [s.value for s in index_2.lookup('suggest', 10)])
+
+  def test_update_feature__one_field(self):
+    """A put replaces only that feature's rows in the cached hash."""
+    search_suggest.get_index()
+    fe_1_id = self.fe_1.key.integer_id()
+    fe_2_id = self.fe_2.key.integer_id()
+    self.fe_2.unlisted = False
+    self.fe_2.put()
+
+    cached = rediscache.get_hash(search_suggest.ROWS_CACHE_KEY)
+    self.assertEqual(
+        {rediscache.COMPLETE_FIELD, str(fe_1_id), str(fe_2_id)},
+        set(cached))
+    self.assertEqual([(KIND_NAME, 'Suggest two')], cached[str(fe_2_id)])
+
+    version = rediscache.get(search_suggest.VERSION_CACHE_KEY)
+    search_suggest.update_feature(fe_2_id, self.fe_2, [])
+    # Nothing changed, so instances keep their indexes.
+    self.assertEqual(
+        version, rediscache.get(search_suggest.VERSION_CACHE_KEY))
+
+  def test_get_index__update_during_rebuild(self):
+    """Rows loaded before a concurrent update are not cached."""
+    def load_and_update():
+      rows_by_feature = search_suggest._load_all_rows()
+      self.fe_2.unlisted = False
+      self.fe_2.put()
+      return rows_by_feature
+
+    with mock.patch(
+        'internals.search_suggest._load_all_rows',
+        side_effect=load_and_update):
+      search_suggest.get_index()
+    self.assertIsNone(rediscache.get_hash(search_suggest.ROWS_CACHE_KEY))
+    self.assertEqual(
+        ['Suggest one', 'Suggest two'],
+        [s.value for s in search_suggest.suggest('suggest')])
+
+  def test_get_index__no_redis(self):
+    """Without redis, the index is kept until a feature is updated."""
+    with mock.patch('framework.rediscache.redis_client', None), \
+        mock.patch(
+            'internals.search_suggest._load_all_rows',
+            wraps=search_suggest._load_all_rows) as load:
+      index_1 = search_suggest.get_index()
+      self.assertIs(index_1, search_suggest.get_index())
+      self.assertEqual(1, len(load.mock_calls))
+
+      self.fe_2.unlisted = False
+      self.fe_2.put()
+      self.assertIsNot(index_1, search_suggest.get_index())
+      self.assertEqual(2, len(load.mock_calls))
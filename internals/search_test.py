@@ -17,122 +17,12 @@ import testing_config  # isort: split
 import datetime
 from unittest import mock
 
-from internals import core_enums, notifier, search
+from internals import core_enums, notifier, search, search_parser
 from internals.core_models import FeatureEntry, MilestoneSet, Stage
 from internals.review_models import Gate, Vote
 from internals.search_queries import Interval
 
 
-class SearchRETest(testing_config.CustomTestCase):
-  # Note: User queries will always have a space appended before parsing.
-
-  def test_empty_query(self):
-    """An empty user query string should yield zero serach terms."""
-    self.assertEqual([], search.TERM_RE.findall(''))
-    self.assertEqual([], search.TERM_RE.findall('   '))
-
-  def test_structured_query_terms(self):
-    """We can parse operator terms."""
-    self.assertEqual(
-        [('', 'field', '=', 'value', '')],
-        search.TERM_RE.findall('field=value '))
-    self.assertEqual(
-        [('', 'field', '>', 'value', '')],
-        search.TERM_RE.findall('field>value '))
-    self.assertEqual(
-        [('', 'flag_name', '=', 'version', '')],
-        search.TERM_RE.findall('flag_name=version '))
-    self.assertEqual(
-        [('', 'flag_name', '=', 'enable-super-stuff', '')],
-        search.TERM_RE.findall('flag_name=enable-super-stuff '))
-    self.assertEqual(
-        [('', 'flag_name', '=', '"enable super stuff"', '')],
-        search.TERM_RE.findall('flag_name="enable super stuff" '))
-
-  def test_structured_query_terms__complex(self):
-    """We can parse complex operator terms."""
-    self.assertEqual(
-        [('-', 'field', '=', 'value', '')],
-        search.TERM_RE.findall('-field=value '))
-    self.assertEqual(
-        [('OR ', 'field', '>', 'value', '')],
-        search.TERM_RE.findall('OR field>value '))
-    self.assertEqual(
-        [('-', 'flag_name', '=', 'version', '')],
-        search.TERM_RE.findall('-flag_name=version '))
-    self.assertEqual(
-        [('OR ', 'flag_name', '=', 'enable-super-stuff', '')],
-        search.TERM_RE.findall('OR flag_name=enable-super-stuff '))
-
-  def test_structured_query_terms__quick_or(self):
-    """We can parse queries that use quick-OR syntax for multiple values."""
-    self.assertEqual(
-        [('', 'field', '=', 'value1,value2,value3', '')],
-        search.TERM_RE.findall('field=value1,value2,value3 '))
-    self.assertEqual(
-        [('', 'field', '=', '1,2,3', '')],
-        search.TERM_RE.findall('field=1,2,3 '))
-    self.assertEqual(
-        [('', 'field', '=', '"one","two","three"', '')],
-        search.TERM_RE.findall('field="one","two","three" '))
-    self.assertEqual(
-        [('', 'field', '=', '"enum one","enum two","enum three"', '')],
-        search.TERM_RE.findall('field="enum one","enum two","enum three" '))
-
-  def test_structured_query_terms__interval(self):
-    """We can parse queries that use interval syntax for paired inequalities."""
-    self.assertEqual(
-      [('', 'field', '=', '1..7', '')], search.TERM_RE.findall('field=1..7 ')
-    )
-    self.assertEqual(
-      [('', 'field', '=', '2024-01-01..2024-04-01', '')],
-      search.TERM_RE.findall('field=2024-01-01..2024-04-01 '),
-    )
-    self.assertEqual(
-      [('', 'field', '=', '"one".."three"', '')],
-      search.TERM_RE.findall('field="one".."three" '),
-    )
-
-  def test_text_terms(self):
-    """We can parse text terms."""
-    self.assertEqual(
-        [('', '', '', '', 'hello')],
-        search.TERM_RE.findall('hello '))
-    self.assertEqual(
-        [('', '', '', '', '"hello there people"')],
-        search.TERM_RE.findall('"hello there people" '))
-    self.assertEqual(
-        [('', '', '', '', '"memory location $0x25"')],
-        search.TERM_RE.findall('"memory location $0x25" '))
-
-  def test_text_terms__complex(self):
-    """We can parse complex text terms."""
-    self.assertEqual(
-        [('-', '', '', '', 'hello')],
-        search.TERM_RE.findall('-hello '))
-    self.assertEqual(
-        [('-', '', '', '', '"hello there people"')],
-        search.TERM_RE.findall('-"hello there people" '))
-    self.assertEqual(
-        [('OR ', '', '', '', '"memory location $0x25"')],
-        search.TERM_RE.findall('OR "memory location $0x25" '))
-
-  def test_malformed(self):
-    """Malformed queries are treated like full text, junk ignored."""
-    self.assertEqual(
-        [],
-        search.TERM_RE.findall(':: = == := > >> >>> '))
-    self.assertEqual(
-        [('', '', '', '', 'word')],
-        search.TERM_RE.findall('=word '))
-    self.assertEqual(
-      [('', '', '', '', '1,2..3')], search.TERM_RE.findall('field=1,2..3 ')
-    )
-    self.assertEqual(
-      [('', '', '', '', '1..2..3')], search.TERM_RE.findall('field=1..2..3 ')
-    )
-
-
 class SearchParsingTest(testing_config.CustomTestCase):
   def test_parse_query_value__dates(self):
     d = datetime.datetime
@@ -264,7 +154,7 @@ class SearchFunctionsTest(testing_config.CustomTestCase):
     self.featureentry_2.key.delete()
     self.featureentry_3.key.delete()
     self.featureentry_4.key.delete()
-    for kind in [Gate, FeatureEntry]:
+    for kind in [Gate, FeatureEntry, notifier.FeatureStar]:
       for entity in kind.query():
         entity.key.delete()
 
@@ -358,13 +248,15 @@ class SearchFunctionsTest(testing_config.CustomTestCase):
   def test_process_starred_me_query__none(self):
     """We can return a list of features starred by the user."""
     testing_config.sign_in('visitor@example.com', 111)
-    actual = search.process_starred_me_query()
+    future = search.process_starred_me_query()
+    actual = search._resolve_promise_to_id_list(future)
     self.assertEqual(actual, [])
 
   def test_process_starred_me_query__some(self):
     """We can return a list of features starred by the user."""
     testing_config.sign_in('starrer@example.com', 111)
-    actual = search.process_starred_me_query()
+    future = search.process_starred_me_query()
+    actual = search._resolve_promise_to_id_list(future)
     self.assertEqual(len(actual), 1)
     self.assertEqual(actual[0], self.featureentry_1.key.integer_id())
 
@@ -450,6 +342,156 @@ class SearchFunctionsTest(testing_config.CustomTestCase):
     actual = search._sort_by_total_order(feature_ids, total_order_ids)
     self.assertEqual([10, 9, 4, 1], actual)
 
+  def test_make_search_cache_key__me_terms(self):
+    """Searches with :me terms are cached separately for each user."""
+    context = search.QueryContext(
+        now=datetime.datetime(2024, 5, 26), current_stable_milestone=0)
+    def make_key(user_query):
+      return search.make_search_cache_key(
+          search_parser.parse_query(user_query), 'name',
+          False, False, False, context)
+
+    testing_config.sign_in('one@example.com', 111)
+    owner_me_1 = make_key('owner:me')
+    category_1 = make_key('category=1')
+    testing_config.sign_in('two@example.com', 222)
+    owner_me_2 = make_key('owner:me')
+    category_2 = make_key('category=1')
+    testing_config.sign_out()
+
+    self.assertNotEqual(owner_me_1, owner_me_2)
+    self.assertEqual(category_1, category_2)
+
+  def test_make_search_cache_key__starred_by_me(self):
+    """Starring a feature changes the key of starred-by:me searches."""
+    context = search.QueryContext(
+        now=datetime.datetime(2024, 5, 26), current_stable_milestone=0)
+    def make_key(user_query):
+      return search.make_search_cache_key(
+          search_parser.parse_query(user_query), 'name',
+          False, False, False, context)
+
+    testing_config.sign_in('starrer@example.com', 111)
+    starred_1 = make_key('starred-by:me')
+    owner_me_1 = make_key('owner:me')
+    self.assertEqual(starred_1, make_key('starred-by:me'))
+    notifier.FeatureStar.set_star(
+        'starrer@example.com', self.featureentry_2.key.integer_id())
+    starred_2 = make_key('starred-by:me')
+    owner_me_2 = make_key('owner:me')
+    testing_config.sign_out()
+
+    self.assertNotEqual(starred_1, starred_2)
+    self.assertEqual(owner_me_1, owner_me_2)
+
+  def test_process_query__cached(self):
+    """Repeated searches reuse the sorted IDs until a feature is edited."""
+    with mock.patch(
+        'internals.search._run_query', wraps=search._run_query) as run:
+      actual_1, tc_1 = search.process_query('', num=1)
+      actual_2, tc_2 = search.process_query('', start=1, num=1)
+      self.assertEqual(1, len(run.mock_calls))
+      self.assertEqual(2, tc_1)
+      self.assertEqual(2, tc_2)
+      self.assertEqual(
+          ['feature 1', 'feature 2'],
+          [actual_1[0]['name'], actual_2[0]['name']])
+
+      self.featureentry_3.unlisted = False
+      self.featureentry_3.put()
+      actual_3, tc_3 = search.process_query('')
+      self.assertEqual(2, len(run.mock_calls))
+      self.assertEqual(3, tc_3)
+
+  def test_search_cursor__round_trip(self):
+    """A cursor can be encoded and decoded."""
+    cursor = search.SearchCursor(
+        snapshot_id='FeatureSearch|1|abc', position=10, last_id=123)
+    self.assertEqual(cursor, search.SearchCursor.decode(cursor.encode()))
+
+  def test_search_cursor__invalid(self):
+    """A cursor that we did not make is rejected."""
+    with self.assertRaises(ValueError):
+      search.SearchCursor.decode('not a cursor!')
+    with self.assertRaises(ValueError):
+      search.SearchCursor.decode('WzEsMiwzLDQsNSw2XQ==')  # [1,2,3,4,5,6]
+
+  def test_resume_position(self):
+    """We continue after the last row shown, even if rows moved."""
+    cursor = search.SearchCursor(position=2, last_id=20)
+    self.assertEqual(2, search._resume_position([10, 20, 30, 40], cursor))
+    self.assertEqual(3, search._resume_position([5, 10, 20, 30], cursor))
+    self.assertEqual(2, search._resume_position([10, 30, 40], cursor))
+
+  def test_process_query_page__cursor(self):
+    """We can page through results using cursors."""
+    page_1 = search.process_query_page('', num=1)
+    self.assertEqual(['feature 1'], [f['name'] for f in page_1.features])
+    self.assertEqual(2, page_1.total_count)
+    self.assertIsNotNone(page_1.next_cursor)
+
+    page_2 = search.process_query_page(
+        '', num=1, cursor=page_1.next_cursor)
+    self.assertEqual(['feature 2'], [f['name'] for f in page_2.features])
+    self.assertIsNone(page_2.next_cursor)
+
+  def test_process_query_page__estimate_count(self):
+    """Listing all features in index order stops once the page is full."""
+    page_1 = search.process_query_page('', num=1, estimate_count=True)
+    self.assertEqual(['feature 1'], [f['name'] for f in page_1.features])
+    self.assertTrue(page_1.is_estimate)
+    self.assertEqual(2, page_1.total_count)
+
+    page_2 = search.process_query_page(
+        '', num=1, estimate_count=True, cursor=page_1.next_cursor)
+    self.assertEqual(['feature 2'], [f['name'] for f in page_2.features])
+
+    # The unlisted and enterprise features are skipped.
+    page_3 = search.process_query_page(
+        '', num=1, estimate_count=True, cursor=page_2.next_cursor)
+    self.assertEqual([], page_3.features)
+    self.assertFalse(page_3.is_estimate)
+    self.assertEqual(2, page_3.total_count)
+    self.assertIsNone(page_3.next_cursor)
+
+  def test_process_query_page__estimate_count_start(self):
+    """The rows before start are skipped without being loaded."""
+    actual = search.process_query_page(
+        '', start=1, num=1, estimate_count=True)
+    self.assertEqual(['feature 2'], [f['name'] for f in actual.features])
+    self.assertEqual(2, actual.total_count)
+    self.assertIsNone(actual.next_cursor)
+
+  def test_process_query__trace(self):
+    """Each search logs the steps on its critical path."""
+    with mock.patch('internals.search_trace.SearchTrace.log') as mock_log:
+      search.process_query('category="Web Components" OR -name="feature 2"')
+    mock_log.assert_called_once()
+
+  @mock.patch('internals.search._run_in_parallel')
+  def test_process_query__planned(self, mock_parallel):
+    """A cheap term is run first and the rest are checked in memory."""
+    testing_config.sign_in('owner@example.com', 111)
+    actual, tc = search.process_query('category="Web Components" owner:me')
+    testing_config.sign_out()
+
+    mock_parallel.assert_not_called()
+    self.assertEqual(['feature 1'], [f['name'] for f in actual])
+
+  @mock.patch('internals.search_planner.RESTRICT_LIMIT', 1)
+  def test_process_query__planned_too_many(self):
+    """If the first term matches many features, all terms are run."""
+    testing_config.sign_in('owner@example.com', 111)
+    with mock.patch(
+        'internals.search._run_in_parallel',
+        wraps=search._run_in_parallel) as run:
+      actual, tc = search.process_query('owner:me')
+    testing_config.sign_out()
+
+    self.assertEqual(1, len(run.mock_calls))
+    self.assertCountEqual(
+        ['feature 1', 'feature 2'], [f['name'] for f in actual])
+
   @mock.patch('internals.search.process_pending_approval_me_query')
   @mock.patch('internals.search.process_starred_me_query')
   @mock.patch('internals.search_queries.handle_me_query_async')
@@ -610,6 +652,27 @@ class SearchFunctionsTest(testing_config.CustomTestCase):
         ['feature 1', 'feature 2', 'feature 4'])
 
 
+  def test_process_query__grouped(self):
+    """We can run queries that group terms with parentheses and NOT."""
+    actual, tc = search.process_query(
+        '(category="Web Components" OR category=Miscellaneous) '
+        '-name="feature 2"')
+    self.assertEqual(['feature 1'], [f['name'] for f in actual])
+
+    actual, tc = search.process_query(
+        'NOT (category="Web Components" OR name="feature 2")')
+    self.assertEqual([], actual)
+
+    actual, tc = search.process_query(
+        'category=Miscellaneous OR (name="feature 1" -category=Miscellaneous)')
+    self.assertCountEqual(
+        ['feature 1', 'feature 2'], [f['name'] for f in actual])
+
+  def test_process_query__unmatched_paren(self):
+    """Queries that cannot be parsed are rejected."""
+    with self.assertRaises(ValueError):
+      search.process_query('(category=Miscellaneous')
+
   def test_process_query__negated_single_field(self):
     """We can run single-field queries."""
 
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Timeline of the steps of one feature search.
+
+A search starts a future for every term, the permission terms, and the
+total sort order, and then waits for all of them.  The trace records when
+each step started and when its future was done.  The critical path is
+the chain of steps that determined when the search finished: the step
+that finished last, then the step that finished last before that one
+started, and so on.
+"""
+
+import contextlib
+import dataclasses
+import logging
+import time
+from typing import Any, Iterator, Optional
+
+
+@dataclasses.dataclass
+class Span:
+  name: str
+  # Milliseconds since the start of the search.
+  start_ms: float
+  end_ms: Optional[float] = None
+
+  @property
+  def duration_ms(self) -> float:
+    return (self.end_ms or self.start_ms) - self.start_ms
+
+
+class SearchTrace:
+  """Collects the spans of one search."""
+
+  def __init__(self):
+    self.start = time.perf_counter()
+    self.spans: list[Span] = []
+
+  def now_ms(self) -> float:
+    return (time.perf_counter() - self.start) * 1000
+
+  def track(self, name: str, list_or_future: Any) -> Any:
+    """Record when a future finishes, and return it unchanged.
+
+    Values that are already available, such as lists, are recorded as
+    finishing immediately.
+    """
+    span = Span(name, self.now_ms())
+    self.spans.append(span)
+    if hasattr(list_or_future, 'add_done_callback'):
+      def finish(_future):
+        span.end_ms = self.now_ms()
+      list_or_future.add_done_callback(finish)
+    else:
+      span.end_ms = span.start_ms
+    return list_or_future
+
+  @contextlib.contextmanager
+  def step(self, name: str) -> Iterator[Span]:
+    """Record a step that runs synchronously."""
+    span = Span(name, self.now_ms())
+    self.spans.append(span)
+    try:
+      yield span
+    finally:
+      span.end_ms = self.now_ms()
+
+  def critical_path(self) -> list[Span]:
+    """Return the spans that determined the end time, earliest first."""
+    # Values that were available immediately never delay a search.
+    remaining: list[tuple[float, Span]] = [
+        (s.end_ms, s) for s in self.spans
+        if s.end_ms is not None and s.duration_ms > 0]
+    path: list[Span] = []
+    limit = float('inf')
+    while True:
+      candidates = [(end, s) for end, s in remaining if end <= limit]
+      if not candidates:
+        break
+      _, last = max(candidates, key=lambda pair: pair[0])
+      remaining = [(end, s) for end, s in remaining if s is not last]
+      path.append(last)
+      limit = last.start_ms
+    path.reverse()
+    return path
+
+  def log(self) -> None:
+    path = self.critical_path()
+    logging.info(
+        'search took %.1fms, critical path: %s', self.now_ms(),
+        ' -> '.join(
+            '%s [%.1f-%.1fms]' % (
+                s.name, s.start_ms, s.start_ms + s.duration_ms)
+            for s in path))
@@ -0,0 +1,61 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from internals import search_trace
+from internals.core_models import FeatureEntry
+from internals.search_trace import Span
+
+
+class SearchTraceTest(testing_config.CustomTestCase):
+
+  def test_track__list(self):
+    """Values that are already available finish immediately."""
+    trace = search_trace.SearchTrace()
+    self.assertEqual([1, 2], trace.track('ids', [1, 2]))
+    span = trace.spans[0]
+    self.assertEqual('ids', span.name)
+    self.assertEqual(span.start_ms, span.end_ms)
+
+  def test_track__future(self):
+    """Futures are recorded as finishing when they are done."""
+    trace = search_trace.SearchTrace()
+    future = trace.track(
+        'all', FeatureEntry.query().fetch_async(keys_only=True))
+    future.result()
+    self.assertIsNotNone(trace.spans[0].end_ms)
+
+  def test_critical_path(self):
+    """The path follows the steps that each later step waited for."""
+    trace = search_trace.SearchTrace()
+    term_a = Span('term a', 0.0, 5.0)
+    term_b = Span('term b', 0.1, 9.0)
+    total_order = Span('total order', 0.2, 3.0)
+    immediate = Span('list', 0.3, 0.3)
+    candidates = Span('candidates', 9.5, 12.0)
+    sort = Span('sort', 12.0, 13.0)
+    trace.spans = [term_a, term_b, total_order, immediate, candidates, sort]
+    self.assertEqual([term_b, candidates, sort], trace.critical_path())
+
+  def test_critical_path__empty(self):
+    self.assertEqual([], search_trace.SearchTrace().critical_path())
+
+  def test_step(self):
+    """Synchronous steps are recorded around the block."""
+    trace = search_trace.SearchTrace()
+    with trace.step('sort') as span:
+      pass
+    self.assertEqual([span], trace.spans)
+    self.assertGreaterEqual(span.end_ms, span.start_ms)
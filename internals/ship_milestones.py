@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Map of each launched feature to the first milestone that it shipped in.
+
+The feature latency report needs the first shipping milestone of every
+launched feature, along with a few fields of the feature itself.  The
+map is built from the shipping stages in the datastore and cached in a
+redis hash keyed by feature ID.  When a FeatureEntry or Stage is put
+(see derived_entities), only that feature's field of the hash is
+replaced.
+"""
+
+import collections
+import dataclasses
+from datetime import datetime
+import logging
+from typing import Iterable, Optional
+
+from google.cloud import ndb  # type: ignore
+
+from framework import rediscache
+from internals.core_enums import *
+from internals.core_models import FeatureEntry, Stage
+
+
+# The map is a complete hash, see rediscache.replace_complete_hash().
+CACHE_KEY = 'FeatureShipMilestones'
+VERSION_CACHE_KEY = 'FeatureShipMilestonesVersion'
+# The map is rebuilt from the datastore at least this often.
+MAP_TTL = 60 * 60  # seconds
+
+SHIPPING_STAGE_TYPES = [
+    STAGE_BLINK_SHIPPING, STAGE_PSA_SHIPPING, STAGE_FAST_SHIPPING,
+    STAGE_DEP_SHIPPING, STAGE_ENT_ROLLOUT]
+LAUNCHED_STATUSES = [ENABLED_BY_DEFAULT, DEPRECATED, REMOVED]
+
+
+@dataclasses.dataclass
+class ShippedFeature:
+  feature_id: int
+  name: str
+  created: datetime
+  owner_emails: list[str]
+  # The earliest desktop or android milestone of any shipping stage.
+  milestone: int
+
+
+def first_ship_milestone(stages: Iterable[Stage]) -> Optional[int]:
+  """Return the earliest milestone of the given shipping stages."""
+  milestones = [
+      m for s in stages
+      if (s.stage_type in SHIPPING_STAGE_TYPES and not s.archived and
+          s.milestones)
+      for m in (s.milestones.desktop_first, s.milestones.android_first)
+      if m]
+  return min(milestones, default=None)
+
+
+def compute_entry(
+    fe: Optional[FeatureEntry],
+    stages: Iterable[Stage]) -> Optional[ShippedFeature]:
+  """Return the entry for a launched feature, or None for other features."""
+  if fe is None or fe.deleted or fe.impl_status_chrome not in LAUNCHED_STATUSES:
+    return None
+  milestone = first_ship_milestone(stages)
+  if milestone is None:
+    return None
+  return ShippedFeature(
+      feature_id=fe.key.integer_id(), name=fe.name, created=fe.created,
+      owner_emails=list(fe.owner_emails or []), milestone=milestone)
+
+
+def _load_all() -> dict[int, ShippedFeature]:
+  stages = Stage.query(Stage.stage_type.IN(SHIPPING_STAGE_TYPES)).fetch(None)
+  stages_by_fid: dict[int, list[Stage]] = collections.defaultdict(list)
+  for s in stages:
+    stages_by_fid[s.feature_id].append(s)
+  features = ndb.get_multi(
+      [ndb.Key('FeatureEntry', fid) for fid in stages_by_fid])
+
+  shipped: dict[int, ShippedFeature] = {}
+  for fe in features:
+    if fe:
+      entry = compute_entry(fe, stages_by_fid[fe.key.integer_id()])
+      if entry:
+        shipped[entry.feature_id] = entry
+  return shipped
+
+
+def get_map() -> dict[int, ShippedFeature]:
+  """Return {feature_id: ShippedFeature} for all launched features."""
+  version = rediscache.get(VERSION_CACHE_KEY)
+  fields = rediscache.get_complete_hash(CACHE_KEY)
+  if fields is not None:
+    return {int(field): entry for field, entry in fields.items()}
+
+  logging.info('building ship milestone map from the datastore')
+  shipped = _load_all()
+  rediscache.replace_complete_hash(
+      CACHE_KEY, shipped, VERSION_CACHE_KEY, version, time=MAP_TTL)
+  return shipped
+
+
+def update_feature(
+    feature_id: int, fe: Optional[FeatureEntry],
+    stages: Iterable[Stage]) -> None:
+  """Replace one feature's entry in the cached map."""
+  rediscache.update_complete_hash_field(
+      CACHE_KEY, feature_id, compute_entry(fe, stages), VERSION_CACHE_KEY,
+      time=MAP_TTL)
@@ -0,0 +1,103 @@
+# Copyright 2024 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License")
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import testing_config  # Must be imported before the module under test.
+
+from datetime import datetime
+from unittest import mock
+
+from google.cloud import ndb  # type: ignore
+
+from framework import rediscache
+from internals import ship_milestones
+from internals.core_enums import *
+from internals.core_models import FeatureEntry, MilestoneSet, Stage
+
+
+class ShipMilestonesTest(testing_config.CustomTestCase):
+
+  def setUp(self):
+    self.fe = FeatureEntry(
+        name='feature one', summary='sum', category=1,
+        created=datetime(2023, 2, 18), impl_status_chrome=ENABLED_BY_DEFAULT,
+        owner_emails=['owner@example.com'])
+    self.fe.put()
+    self.fe_id = self.fe.key.integer_id()
+    self.stage_1 = Stage(
+        feature_id=self.fe_id, stage_type=STAGE_BLINK_SHIPPING,
+        milestones=MilestoneSet(desktop_first=120, android_first=119))
+    self.stage_1.put()
+    self.stage_2 = Stage(
+        feature_id=self.fe_id, stage_type=STAGE_BLINK_DEV_TRIAL,
+        milestones=MilestoneSet(desktop_first=110))
+    self.stage_2.put()
+
+  def tearDown(self):
+    kinds: list[ndb.Model] = [FeatureEntry, Stage]
+    for kind in kinds:
+      for entity in kind.query():
+        entity.key.delete()
+    rediscache.flushall()
+
+  def test_first_ship_milestone(self):
+    """Only unarchived shipping stages count."""
+    self.assertEqual(
+        119,
+        ship_milestones.first_ship_milestone([self.stage_1, self.stage_2]))
+    self.stage_1.archived = True
+    self.assertIsNone(
+        ship_milestones.first_ship_milestone([self.stage_1, self.stage_2]))
+    self.assertIsNone(ship_milestones.first_ship_milestone([]))
+
+  def test_get_map(self):
+    """The map lists launched features and is built once."""
+    with mock.patch(
+        'internals.ship_milestones._load_all',
+        wraps=ship_milestones._load_all) as load_all:
+      actual = ship_milestones.get_map()
+      ship_milestones.get_map()
+    self.assertEqual(1, load_all.call_count)
+    self.assertEqual(
+        {self.fe_id: ship_milestones.ShippedFeature(
+            feature_id=self.fe_id, name='feature one',
+            created=datetime(2023, 2, 18),
+            owner_emails=['owner@example.com'], milestone=119)},
+        actual)
+
+  def test_update_feature(self):
+    """Writes to a feature or its stages patch the cached map."""
+    ship_milestones.get_map()
+    with mock.patch('internals.ship_milestones._load_all') as load_all:
+      self.stage_1.milestones.android_first = None
+      self.stage_1.put()
+      self.assertEqual(120, ship_milestones.get_map()[self.fe_id].milestone)
+
+      self.fe.impl_status_chrome = NO_ACTIVE_DEV
+      self.fe.put()
+      self.assertEqual({}, ship_milestones.get_map())
+    load_all.assert_not_called()
+
+  def test_get_map__update_during_build(self):
+    """A map built before a concurrent update is not cached."""
+    def load_and_update():
+      shipped = ship_milestones._load_all()
+      self.fe.impl_status_chrome = NO_ACTIVE_DEV
+      self.fe.put()
+      return shipped
+
+    with mock.patch(
+        'internals.ship_milestones._load_all', side_effect=load_and_update):
+      self.assertIn(self.fe_id, ship_milestones.get_map())
+    self.assertIsNone(rediscache.get_hash(ship_milestones.CACHE_KEY))
+    self.assertEqual({}, ship_milestones.get_map())
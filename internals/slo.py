@@ -13,7 +13,9 @@
 # limitations under the License.
 
 import datetime
+import functools
 import logging
+from typing import Iterable, Optional
 import pytz
 
 from framework import permissions
@@ -30,24 +32,43 @@ def is_weekday(d: datetime.datetime) -> bool:
   return d.weekday() < 5
 
 
-def weekdays_between(start: datetime.datetime, end: datetime.datetime) -> int:
-  """Return the number of Pacific timezone weekdays between two UTC dates."""
+@functools.lru_cache(maxsize=4096)
+def _pacific_offset(utc_hour: datetime.datetime) -> datetime.timedelta:
+  """Return the Pacific UTC offset during the given hour."""
+  # Daylight saving time always starts and ends on an hour boundary.
+  return pytz.utc.localize(utc_hour).astimezone(PACIFIC_TZ).utcoffset()
+
+
+def weekday_number(d: datetime.datetime) -> int:
+  """Return the number of weekdays from 0001-01-01 through d's Pacific date.
+
+  Naive datetimes are in UTC, like the ones stored in the datastore.  The
+  number of weekdays between two dates is the difference of their numbers.
+  """
+  if d.tzinfo is not None:
+    d = d.astimezone(pytz.utc).replace(tzinfo=None)
+  utc_hour = d.replace(minute=0, second=0, microsecond=0)
+  # Day 1 of the proleptic Gregorian calendar is a Monday.
+  days = (d + _pacific_offset(utc_hour)).toordinal()
+  return days // 7 * 5 + min(days % 7, 5)
+
+
+def _count_weekdays(
+    start: datetime.datetime, start_number: int,
+    end: datetime.datetime, end_number: int) -> int:
+  """Count weekdays given the weekday numbers of start and end."""
   # If the difference is big, just approximate.
   calendar_days = (end - start).days
   if calendar_days > MAX_DAYS:
     return calendar_days * 5 // 7
-
-  d_ptz = start.astimezone(PACIFIC_TZ)
   # The day of the request does not count.
-  d_ptz = d_ptz.replace(hour=23, minute=59, second=59)
-  end_ptz = end.astimezone(tz=PACIFIC_TZ)
-  weekday_counter = 0
-  while d_ptz < end_ptz and weekday_counter < MAX_DAYS:
-    d_ptz = d_ptz + datetime.timedelta(days=1)
-    if is_weekday(d_ptz):
-      weekday_counter += 1
+  return max(0, end_number - start_number)
 
-  return weekday_counter
+
+def weekdays_between(start: datetime.datetime, end: datetime.datetime) -> int:
+  """Return the number of Pacific timezone weekdays between two UTC dates."""
+  return _count_weekdays(
+      start, weekday_number(start), end, weekday_number(end))
 
 
 def now_utc() -> datetime.datetime:
@@ -63,6 +84,33 @@ def remaining_days(requested_on: datetime.datetime, slo_limit: int) -> int:
   return slo_limit - weekdays_between(requested_on, now_utc())
 
 
+def get_slo_limit(gate: Gate, appr_fields, default_slo_limit: int) -> int:
+  """Return the number of weekdays allowed for an initial response."""
+  appr_def = appr_fields.get(gate.gate_type)
+  return appr_def.slo_initial_response if appr_def else default_slo_limit
+
+
+def remaining_days_many(
+    gates: Iterable[Gate], appr_fields, default_slo_limit: int
+) -> list[Optional[int]]:
+  """Return remaining_days() for each gate that is awaiting a response.
+
+  The current time is read and converted once for all the gates.  Gates
+  that were not requested yet or that already got a response get None.
+  """
+  now = now_utc()
+  now_number = weekday_number(now)
+  result: list[Optional[int]] = []
+  for gate in gates:
+    if gate.requested_on is None or gate.responded_on is not None:
+      result.append(None)
+      continue
+    took = _count_weekdays(
+        gate.requested_on, weekday_number(gate.requested_on), now, now_number)
+    result.append(get_slo_limit(gate, appr_fields, default_slo_limit) - took)
+  return result
+
+
 def record_vote(gate: Gate, votes: list[Vote]) -> bool:
   """Record a Gate SLO response time if needed.  Return True if changed."""
   if gate.requested_on is None:
@@ -103,15 +151,21 @@ def is_gate_overdue(gate, appr_fields, default_slo_limit) -> bool:
   """Return True if a gate's review is overdue."""
   if gate.requested_on is None or gate.responded_on is not None:
     return False
-  appr_def = appr_fields.get(gate.gate_type)
-  slo_limit = (appr_def.slo_initial_response
-               if appr_def else default_slo_limit)
+  slo_limit = get_slo_limit(gate, appr_fields, default_slo_limit)
   return remaining_days(gate.requested_on, slo_limit) < 0
 
 
+def get_overdue_gates_with_remaining(
+    appr_fields, default_slo_limit) -> list[tuple[Gate, int]]:
+  """Return (gate, remaining_days) for each gate with an overdue review."""
+  active_gates = Gate.query(Gate.state.IN(Gate.PENDING_STATES)).fetch()
+  remaining = remaining_days_many(
+      active_gates, appr_fields, default_slo_limit)
+  return [(g, r) for g, r in zip(active_gates, remaining)
+          if r is not None and r < 0]
+
+
 def get_overdue_gates(appr_fields, default_slo_limit) -> list[Gate]:
   """Return a list of gates with overdue reviews."""
-  active_gates = Gate.query(Gate.state.IN(Gate.PENDING_STATES))
-  overdue_gates = [g for g in active_gates
-                   if is_gate_overdue(g, appr_fields, default_slo_limit)]
-  return overdue_gates
+  return [g for g, _ in get_overdue_gates_with_remaining(
+      appr_fields, default_slo_limit)]
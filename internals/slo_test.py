@@ -79,6 +79,33 @@ class SLOFunctionTests(testing_config.CustomTestCase):
     actual = slo.weekdays_between(start, end)
     self.assertEqual(36786, actual)
 
+  def test_weekdays_between__pacific_date(self):
+    """Days are counted by their date in the Pacific timezone."""
+    start = datetime.datetime(2023, 6, 7, 12, 30, 0)  # Wed
+    # 03:00 UTC on Thursday is still Wednesday evening in Pacific time.
+    end = datetime.datetime(2023, 6, 8, 3, 0, 0)
+    self.assertEqual(0, slo.weekdays_between(start, end))
+    end = datetime.datetime(2023, 6, 8, 8, 0, 0)
+    self.assertEqual(1, slo.weekdays_between(start, end))
+
+  def test_weekdays_between__dst(self):
+    """We count days correctly across a daylight saving time change."""
+    start = datetime.datetime(2023, 3, 10, 7, 30, 0)  # Thu 23:30 PST
+    end = datetime.datetime(2023, 3, 14, 6, 30, 0)  # Mon 23:30 PDT
+    self.assertEqual(2, slo.weekdays_between(start, end))
+
+  def test_weekday_number(self):
+    """Consecutive weekdays have consecutive numbers."""
+    mon = slo.weekday_number(datetime.datetime(2023, 6, 5, 12))
+    self.assertEqual(mon + 4, slo.weekday_number(
+        datetime.datetime(2023, 6, 9, 12)))  # Fri
+    self.assertEqual(mon + 4, slo.weekday_number(
+        datetime.datetime(2023, 6, 11, 12)))  # Sun
+    self.assertEqual(mon + 5, slo.weekday_number(
+        datetime.datetime(2023, 6, 12, 12)))  # Mon
+    aware = datetime.datetime(2023, 6, 5, 12, tzinfo=slo.pytz.utc)
+    self.assertEqual(mon, slo.weekday_number(aware))
+
   def test_now_utc(self):
     """This function returns a datetime."""
     actual = slo.now_utc()
@@ -276,6 +303,33 @@ class SLOReportingTests(testing_config.CustomTestCase):
     self.assertTrue(slo.is_gate_overdue(
         self.gate_1, {}, DEFAULT_SLO_LIMIT))
 
+  @mock.patch('internals.slo.now_utc')
+  def test_remaining_days_many(self, mock_now):
+    """We compute the remaining days of many gates in one pass."""
+    mock_now.return_value = datetime.datetime(2023, 6, 16, 12, 30, 0)  # Fri
+    self.gate_2.responded_on = datetime.datetime(2023, 6, 8, 12, 30, 0)
+    self.gate_3.requested_on = None
+    actual = slo.remaining_days_many(
+        [self.gate_1, self.gate_2, self.gate_3], APPR_FIELDS,
+        DEFAULT_SLO_LIMIT)
+    self.assertEqual(
+        [slo.remaining_days(
+            self.gate_1.requested_on,
+            slo.get_slo_limit(self.gate_1, APPR_FIELDS, DEFAULT_SLO_LIMIT)), None, None],
+        actual)
+
+  @mock.patch('internals.slo.now_utc')
+  def test_get_overdue_gates_with_remaining(self, mock_now):
+    """Overdue gates come with the number of remaining days."""
+    mock_now.return_value = datetime.datetime(2023, 6, 16, 12, 30, 0)  # Fri
+    actual = slo.get_overdue_gates_with_remaining(
+        APPR_FIELDS, DEFAULT_SLO_LIMIT)
+    self.assertEqual(
+        [(self.gate_1, slo.remaining_days(
+            self.gate_1.requested_on,
+            slo.get_slo_limit(self.gate_1, APPR_FIELDS, DEFAULT_SLO_LIMIT)))],
+        actual)
+
   @mock.patch('internals.slo.now_utc')
   def test_get_overdue_gates(self, mock_now):
     """We can tell if a gate is overdue based on a default SLO limit."""
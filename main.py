@@ -28,6 +28,7 @@ from api import (
   cues_api,
   external_reviews_api,
   feature_latency_api,
+  feature_suggest_api,
   feature_links_api,
   features_api,
   intents_api,
@@ -48,6 +49,7 @@ from api import (
 from framework import basehandlers, csp, sendemail
 from internals import (
   data_backup,
+  derived_entities,
   detect_intent,
   feature_links,
   fetchmetrics,
@@ -55,6 +57,7 @@ from internals import (
   maintenance_scripts,
   notifier,
   reminders,
+  review_latency,
   search_fulltext,
 )
 from pages import featurelist, guide, intentpreview, metrics, ot_requests, users
@@ -107,6 +110,8 @@ api_routes: list[Route] = [
     Route(f'{API_BASE}/features', features_api.FeaturesAPI),
     Route(f'{API_BASE}/features/<int:feature_id>', features_api.FeaturesAPI),
     Route(f'{API_BASE}/features/create', features_api.FeaturesAPI),
+    Route(f'{API_BASE}/features/suggest',
+        feature_suggest_api.FeatureSuggestAPI),
     Route(f'{API_BASE}/feature_links', feature_links_api.FeatureLinksAPI),
     Route(f'{API_BASE}/feature_links_summary', feature_links_api.FeatureLinksSummaryAPI),
     Route(f'{API_BASE}/feature_links_samples', feature_links_api.FeatureLinksSamplesAPI),
@@ -254,6 +259,7 @@ mpa_page_routes: list[Route] = [
     # There was logic to accept another version value, but it it was not used.
     Route(r'/features.json', featurelist.FeaturesJsonHandler),
     Route(r'/features_v2.json', featurelist.FeaturesJsonHandler),
+    Route(r'/features.ndjson', featurelist.FeaturesExportHandler),
 
     Route('/features', featurelist.FeatureListHandler),
     Route('/features/<int:feature_id>', featurelist.FeatureListHandler),
@@ -274,9 +280,11 @@ internals_routes: list[Route] = [
   Route('/cron/send_prepublication', reminders.PrepublicationHandler),
   Route('/cron/send_overdue_reviews', reminders.SLOOverdueHandler),
   Route('/cron/warn_inactive_users', notifier.NotifyInactiveUsersHandler),
+  Route('/cron/flush_star_counts', notifier.FlushStarCountsHandler),
   Route('/cron/remove_inactive_users',
       inactive_users.RemoveInactiveUsersHandler),
   Route('/cron/reindex_all', search_fulltext.ReindexAllFeatures),
+  Route('/cron/rebuild_review_latency', review_latency.RebuildReviewLatency),
   Route('/cron/update_all_feature_links', feature_links.UpdateAllFeatureLinksHandlers),
   Route('/cron/associate_origin_trials', maintenance_scripts.AssociateOTs),
   Route('/cron/send-ot-process-reminders',
@@ -293,6 +301,8 @@ internals_routes: list[Route] = [
   Route('/tasks/email-assigned', notifier.ReviewAssignmentHandler),
   Route('/tasks/email-comments', notifier.FeatureCommentHandler),
   Route('/tasks/update-feature-links', feature_links.FeatureLinksUpdateHandler),
+  Route('/tasks/update-derived-entities',
+        derived_entities.UpdateDerivedEntitiesHandler),
   Route('/tasks/email-ot-activated', notifier.OTActivatedHandler),
   Route('/tasks/email-ot-creation-processed',
         notifier.OTCreationProcessedHandler),
@@ -337,6 +347,10 @@ internals_routes: list[Route] = [
         maintenance_scripts.DeleteEmptyExtensionStages),
   Route('/scripts/backfill_shipping_year',
         maintenance_scripts.BackfillShippingYear),
+  Route('/scripts/backfill_milestone_index',
+        maintenance_scripts.BackfillMilestoneIndex),
+  Route('/scripts/rebuild_feature_list_snapshot',
+        maintenance_scripts.RebuildFeatureListSnapshot),
 ]
 
 dev_routes: list[Route] = []
@@ -13,15 +13,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from datetime import datetime, timezone
 import json
 import logging
 
+import flask
+
 import settings
 from framework import basehandlers
 from framework import permissions
 from framework import utils
 from internals import core_enums
-from internals import feature_helpers
+from internals import feature_export
+from internals import feature_snapshot
 
 # from google.appengine.api import users
 from framework import users
@@ -33,10 +37,59 @@ class FeaturesJsonHandler(basehandlers.FlaskHandler):
   JSONIFY = True
 
   def get_template_data(self, **kwargs):
+    """Serve the pre-serialized feature list snapshot."""
     user = users.get_current_user()
-    feature_list = feature_helpers.get_features_by_impl_status(
+    snapshot = feature_snapshot.get_snapshot(
         show_unlisted=permissions.can_edit_any_feature(user))
-    return feature_list
+
+    # The gzip and identity bodies differ, so they need different ETags.
+    use_gzip = 'gzip' in self.request.accept_encodings
+    etag = snapshot.etag + ('-gz' if use_gzip else '')
+    headers = self.get_headers()
+    headers['ETag'] = '"%s"' % etag
+    headers['Vary'] = 'Accept-Encoding'
+    # Werkzeug parses If-None-Match into unquoted tags.
+    if self.request.if_none_match.contains(etag):
+      return flask.Response(status=304, headers=headers)
+
+    if use_gzip:
+      headers['Content-Encoding'] = 'gzip'
+      body = snapshot.gzipped_body
+    else:
+      body = snapshot.body
+    return flask.Response(
+        body, mimetype='application/json', headers=headers)
+
+
+class FeaturesExportHandler(basehandlers.FlaskHandler):
+  """Stream every feature with its stages, gates, and votes as NDJSON."""
+
+  HTTP_CACHE_TYPE = 'private'
+
+  def get_updated_since(self) -> datetime | None:
+    """Parse the optional updated_since ISO 8601 query string parameter."""
+    since_str = self.request.args.get('updated_since')
+    if not since_str:
+      return None
+    try:
+      updated_since = datetime.fromisoformat(since_str)
+    except ValueError:
+      self.abort(400, msg='Invalid updated_since %r' % since_str)
+    if updated_since.tzinfo:
+      # Datastore timestamps are naive UTC values.
+      updated_since = updated_since.astimezone(timezone.utc).replace(
+          tzinfo=None)
+    return updated_since
+
+  def get_template_data(self, **kwargs):
+    user = users.get_current_user()
+    show_unlisted = permissions.can_edit_any_feature(user)
+    updated_since = self.get_updated_since()
+    body = basehandlers.stream_with_ndb_context(
+        lambda: feature_export.iter_ndjson(
+            updated_since=updated_since, show_unlisted=show_unlisted))
+    return flask.Response(
+        body, mimetype='application/x-ndjson', headers=self.get_headers())
 
 
 class FeatureListHandler(basehandlers.FlaskHandler):
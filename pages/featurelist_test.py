@@ -16,6 +16,8 @@ from typing import Optional
 from framework.basehandlers import FlaskHandler
 import testing_config  # Must be imported first
 
+import gzip
+import json
 import os
 import flask
 import werkzeug
@@ -71,14 +73,75 @@ class FeaturesJsonHandlerTest(TestWithFeature):
   REQUEST_PATH_FORMAT = '/features.json'
   HANDLER_CLASS = featurelist.FeaturesJsonHandler
 
+  def get_json_data(self, headers=None):
+    with test_app.test_request_context(self.request_path, headers=headers):
+      response = self.handler.get_template_data()
+    self.assertEqual(200, response.status_code)
+    body = response.get_data()
+    if response.headers.get('Content-Encoding') == 'gzip':
+      body = gzip.decompress(body)
+    return json.loads(body)
+
   def test_get_template_data(self):
     """User can get a JSON feed of all features."""
     testing_config.sign_in('user@example.com', 111)
-    with test_app.test_request_context(self.request_path):
-      json_data = self.handler.get_template_data()
+    json_data = self.get_json_data()
 
     self.assertEqual(1, len(json_data))
     self.assertEqual('feature one', json_data[0]['name'])
+    self.assertTrue(json_data[0]['first_of_section'])
+
+  def test_get_template_data__gzip(self):
+    """Clients that accept gzip get the compressed snapshot."""
+    testing_config.sign_in('user@example.com', 111)
+    with test_app.test_request_context(
+        self.request_path, headers={'Accept-Encoding': 'gzip'}):
+      response = self.handler.get_template_data()
+
+    self.assertEqual('gzip', response.headers['Content-Encoding'])
+    json_data = json.loads(gzip.decompress(response.get_data()))
+    self.assertEqual('feature one', json_data[0]['name'])
+
+  def test_get_template_data__etag(self):
+    """A request with a matching ETag gets a 304, until a feature changes."""
+    with test_app.test_request_context(self.request_path):
+      etag = self.handler.get_template_data().headers['ETag']
+
+    with test_app.test_request_context(
+        self.request_path, headers={'If-None-Match': etag}):
+      response = self.handler.get_template_data()
+    self.assertEqual(304, response.status_code)
+
+    self.fe_1.name = 'feature one renamed'
+    self.fe_1.put()
+    with test_app.test_request_context(
+        self.request_path, headers={'If-None-Match': etag}):
+      response = self.handler.get_template_data()
+    self.assertEqual(200, response.status_code)
+    self.assertNotEqual(etag, response.headers['ETag'])
+    json_data = json.loads(response.get_data())
+    self.assertEqual('feature one renamed', json_data[0]['name'])
+
+  def test_get_template_data__etag_gzip(self):
+    """The gzip and identity bodies have different ETags."""
+    with test_app.test_request_context(self.request_path):
+      etag = self.handler.get_template_data().headers['ETag']
+    with test_app.test_request_context(
+        self.request_path, headers={'Accept-Encoding': 'gzip'}):
+      gzip_etag = self.handler.get_template_data().headers['ETag']
+    self.assertNotEqual(etag, gzip_etag)
+
+    with test_app.test_request_context(
+        self.request_path,
+        headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}):
+      response = self.handler.get_template_data()
+    self.assertEqual(200, response.status_code)
+
+    with test_app.test_request_context(
+        self.request_path,
+        headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzip_etag}):
+      response = self.handler.get_template_data()
+    self.assertEqual(304, response.status_code)
 
   def test_get_template_data__unlisted_no_perms(self):
     """JSON feed does not include unlisted features for users who can't edit."""
@@ -86,25 +149,52 @@ class FeaturesJsonHandlerTest(TestWithFeature):
     self.fe_1.put()
 
     testing_config.sign_out()
-    with test_app.test_request_context(self.request_path):
-      json_data = self.handler.get_template_data()
-    self.assertEqual(0, len(json_data))
+    self.assertEqual(0, len(self.get_json_data()))
 
     testing_config.sign_in('user@example.com', 111)
-    with test_app.test_request_context(self.request_path):
-      json_data = self.handler.get_template_data()
-    self.assertEqual(0, len(json_data))
+    self.assertEqual(0, len(self.get_json_data()))
 
   def test_get_template_data__unlisted_can_edit(self):
     """JSON feed includes unlisted features for site editors and admins."""
 
     testing_config.sign_in('admin@example.com', 111)
-    with test_app.test_request_context(self.request_path):
-      json_data = self.handler.get_template_data()
+    json_data = self.get_json_data()
     self.assertEqual(1, len(json_data))
     self.assertEqual('feature one', json_data[0]['name'])
 
 
+class FeaturesExportHandlerTest(TestWithFeature):
+
+  REQUEST_PATH_FORMAT = '/features.ndjson'
+  HANDLER_CLASS = featurelist.FeaturesExportHandler
+
+  def test_get_template_data(self):
+    """User can stream an NDJSON export of all features."""
+    with test_app.test_request_context(self.request_path):
+      response = self.handler.get_template_data()
+      lines = list(response.response)
+
+    self.assertEqual('application/x-ndjson', response.mimetype)
+    self.assertEqual(1, len(lines))
+    self.assertEqual('feature one', json.loads(lines[0])['name'])
+
+  def test_get_template_data__updated_since(self):
+    """Only features updated since the given time are exported."""
+    with test_app.test_request_context(
+        self.request_path + '?updated_since=2999-01-01T00:00:00Z'):
+      response = self.handler.get_template_data()
+      lines = list(response.response)
+
+    self.assertEqual([], lines)
+
+  def test_get_template_data__bad_updated_since(self):
+    """An unparsable updated_since is rejected."""
+    with test_app.test_request_context(
+        self.request_path + '?updated_since=yesterday'):
+      with self.assertRaises(werkzeug.exceptions.BadRequest):
+        self.handler.get_template_data()
+
+
 class FeatureListHandlerTest(TestWithFeature):
 
   REQUEST_PATH_FORMAT = '/features'
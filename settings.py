@@ -65,6 +65,9 @@ else:
 
 SITE_URL = 'https://%s.appspot.com/' % APP_ID
 CLOUD_TASKS_REGION = 'us-central1'
+# Number of worker threads used to run tasks in-process in dev mode.
+# Set to 0 to run each task synchronously when it is enqueued.
+LOCAL_TASK_WORKERS = 4
 
 GOOGLE_SIGN_IN_CLIENT_ID = (
     '914217904764-enfcea61q4hqe7ak8kkuteglrbhk8el1.'